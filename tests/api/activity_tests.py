@@ -0,0 +1,115 @@
+import pytest
+from datetime import datetime, timezone
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from tests.models.test_helper import create_dummy_project_with_user
+from api import activity
+from api.exceptions import InvalidOperation
+from api.models.activity import Activity, ActivityVerbs
+from api.models.tasks import Task
+
+
+def verbs(subject):
+    return [
+        (event.verb, event.before, event.after)
+        for event in Activity.objects.filter(**{subject._meta.model_name: subject}).order_by('id')
+    ]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_transitions_and_members_are_recorded():
+    project = create_dummy_project_with_user()
+    task = Task.objects.create(project.created_by, project, 'First Task')
+    guest = User.objects.create(username='guest')
+
+    task.archive()
+    task.start_from(datetime(2020, 1, 1, tzinfo=timezone.utc))
+    task.add_guest(guest)
+    task.add_participant(guest)
+    task.remove_user(guest)
+    # nothing changed, nothing recorded
+    task.update_title('Same Task')
+
+    assert verbs(task) == [
+        (ActivityVerbs.MEMBER_ADDED, '', 'OWNER'),
+        (ActivityVerbs.STATE_CHANGED, 'OPENED', 'ARCHIVED'),
+        (ActivityVerbs.STARTED, '', '2020-01-01T00:00:00+00:00'),
+        (ActivityVerbs.MEMBER_ADDED, '', 'GUEST'),
+        (ActivityVerbs.ACCESS_CHANGED, 'GUEST', 'PARTICIPANT'),
+        (ActivityVerbs.MEMBER_REMOVED, 'PARTICIPANT', ''),
+    ]
+    # the guest joined the project along the way
+    assert (ActivityVerbs.MEMBER_ADDED, '', 'PARTICIPANT') in verbs(project)
+
+    event = Activity.objects.filter(task=task).last()
+    assert event.project_id == project.pk
+    assert event.user_id == guest.pk
+    with pytest.raises(InvalidOperation):
+        event.save()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_rolled_back_changes_leave_no_event():
+    project = create_dummy_project_with_user()
+    before = Activity.objects.count()
+
+    with pytest.raises(ValueError):
+        with transaction.atomic():
+            project.deactivate()
+            assert Activity.objects.count() == before
+            raise ValueError()
+    assert Activity.objects.count() == before
+
+    project.refresh_from_db()
+    with transaction.atomic():
+        project.deactivate()
+    assert verbs(project)[-1] == (ActivityVerbs.STATE_CHANGED, 'ACTIVE', 'INACTIVE')
+
+
+@pytest.mark.django_db(transaction=True)
+def test_a_batch_is_written_in_one_insert():
+    project = create_dummy_project_with_user()
+    task = Task.objects.create(project.created_by, project, 'First Task')
+
+    with CaptureQueriesContext(connection) as queries:
+        with activity.batch():
+            with transaction.atomic():
+                task.archive()
+                task.start_from(datetime(2020, 1, 1, tzinfo=timezone.utc))
+                task.end_on(datetime(2020, 2, 1, tzinfo=timezone.utc))
+            assert not Activity.objects.filter(task=task, verb=ActivityVerbs.ENDED).exists()
+
+    inserts = [query['sql'] for query in queries if query['sql'].startswith('INSERT INTO "api_activity"')]
+    assert len(inserts) == 1
+    assert [verb for verb, _, _ in verbs(task)[1:]] == [
+        ActivityVerbs.STATE_CHANGED, ActivityVerbs.STARTED, ActivityVerbs.ENDED]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_activity_feeds_are_paged_by_cursor():
+    project = create_dummy_project_with_user()
+    user = project.created_by
+    task = Task.objects.create(user, project, 'First Task')
+    for day in range(1, 61):
+        task.start_from(datetime(2020, 1, day % 28 + 1, day // 28 + 1, tzinfo=timezone.utc))
+    client = APIClient()
+    client.force_authenticate(user)
+
+    first = client.get('/api/tasks/%d/activity/' % task.pk)
+    assert first.status_code == 200
+    assert len(first.data['results']) == 50
+    ids = [event['id'] for event in first.data['results']]
+    assert ids == sorted(ids, reverse=True)
+    assert first.data['previous'] is None
+
+    second = client.get(first.data['next'])
+    assert len(second.data['results']) == 11
+    assert second.data['results'][-1]['verb'] == ActivityVerbs.MEMBER_ADDED
+    assert second.data['next'] is None
+
+    feed = client.get('/api/projects/%d/activity/' % project.pk)
+    assert feed.status_code == 200
+    # the tasks' events are the project's too
+    assert feed.data['results'][0]['task'] == task.pk
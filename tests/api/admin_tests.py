@@ -0,0 +1,67 @@
+import pytest
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from tests.models.test_helper import create_dummy_project_with_user
+from api.admin import EstimatedCountPaginator
+from api.models.tasks import Task
+
+
+@pytest.fixture
+def tasks():
+    project = create_dummy_project_with_user()
+    user = project.created_by
+    return [Task.objects.create(user, project, 'Task %02d' % number) for number in range(12)]
+
+
+@pytest.fixture
+def admin_client(client):
+    client.force_login(User.objects.create_superuser('admin', 'admin@mail.com', 'password'))
+    return client
+
+
+@pytest.mark.django_db
+def test_counts_stop_at_the_limit(settings, tasks):
+    settings.ADMIN_EXACT_COUNT_LIMIT = 100
+    assert EstimatedCountPaginator(Task.objects.order_by('id'), 5).count == 12
+
+    settings.ADMIN_EXACT_COUNT_LIMIT = 5
+    Task.objects.filter(pk=tasks[0].pk).delete()
+    # the whole table: the highest id, deleted rows included
+    assert EstimatedCountPaginator(Task.objects.order_by('id'), 5).count == tasks[-1].pk
+    # filtered: as far as it counted
+    assert EstimatedCountPaginator(Task.objects.filter(title__gte='Task').order_by('id'), 5).count == 6
+
+
+@pytest.mark.django_db
+def test_changelist_queries_dont_grow_with_the_rows(admin_client, tasks):
+    def changelist_queries():
+        with CaptureQueriesContext(connection) as queries:
+            assert admin_client.get('/admin/api/task/').status_code == 200
+        return len(queries)
+
+    before = changelist_queries()
+    project = tasks[0].project
+    for number in range(10):
+        Task.objects.create(project.created_by, project, 'More %d' % number)
+    assert changelist_queries() == before
+
+    with CaptureQueriesContext(connection) as queries:
+        assert admin_client.get('/admin/api/relatedtask/').status_code == 200
+    assert not [query for query in queries if 'COUNT(*)' in query['sql'] and 'LIMIT' not in query['sql']]
+
+
+@pytest.mark.django_db
+def test_search_by_id_and_title_prefix(admin_client, tasks):
+    tasks[0].add_sub_task(tasks[1])
+    response = admin_client.get('/admin/api/task/', {'q': 'Task 1'})
+    assert sorted(task.title for task in response.context['cl'].result_list) == ['Task 10', 'Task 11']
+
+    response = admin_client.get('/admin/api/task/', {'q': str(tasks[3].id)})
+    assert list(response.context['cl'].result_list) == [tasks[3]]
+
+    response = admin_client.get('/admin/api/relatedtask/', {'q': str(tasks[1].id)})
+    assert len(response.context['cl'].result_list) == 1
+
+    response = admin_client.get('/admin/api/task/autocomplete/', {'term': 'Task 0'})
+    assert len(response.json()['results']) == 10
@@ -0,0 +1,97 @@
+import random
+import pytest
+from datetime import date, datetime, timedelta, timezone
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from tests.models.test_helper import create_dummy_project_with_user
+from api import analytics
+from api.analytics import series
+from api.models.tasks import Task, AvailableTaskStates
+
+
+def at(day):
+    return datetime(2024, 3, day, 12, tzinfo=timezone.utc)
+
+
+@pytest.fixture(params=['numpy', 'bisect'])
+def implementation(request, monkeypatch):
+    if request.param == 'bisect':
+        monkeypatch.setattr(analytics, 'numpy', None)
+    else:
+        pytest.importorskip('numpy')
+    return request.param
+
+
+def test_series_counts_tasks_and_hours_per_day(implementation):
+    rows = [
+        # started on the 2nd, done on the 3rd
+        (at(2), at(3), at(4), 5, AvailableTaskStates.CLOSED),
+        # started on the 3rd, still open
+        (at(3), None, at(3), 3, AvailableTaskStates.OPENED),
+        # not started
+        (None, None, None, 2, AvailableTaskStates.OPENED),
+        # closed without dates, done all along
+        (None, None, None, 1, AvailableTaskStates.CLOSED),
+    ]
+
+    result = series(rows, date(2024, 3, 1), date(2024, 3, 4))
+
+    assert result['days'] == [date(2024, 3, day) for day in range(1, 5)]
+    assert result['burndown']['remaining_hours'] == [10, 10, 5, 5]
+    assert result['burndown']['remaining_tasks'] == [3, 3, 2, 2]
+    assert result['burndown']['ideal_hours'] == [11, 7.33, 3.67, 0]
+    assert result['burndown']['due_hours'] == [0, 0, 3, 8]
+    assert result['cumulative_flow'] == {
+        'to_do': [3, 2, 1, 1],
+        'in_progress': [0, 1, 1, 1],
+        'done': [1, 1, 2, 2],
+    }
+
+
+def test_numpy_and_bisect_give_the_same_series(monkeypatch):
+    pytest.importorskip('numpy')
+    generator = random.Random(7)
+    first = date(2024, 1, 1)
+
+    def moment():
+        if generator.random() < 0.3:
+            return None
+        return datetime.combine(first + timedelta(days=generator.randrange(-20, 80)), datetime.min.time(), timezone.utc)
+
+    rows = [
+        (moment(), moment(), moment(), generator.randrange(0, 40), generator.choice(list(AvailableTaskStates)))
+        for _ in range(500)
+    ]
+    with_numpy = series(rows, first, date(2024, 3, 1))
+    monkeypatch.setattr(analytics, 'numpy', None)
+    assert series(rows, first, date(2024, 3, 1)) == with_numpy
+
+
+@pytest.mark.django_db(transaction=True)
+def test_analytics_are_cached_until_a_task_changes():
+    cache.clear()
+    project = create_dummy_project_with_user()
+    user = project.created_by
+    task = Task.objects.create(user, project, "Task", estimated_hours=4)
+    client = APIClient()
+    client.force_authenticate(user)
+    url = '/api/projects/%d/analytics/' % project.id
+    query = {'since': '2024-03-01', 'until': '2024-03-03'}
+
+    first = client.get(url, query)
+    assert first.status_code == 200
+    assert first.data['burndown']['remaining_hours'] == [4, 4, 4]
+
+    with CaptureQueriesContext(connection) as queries:
+        assert client.get(url, query).data == first.data
+    # only the version lookup, no rows read
+    assert len([q for q in queries.captured_queries if 'api_task' in q['sql']]) == 1
+
+    task.start_from(at(1))
+    task.state = AvailableTaskStates.CLOSED
+    task.ended_on = at(2)
+    task.save()
+    assert client.get(url, query).data['burndown']['remaining_hours'] == [4, 0, 0]
+    assert client.get(url, {'since': '2024-03-04', 'until': '2024-03-01'}).status_code == 400
@@ -0,0 +1,97 @@
+import threading
+import pytest
+from django.contrib.auth.models import User
+from rest_framework.test import APIClient
+from tests.models.test_helper import create_dummy_project_with_user
+from api.coalescing import SingleFlight
+from api.models.tasks import Task
+
+
+def test_concurrent_calls_share_one_computation():
+    singleflight = SingleFlight()
+    release = threading.Event()
+    calls = []
+    results = []
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return 'body'
+
+    threads = [
+        threading.Thread(target=lambda: results.append(singleflight.do('key', compute)))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    while not calls:
+        pass
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == ['body'] * 8
+    # no window, the next call computes again
+    assert singleflight.do('key', lambda: 'new body') == 'new body'
+
+
+def test_results_are_kept_for_the_window():
+    singleflight = SingleFlight()
+    assert singleflight.do('key', lambda: 1, window=60) == 1
+    assert singleflight.do('key', lambda: 2, window=60) == 1
+    assert singleflight.do('other key', lambda: 3, window=60) == 3
+
+    singleflight.invalidate()
+    assert singleflight.do('key', lambda: 4, window=60) == 4
+
+    # None is never shared
+    assert singleflight.do('none', lambda: None, window=60) is None
+    assert singleflight.do('none', lambda: 5, window=60) == 5
+
+    # past max_entries, calls run on their own
+    assert singleflight.do('one more', lambda: 6, window=60, max_entries=2) == 6
+    assert singleflight.do('one more', lambda: 7, window=60, max_entries=2) == 7
+
+
+def test_invalidation_drops_results_still_in_flight():
+    singleflight = SingleFlight()
+
+    def compute():
+        singleflight.invalidate()
+        return 'stale'
+
+    assert singleflight.do('key', compute, window=60) == 'stale'
+    assert singleflight.do('key', lambda: 'fresh', window=60) == 'fresh'
+
+
+@pytest.mark.django_db
+def test_identical_reads_are_served_from_the_rendered_body(settings, django_assert_num_queries):
+    settings.COALESCE_WINDOW = 60
+    project = create_dummy_project_with_user()
+    user = project.created_by
+    user.is_superuser = True
+    user.save()
+    task = Task.objects.create(user, project, 'First Task')
+    client = APIClient()
+    client.force_authenticate(user)
+
+    first = client.get('/api/tasks/')
+    with django_assert_num_queries(0):
+        second = client.get('/api/tasks/')
+    assert second.content == first.content
+    assert second['Content-Type'] == first['Content-Type']
+    assert second.data['results'][0]['title'] == 'First Task'
+
+    # a write shows right away
+    response = client.patch('/api/tasks/%d/' % task.id, {'title': 'Renamed'}, format='json')
+    assert response.status_code == 200
+    assert client.get('/api/tasks/').data['results'][0]['title'] == 'Renamed'
+
+    # other users, and other query strings, have their own
+    other = User.objects.create_user('jane', 'jane@mail.com', 'password', is_superuser=True)
+    client.force_authenticate(other)
+    assert client.get('/api/projects/').data['count'] == 0
+    client.force_authenticate(user)
+    assert client.get('/api/projects/').data['count'] == 1
+    assert client.get('/api/tasks/?page=2').status_code == 404
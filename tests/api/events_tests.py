@@ -0,0 +1,158 @@
+import asyncio
+import json
+import pytest
+from asgiref.sync import sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.contrib.auth.models import User
+from rest_framework_simplejwt.tokens import RefreshToken
+from tests.models.test_helper import create_dummy_project_with_user
+from api import events
+from api.events import EventBus, EventStreamApplication
+from api.models.projects import Project
+from api.models.tasks import Task
+
+
+def test_replay_resumes_after_the_last_event_id():
+    bus = EventBus(replay_size=3)
+    sent = [bus.publish(1, 'task', {'id': number}) for number in range(5)]
+    last_id = '%s-%d' % (bus.epoch, sent[2].sequence)
+
+    assert [event.sequence for event in bus.since(last_id)] == [4, 5]
+    assert bus.since('%s-5' % bus.epoch) == []
+    # events 2 and 3 are gone, another process or a restart had other ids
+    assert bus.since('%s-1' % bus.epoch) is None
+    assert bus.since('other-4') is None
+    assert bus.since('garbage') is None
+    assert sent[0].frame == ('id: %s-1\nevent: task\ndata: {"id":0}\n\n' % bus.epoch).encode()
+
+
+async def django_app(scope, receive, send):
+    await send({'type': 'http.response.start', 'status': 204, 'headers': []})
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+def request(path='/api/events/', headers=()):
+    scope = {
+        'type': 'http',
+        'method': 'GET',
+        'path': path,
+        'query_string': b'',
+        'headers': list(headers),
+    }
+    return ApplicationCommunicator(EventStreamApplication(django_app), scope)
+
+
+async def frames(communicator, count):
+    received = []
+    for _ in range(count):
+        message = await communicator.receive_output(5)
+        received.append(message['body'].decode())
+    return received
+
+
+@pytest.mark.django_db(transaction=True)
+def test_stream_sends_the_changes_of_the_user_projects(monkeypatch):
+    monkeypatch.setattr(events, 'bus', EventBus(100))
+    project = create_dummy_project_with_user()
+    user = project.created_by
+    stranger = User.objects.create_user('stranger', 'stranger@example.com', 'password')
+    other_project = Project.objects.create(stranger, 'Not yours', '')
+    token = str(RefreshToken.for_user(user).access_token)
+
+    async def scenario():
+        refused = request()
+        await refused.send_input({'type': 'http.request'})
+        assert (await refused.receive_output(5))['status'] == 401
+
+        other = request('/api/tasks/')
+        await other.send_input({'type': 'http.request'})
+        assert (await other.receive_output(5))['status'] == 204
+
+        communicator = request(headers=[
+            (b'authorization', b'Bearer ' + token.encode()),
+            (b'origin', b'http://localhost:4200'),
+        ])
+        await communicator.send_input({'type': 'http.request'})
+        start = await communicator.receive_output(5)
+        assert start['status'] == 200
+        assert (b'content-type', b'text/event-stream') in start['headers']
+        assert (b'access-control-allow-origin', b'http://localhost:4200') in start['headers']
+        assert (await frames(communicator, 1)) == ['retry: 3000\n\n']
+
+        await sync_to_async(Task.objects.create)(stranger, other_project, 'Hidden')
+        task = await sync_to_async(Task.objects.create)(user, project, 'Seen')
+        sent = await frames(communicator, 2)
+        await communicator.send_input({'type': 'http.disconnect'})
+        await communicator.wait(5)
+        return task, sent
+
+    task, sent = asyncio.run(scenario())
+
+    # the task, then its owner, nothing of the other project
+    assert [frame.split('\n')[1] for frame in sent] == ['event: task', 'event: member']
+    data = json.loads(sent[0].split('\n')[2][len('data: '):])
+    assert data == {
+        'action': 'saved', 'id': task.pk, 'project': project.pk, 'title': 'Seen', 'state': 'OPENED',
+        'assignee': None, 'dueOn': None
+    }
+    assert not events.bus.subscriptions
+
+
+@pytest.mark.django_db(transaction=True)
+def test_url_tokens_only_without_an_authorization_header(settings):
+    project = create_dummy_project_with_user()
+    user = project.created_by
+    token = str(RefreshToken.for_user(user).access_token).encode()
+    header = [(b'authorization', b'Bearer ' + token)]
+    assert events.authenticate({'headers': [], 'query_string': b'token=' + token}) is None
+
+    settings.EVENTS_QUERY_TOKEN = True
+    assert events.authenticate({'headers': header}) == user
+    assert events.authenticate({'headers': [], 'query_string': b'token=' + token}) == user
+    assert events.authenticate({'headers': header, 'query_string': b'token=' + token}) is None
+    assert events.authenticate({'headers': [(b'authorization', b'Bogus')], 'query_string': b'token=' + token}) is None
+
+    settings.EVENTS_QUERY_TOKEN = False
+    assert events.authenticate({'headers': [], 'query_string': b'token=' + token}) is None
+    assert events.authenticate({'headers': header}) == user
+
+
+@pytest.mark.django_db(transaction=True)
+def test_resumed_streams_replay_what_they_missed(monkeypatch):
+    monkeypatch.setattr(events, 'bus', EventBus(100))
+    project = create_dummy_project_with_user()
+    user = project.created_by
+    Task.objects.create(user, project, 'First')
+    last_id = '%s-%d' % (events.bus.epoch, events.bus.sequence)
+    Task.objects.create(user, project, 'Second')
+    token = str(RefreshToken.for_user(user).access_token)
+
+    async def scenario(last_event_id, count):
+        communicator = request(headers=[
+            (b'authorization', b'Bearer ' + token.encode()),
+            (b'last-event-id', last_event_id.encode()),
+        ])
+        await communicator.send_input({'type': 'http.request'})
+        assert (await communicator.receive_output(5))['status'] == 200
+        sent = await frames(communicator, count)
+        await communicator.send_input({'type': 'http.disconnect'})
+        await communicator.wait(5)
+        return sent
+
+    retry, task, owner = asyncio.run(scenario(last_id, 3))
+    assert task.startswith('id: %s-%d\nevent: task\n' % (events.bus.epoch, events.bus.sequence - 1))
+    assert '"title":"Second"' in task
+    assert '"action":"saved"' in owner and '"access":"OWNER"' in owner
+
+    retry, reset = asyncio.run(scenario('another-process-1', 2))
+    assert reset == 'event: reset\ndata: {}\n\n'
+
+
+def test_members_leaving_get_the_last_event_of_their_project():
+    bus = EventBus(10)
+    projects = {1}
+    assert events.visible(bus.publish(1, 'task', {'action': 'saved'}), 7, projects)
+    assert events.visible(bus.publish(1, 'member', {'action': 'deleted'}, user_id=7), 7, projects)
+    assert not events.visible(bus.publish(1, 'task', {'action': 'saved'}), 7, projects)
+    assert events.visible(bus.publish(2, 'member', {'action': 'saved'}, user_id=7), 7, projects)
+    assert projects == {2}
@@ -0,0 +1,73 @@
+import pytest
+from django.test import Client
+
+AVATAR_NAME = 'a' * 64 + '.png'
+AVATAR_CONTENT = b'\x89PNG\r\n\x1a\n' + bytes(range(256)) * 4
+
+
+@pytest.fixture
+def media_root(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    (tmp_path / 'project').mkdir()
+    (tmp_path / 'project' / AVATAR_NAME).write_bytes(AVATAR_CONTENT)
+    (tmp_path / 'project' / 'legacy.png').write_bytes(AVATAR_CONTENT)
+    return tmp_path
+
+
+def read(response):
+    return b''.join(response.streaming_content)
+
+
+def test_serve_content_addressed_avatar(media_root):
+    response = Client().get('/media/project/' + AVATAR_NAME)
+    assert response.status_code == 200
+    assert response['Content-Type'] == 'image/png'
+    assert response['Content-Length'] == str(len(AVATAR_CONTENT))
+    assert response['ETag'] == '"%s"' % ('a' * 64)
+    assert 'immutable' in response['Cache-Control']
+    assert read(response) == AVATAR_CONTENT
+
+
+def test_legacy_names_have_to_revalidate(media_root):
+    response = Client().get('/media/project/legacy.png')
+    assert response.status_code == 200
+    assert 'must-revalidate' in response['Cache-Control']
+
+
+def test_matching_etag_is_not_modified(media_root):
+    etag = Client().get('/media/project/' + AVATAR_NAME)['ETag']
+    response = Client().get('/media/project/' + AVATAR_NAME, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 304
+    assert response['ETag'] == etag
+
+
+def test_byte_ranges(media_root):
+    client = Client()
+    response = client.get('/media/project/' + AVATAR_NAME, HTTP_RANGE='bytes=8-15')
+    assert response.status_code == 206
+    assert response['Content-Range'] == 'bytes 8-15/%d' % len(AVATAR_CONTENT)
+    assert read(response) == AVATAR_CONTENT[8:16]
+
+    response = client.get('/media/project/' + AVATAR_NAME, HTTP_RANGE='bytes=-4')
+    assert read(response) == AVATAR_CONTENT[-4:]
+
+    response = client.get('/media/project/' + AVATAR_NAME, HTTP_RANGE='bytes=99999-')
+    assert response.status_code == 416
+
+    # stale If-Range gets the whole file
+    response = client.get(
+        '/media/project/' + AVATAR_NAME, HTTP_RANGE='bytes=8-15', HTTP_IF_RANGE='"stale"')
+    assert response.status_code == 200
+
+
+def test_offload_to_web_server(media_root, settings):
+    settings.MEDIA_SERVE_MODE = 'x-accel-redirect'
+    response = Client().get('/media/project/' + AVATAR_NAME)
+    assert response['X-Accel-Redirect'] == '/protected-media/project/' + AVATAR_NAME
+    assert response.content == b''
+
+
+def test_files_outside_media_root_are_not_served(media_root):
+    assert Client().get('/media/../settings.py').status_code == 404
+    assert Client().get('/media/project/missing.png').status_code == 404
+    assert Client().post('/media/project/' + AVATAR_NAME).status_code == 405
@@ -0,0 +1,70 @@
+import threading
+import pytest
+from django.contrib.auth.models import User
+from rest_framework.test import APIClient
+from api import metrics
+from api.metrics import MetricsRegistry
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    registry = MetricsRegistry(str(tmp_path), name='this-worker')
+    monkeypatch.setattr(metrics, 'registry', registry)
+    monkeypatch.setattr('api.middleware.registry', registry)
+    monkeypatch.setattr('api.views.registry', registry)
+    return registry
+
+
+def test_histogram_buckets_are_cumulative(tmp_path):
+    registry = MetricsRegistry(str(tmp_path), buckets=(0.1, 1.0))
+    labels = (('view', 'TaskViewSet.list'),)
+    for value in (0.05, 0.1, 0.5, 3):
+        registry.observe('tmrex_http_request_duration_seconds', value, labels)
+
+    text = registry.render()
+    assert 'tmrex_http_request_duration_seconds_bucket{view="TaskViewSet.list",le="0.1"} 2' in text
+    assert 'tmrex_http_request_duration_seconds_bucket{view="TaskViewSet.list",le="1.0"} 3' in text
+    assert 'tmrex_http_request_duration_seconds_bucket{view="TaskViewSet.list",le="+Inf"} 4' in text
+    assert 'tmrex_http_request_duration_seconds_count{view="TaskViewSet.list"} 4' in text
+    assert 'tmrex_http_request_duration_seconds_sum{view="TaskViewSet.list"} 3.65' in text
+
+
+def test_threads_and_processes_add_up(tmp_path):
+    worker = MetricsRegistry(str(tmp_path), name='worker-1')
+    other_worker = MetricsRegistry(str(tmp_path), name='worker-2')
+    labels = (('cache', 'serializers'),)
+
+    threads = [
+        threading.Thread(target=lambda: [worker.inc('tmrex_cache_hits_total', labels) for _ in range(100)])
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    other_worker.inc('tmrex_cache_hits_total', labels, 5)
+    other_worker.flush()
+
+    assert 'tmrex_cache_hits_total{cache="serializers"} 405' in worker.render()
+
+
+@pytest.mark.django_db
+def test_requests_are_counted_per_view_action(registry):
+    user = User.objects.create_user('john', 'john@mail.com', 'password')
+    client = APIClient()
+    client.force_authenticate(user)
+    client.get('/api/tasks/')
+    client.get('/api/tasks/')
+    client.get('/api/projects/1/')
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    text = response.content.decode()
+    assert 'tmrex_http_requests_total{view="TaskViewSet.list",method="GET",status="200"} 2' in text
+    assert 'tmrex_http_requests_total{view="ProjectViewSet.retrieve",method="GET",status="404"} 1' in text
+    assert 'tmrex_http_request_duration_seconds_count{view="TaskViewSet.list"} 2' in text
+    assert 'tmrex_db_queries_total{view="TaskViewSet.list"}' in text
+
+
+def test_metrics_are_not_public(registry, client):
+    assert client.get('/metrics', REMOTE_ADDR='10.0.0.8').status_code == 403
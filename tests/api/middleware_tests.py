@@ -0,0 +1,60 @@
+import logging
+import pytest
+from django.contrib.auth.models import User
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from django.test import RequestFactory
+from api.middleware import QueryInstrumentationMiddleware, fingerprint
+
+
+def chatty_view(request):
+    for user_id in range(3):
+        User.objects.filter(id=user_id).exists()
+    User.objects.filter(id__in=[1, 2, 3]).exists()
+    User.objects.filter(id__in=[1, 2]).exists()
+    return HttpResponse('ok')
+
+
+def test_fingerprint_ignores_number_of_params():
+    first, _ = fingerprint('SELECT 1 FROM t WHERE id IN (%s, %s, %s)')
+    second, _ = fingerprint('SELECT 1 FROM t WHERE id IN (%s, %s)')
+    other, _ = fingerprint('SELECT 1 FROM t WHERE id = %s')
+    assert first == second
+    assert first != other
+
+
+def test_middleware_is_dropped_without_sampling(settings):
+    settings.SQL_SAMPLE_RATE = 0
+    with pytest.raises(MiddlewareNotUsed):
+        QueryInstrumentationMiddleware(chatty_view)
+
+
+@pytest.mark.django_db
+def test_middleware_counts_queries_and_logs_duplicates(settings, caplog):
+    settings.SQL_SAMPLE_RATE = 1
+    settings.SQL_LOG_QUERY_COUNT = 5
+    middleware = QueryInstrumentationMiddleware(chatty_view)
+    request = RequestFactory().get('/api/tasks/')
+
+    with caplog.at_level(logging.WARNING, logger='api.sql'):
+        response = middleware(request)
+
+    assert request.sql_queries.count == 5
+    assert response['Server-Timing'].startswith('db;desc="5 queries";dur=')
+    assert 'db-dup;desc="5 duplicated"' in response['Server-Timing']
+    duplicates = request.sql_queries.duplicates()
+    assert [times for _, times, _ in duplicates] == [3, 2]
+    assert len(caplog.records) == 1
+    assert caplog.records[0].queries == 5
+
+
+@pytest.mark.django_db
+def test_middleware_stays_quiet_below_thresholds(settings, caplog):
+    settings.SQL_SAMPLE_RATE = 1
+    middleware = QueryInstrumentationMiddleware(chatty_view)
+
+    with caplog.at_level(logging.WARNING, logger='api.sql'):
+        response = middleware(RequestFactory().get('/api/tasks/'))
+
+    assert 'Server-Timing' in response
+    assert caplog.records == []
@@ -0,0 +1,81 @@
+import cProfile
+import marshal
+import pytest
+import threading
+from collections import Counter
+from django.contrib.auth.models import User
+from rest_framework.test import APIClient
+from api.profiling import ProfileStore, StackSampler, profiler, OVERFLOW_STACK
+
+
+@pytest.fixture
+def staff_client():
+    staff = User.objects.create_user('admin', 'admin@mail.com', 'password', is_staff=True)
+    client = APIClient()
+    client.force_authenticate(staff)
+    return client
+
+
+def test_store_is_bounded():
+    store = ProfileStore(max_stacks=2)
+    store.add(cProfile.Profile(), Counter({'a;b': 3, 'a;c': 1}))
+    store.add(cProfile.Profile(), Counter({'a;b': 1, 'a;d': 2, 'a;e': 2}))
+
+    assert store.requests == 2
+    assert store.stacks == Counter({'a;b': 4, 'a;c': 1, OVERFLOW_STACK: 4})
+    assert store.collapsed().splitlines()[0] in ('a;b 4', OVERFLOW_STACK + ' 4')
+
+
+def test_unwatched_stacks_are_not_sampled_any_more():
+    sampler = StackSampler(interval=1)
+    thread_id = threading.get_ident()
+    sampler.watch(thread_id)
+    sampler.sample()
+
+    stacks = sampler.unwatch(thread_id)
+    sampler.sample()
+
+    assert sum(stacks.values()) == 1
+    assert sampler.targets == {}
+
+
+@pytest.mark.django_db
+def test_sampled_requests_are_profiled(settings, staff_client):
+    settings.PROFILE_SAMPLE_RATE = 1
+    settings.PROFILE_INTERVAL = 0.0001
+    profiler.setup()
+    profiler.store.clear()
+
+    assert staff_client.get('/api/tasks/').status_code == 200
+    assert staff_client.get('/api/projects/').status_code == 200
+
+    response = staff_client.get('/api/profile/')
+    assert response.status_code == 200
+    assert response['X-Profiled-Requests'] == '2'
+
+    response = staff_client.get('/api/profile/', {'output': 'pstats'})
+    stats = marshal.loads(response.content)
+    assert any(name == 'list' for _, _, name in stats)
+
+    assert staff_client.delete('/api/profile/').status_code == 204
+    assert profiler.store.requests == 0
+
+
+@pytest.mark.django_db
+def test_header_triggers_profiling(settings, staff_client):
+    settings.PROFILE_SECRET = 's3cr3t'
+    profiler.setup()
+    profiler.store.clear()
+
+    staff_client.get('/api/tasks/')
+    assert profiler.store.requests == 0
+    staff_client.get('/api/tasks/', HTTP_X_PROFILE='s3cr3t')
+    assert profiler.store.requests == 1
+
+
+@pytest.mark.django_db
+def test_profile_is_for_staff_only():
+    user = User.objects.create_user('john', 'john@mail.com', 'password')
+    client = APIClient()
+    client.force_authenticate(user)
+    assert client.get('/api/profile/').status_code == 403
@@ -0,0 +1,105 @@
+import pytest
+from datetime import timedelta
+from io import StringIO
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.utils import timezone
+from tests.models.test_helper import create_dummy_project_with_user
+from api.models.notifications import Notification, NotificationKinds
+from api.models.tasks import Task, AvailableTaskStates, OPEN_STATES
+from api.reminders import DueScanner, due_batches
+
+
+def task_due(project, due_on, assignee=None, state=AvailableTaskStates.OPENED):
+    task = Task.objects.create(project.created_by, project, "Task", assignee=assignee)
+    task.due_on = due_on
+    task.state = state
+    task.save()
+    return task
+
+
+@pytest.mark.django_db(transaction=True)
+def test_scan_notifies_owners_and_assignees_once():
+    project = create_dummy_project_with_user()
+    owner = project.created_by
+    assignee = User.objects.create_user('paul', 'paul@thebeatles.com', 'password')
+    project.add_participant(assignee)
+    now = timezone.now()
+    overdue = task_due(project, now - timedelta(days=2), assignee=assignee)
+    due_soon = task_due(project, now + timedelta(hours=2))
+    task_due(project, now + timedelta(days=5))
+    task_due(project, now - timedelta(days=1), state=AvailableTaskStates.CLOSED)
+    scanner = DueScanner()
+
+    assert scanner.scan_once() == 3
+    assert set(Notification.objects.values_list('task_id', 'user_id', 'kind')) == {
+        (overdue.id, owner.id, NotificationKinds.OVERDUE),
+        (overdue.id, assignee.id, NotificationKinds.OVERDUE),
+        (due_soon.id, owner.id, NotificationKinds.DUE_SOON),
+    }
+
+    # the next scan skips what was announced
+    assert scanner.scan_once() == 0
+    assert Notification.objects.count() == 3
+
+
+@pytest.mark.django_db(transaction=True)
+def test_tasks_created_after_a_scan_are_announced_by_the_next():
+    project = create_dummy_project_with_user()
+    owner = project.created_by
+    scanner = DueScanner()
+    scanner.scan_once()
+    now = timezone.now()
+    due_soon = task_due(project, now + timedelta(hours=2))
+    overdue = task_due(project, now - timedelta(days=3))
+    reopened = task_due(project, now - timedelta(days=1), state=AvailableTaskStates.CLOSED)
+    scanner.scan_once()
+    reopened.state = AvailableTaskStates.OPENED
+    reopened.save()
+
+    scanner.scan_once()
+
+    assert set(Notification.objects.values_list('task_id', 'user_id', 'kind')) == {
+        (due_soon.id, owner.id, NotificationKinds.DUE_SOON),
+        (overdue.id, owner.id, NotificationKinds.OVERDUE),
+        (reopened.id, owner.id, NotificationKinds.OVERDUE),
+    }
+
+
+@pytest.mark.django_db(transaction=True)
+def test_announced_tasks_cost_no_recipients_query_or_insert(django_assert_num_queries):
+    project = create_dummy_project_with_user()
+    for days in range(1, 6):
+        task_due(project, timezone.now() - timedelta(days=days))
+    scanner = DueScanner()
+    assert scanner.scan_once() == 5
+
+    # one SELECT per window and open state, nothing else
+    with django_assert_num_queries(2 * len(OPEN_STATES)):
+        assert scanner.scan_once() == 0
+
+
+@pytest.mark.django_db(transaction=True)
+def test_due_batches_walk_ties_in_keyset_pages():
+    project = create_dummy_project_with_user()
+    due_on = timezone.now() - timedelta(days=1)
+    tasks = [task_due(project, due_on) for _ in range(5)]
+
+    pages = list(due_batches('default', AvailableTaskStates.OPENED, NotificationKinds.OVERDUE, None, timezone.now(), 2))
+
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert [row[0] for page in pages for row in page] == [task.id for task in tasks]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_scan_due_tasks_command(settings):
+    settings.DUE_SCAN_BATCH_SIZE = 1
+    project = create_dummy_project_with_user()
+    task_due(project, timezone.now() - timedelta(hours=1))
+    task_due(project, timezone.now() - timedelta(hours=2))
+    out = StringIO()
+
+    call_command('scan_due_tasks', '--once', stdout=out)
+
+    assert out.getvalue().strip() == '2 notifications written'
+    assert Notification.objects.filter(kind=NotificationKinds.OVERDUE).count() == 2
@@ -0,0 +1,56 @@
+import pytest
+from tests.models.test_helper import create_dummy_project_with_user
+from api.serializer_cache import cached_serializers
+from api.serializers import TaskReadSerializer, ProjectReadSerializer, UserMinReadSerializer
+from api.models.tasks import Task
+
+
+def test_fields_are_built_once_per_class(monkeypatch):
+    # the app config already built them at startup
+    assert TaskReadSerializer._field_prototypes is not None
+    assert UserMinReadSerializer in cached_serializers
+
+    def fail(self):
+        raise AssertionError("fields were introspected again")
+    monkeypatch.setattr('rest_framework.serializers.ModelSerializer.get_fields', fail)
+
+    TaskReadSerializer().fields
+    ProjectReadSerializer().fields
+
+
+def test_every_instance_binds_its_own_fields():
+    first = TaskReadSerializer()
+    second = TaskReadSerializer()
+
+    for name in ('title', 'task_users', 'sub_tasks', 'author'):
+        assert first.fields[name] is not second.fields[name]
+        assert first.fields[name].parent is first
+        assert second.fields[name].parent is second
+        assert first.fields[name].field_name == name
+
+    # what nested fields hold is copied and bound to the copy too
+    first_users, second_users = first.fields['task_users'], second.fields['task_users']
+    assert first_users.child is not second_users.child
+    assert first_users.child.parent is first_users
+    assert first.fields['sub_tasks'].child_relation.parent is first.fields['sub_tasks']
+    assert first_users.child.fields['user'] is not second_users.child.fields['user']
+
+    prototype = TaskReadSerializer._field_prototypes['title']
+    assert getattr(prototype, 'parent', None) is None
+
+
+@pytest.mark.django_db
+def test_output_is_unchanged():
+    project = create_dummy_project_with_user()
+    user = project.owners.first().user
+    task1 = Task.objects.create(user, project, 'First Task')
+    task2 = Task.objects.create(user, project, 'Second Task')
+    task1.add_sub_task(task2)
+
+    data = TaskReadSerializer(Task.objects.order_by('id'), many=True).data
+
+    assert [task['title'] for task in data] == ['First Task', 'Second Task']
+    assert data[0]['sub_tasks'] == [task2.id]
+    assert data[1]['parent_task'] == [task1.id]
+    assert data[0]['author']['username'] == user.username
+    assert data[0]['task_users'][0]['access'] == 'OWNER'
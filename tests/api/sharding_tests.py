@@ -0,0 +1,144 @@
+import io
+import pytest
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connections
+from rest_framework.test import APIClient
+from api import sharding
+from api.exceptions import InvalidOperation
+from api.models.projects import Project, ProjectUser
+from api.models.sharding import ProjectShard
+from api.models.tasks import Task, TaskUser, AvailableTaskRelations
+
+SHARDS = ('shard0', 'shard1')
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 512
+
+
+@pytest.fixture
+def shards(settings, tmp_path, transactional_db):
+    # two SQLite files, added once the test databases are set up
+    for alias in SHARDS:
+        connections.databases[alias] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': str(tmp_path / ('%s.sqlite3' % alias)),
+        }
+        connections.ensure_defaults(alias)
+        connections.prepare_test_settings(alias)
+    settings.PROJECT_SHARDS = SHARDS
+    for alias in SHARDS:
+        call_command('migrate', database=alias, run_syncdb=True, verbosity=0)
+    yield SHARDS
+
+    sharding.shutdown_executor()
+    sharding.directory.forget()
+    sharding.allocator.blocks.clear()
+    for alias in SHARDS:
+        connections[alias].close()
+        del connections[alias]
+        del connections.databases[alias]
+
+
+@pytest.fixture
+def owner():
+    return User.objects.create_user('john', 'john@mail.com', 'password', is_superuser=True)
+
+
+def rows_on(model, alias):
+    return set(model._base_manager.using(alias).values_list('pk', flat=True))
+
+
+def test_projects_and_their_rows_live_on_the_shard_of_their_id(shards, owner):
+    projects = [Project.objects.create(owner, 'Project %d' % number, 'spread') for number in range(4)]
+    tasks = [Task.objects.create(owner, project, 'Task of %s' % project.title) for project in projects]
+
+    for project, task in zip(projects, tasks):
+        shard = SHARDS[project.id % 2]
+        assert project._state.db == task._state.db == shard
+        assert project.id in rows_on(Project, shard)
+        assert task.id in rows_on(Task, shard)
+        assert project.owners.get().user == owner
+        assert task.owners.get().user == owner
+        assert task.project == project
+
+    # ids are unique over the shards, nothing went to default
+    assert len(set(task.id for task in tasks)) == 4
+    assert not Project._base_manager.using('default').exists()
+    assert not ProjectUser._base_manager.using('default').exists()
+
+    tasks[0].add_sub_task(Task.objects.create(owner, projects[0], 'Sub task'))
+    assert list(tasks[0].sub_tasks.values_list('title', flat=True)) == ['Sub task']
+    with pytest.raises(InvalidOperation):
+        tasks[0].add_sub_task(tasks[1])
+
+
+def test_the_api_reads_and_writes_every_shard(shards, owner, settings, tmp_path):
+    projects = [Project.objects.create(owner, 'Project %d' % number, 'spread') for number in range(3)]
+    client = APIClient()
+    client.force_authenticate(owner)
+
+    listed = client.get('/api/projects/').data
+    assert listed['count'] == 3
+    assert [project['id'] for project in listed['results']] == sorted(project.id for project in projects)
+    for project in projects:
+        assert client.get('/api/projects/%d/' % project.id).data['title'] == project.title
+
+    settings.MEDIA_ROOT = str(tmp_path)
+    for project in projects:
+        avatar = io.BytesIO(PNG)
+        avatar.name = 'avatar.png'
+        response = client.post('/api/tasks/', {
+            'title': 'Task', 'project': project.id, 'author': owner.id, 'avatar': avatar
+        })
+        assert response.status_code == 201, response.content
+        assert response.data['id'] in rows_on(Task, project._state.db)
+    first = Task.objects.using(projects[0]._state.db).get(project=projects[0])
+    second = Task.objects.create(owner, projects[0], 'Second Task')
+    first.add_related_task(second, AvailableTaskRelations.BLOCKED_BY)
+
+    assert client.get('/api/tasks/').data['count'] == 4
+    assert client.get('/api/tasks/%d/' % first.id).data['blocked_by_tasks'] == [second.id]
+    assert client.get('/api/tasks/?page=2').status_code == 404
+    assert client.delete('/api/tasks/%d/' % second.id).status_code == 204
+    assert client.get('/api/tasks/%d/' % second.id).status_code == 404
+
+
+def test_move_a_project_to_another_shard(shards, owner):
+    project = Project.objects.create(owner, 'Project', 'moving')
+    other = Project.objects.create(owner, 'Other project', 'staying')
+    source, target = project._state.db, other._state.db
+    first = Task.objects.create(owner, project, 'First Task')
+    second = Task.objects.create(owner, project, 'Second Task')
+    first.add_sub_task(second)
+
+    call_command('move_project', str(project.id), target, grace=0, verbosity=0)
+
+    assert project.id not in rows_on(Project, source)
+    assert not rows_on(Task, source) & {first.id, second.id}
+    assert rows_on(Task, target) >= {first.id, second.id}
+    assert ProjectShard.objects.get(project_id=project.id).shard == target
+
+    moved = Task.objects.using(target).get(pk=first.id)
+    assert list(moved.sub_tasks) == [Task.objects.using(target).get(pk=second.id)]
+    assert moved.owners.get().user == owner
+    assert moved.project.owners.get().user == owner
+
+    client = APIClient()
+    client.force_authenticate(owner)
+    assert client.get('/api/projects/%d/' % project.id).data['title'] == 'Project'
+    # new tasks follow the project
+    assert Task.objects.create(owner, moved.project, 'Third Task')._state.db == target
+
+
+def test_deleted_users_leave_every_shard(shards, owner):
+    guest = User.objects.create_user('jane', 'jane@mail.com', 'password')
+    projects = [Project.objects.create(owner, 'Project %d' % number, 'spread') for number in range(2)]
+    for project in projects:
+        project.add_guest(guest)
+        Task.objects.create(owner, project, 'Task').add_guest(guest)
+
+    guest.delete()
+
+    for alias in SHARDS:
+        assert not ProjectUser._base_manager.using(alias).filter(user_id=guest.id).exists()
+        assert not TaskUser._base_manager.using(alias).filter(user_id=guest.id).exists()
+        assert ProjectUser._base_manager.using(alias).filter(user_id=owner.id).exists()
@@ -0,0 +1,20 @@
+import pytest
+from io import StringIO
+from django.core.management import call_command
+from tests.models.test_helper import create_dummy_project_with_user
+
+
+@pytest.mark.django_db
+def test_table_sizes_lists_rows_and_bytes():
+    create_dummy_project_with_user()
+    out = StringIO()
+
+    call_command('table_sizes', 'api_project', 'api_projectuser', stdout=out)
+
+    lines = out.getvalue().splitlines()
+    assert lines[0].split() == ['table', 'rows', 'table', 'bytes', 'index', 'bytes']
+    table, rows, table_bytes, index_bytes = lines[1].split()
+    assert table == 'api_project'
+    assert rows == '1'
+    assert int(table_bytes) > 0
+    assert lines[-1].startswith('total')
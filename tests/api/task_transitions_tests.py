@@ -0,0 +1,128 @@
+import pytest
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from tests.models.test_helper import create_dummy_project_with_user
+from api.models.activity import Activity, ActivityVerbs
+from api.models.projects import Project
+from api.models.tasks import Task, AvailableTaskStates
+
+
+@pytest.mark.django_db(transaction=True)
+def test_transition_moves_the_allowed_tasks_in_one_update():
+    project = create_dummy_project_with_user()
+    user = project.created_by
+    opened = Task.objects.create(user, project, "Opened")
+    blocked = Task.objects.create(user, project, "Blocked")
+    blocked.block()
+    closed = Task.objects.create(user, project, "Closed")
+    closed.state = AvailableTaskStates.CLOSED
+    closed.save()
+
+    with CaptureQueriesContext(connection) as queries:
+        moved, refused, forbidden = Task.objects.transition(
+            [opened.id, blocked.id, closed.id], AvailableTaskStates.BLOCKED)
+
+    assert moved == {opened.id: AvailableTaskStates.OPENED}
+    assert refused == {blocked.id: AvailableTaskStates.BLOCKED, closed.id: AvailableTaskStates.CLOSED}
+    statements = [query['sql'] for query in queries.captured_queries if 'api_task' in query['sql']]
+    assert len([sql for sql in statements if sql.startswith('SELECT')]) == 1
+    assert len([sql for sql in statements if sql.startswith('UPDATE')]) == 1
+    opened.refresh_from_db()
+    assert opened.state == AvailableTaskStates.BLOCKED
+    assert Activity.objects.filter(task=opened, verb=ActivityVerbs.STATE_CHANGED).get().after == 'BLOCKED'
+
+
+@pytest.mark.django_db(transaction=True)
+def test_transition_through_the_api_reports_every_id():
+    project = create_dummy_project_with_user()
+    user = project.created_by
+    user.is_superuser = True
+    user.save()
+    opened = Task.objects.create(user, project, "Opened")
+    archived = Task.objects.create(user, project, "Archived")
+    archived.archive()
+    stranger = User.objects.create_user('ringo', 'ringo@thebeatles.com', 'password')
+    their_project = Project.objects.create(stranger, 'Their project', 'Someone else')
+    hidden = Task.objects.create(stranger, their_project, "Not theirs")
+    client = APIClient()
+    client.force_authenticate(user)
+
+    response = client.post(
+        '/api/tasks/transition/',
+        {'tasks': [opened.id, archived.id, hidden.id, 999999, opened.id], 'state': AvailableTaskStates.OPENED},
+        format='json'
+    )
+
+    assert response.status_code == 200
+    assert response.data['results'] == [
+        {'id': opened.id, 'result': 'invalid_transition', 'state': 'OPENED'},
+        {'id': archived.id, 'result': 'changed', 'previous_state': 'ARCHIVED', 'state': 'OPENED'},
+        {'id': hidden.id, 'result': 'not_found'},
+        {'id': 999999, 'result': 'not_found'},
+    ]
+    hidden.refresh_from_db()
+    assert hidden.state == AvailableTaskStates.OPENED
+
+
+@pytest.mark.django_db(transaction=True)
+def test_transition_takes_cascade_archived_tasks_back_where_unarchive_would():
+    project = create_dummy_project_with_user()
+    user = project.created_by
+    blocked = Task.objects.create(user, project, "Blocked")
+    blocked.block()
+    opened = Task.objects.create(user, project, "Opened")
+    project.archive(cascade=True)
+
+    moved, refused, forbidden = Task.objects.transition([blocked.id, opened.id], AvailableTaskStates.OPENED)
+
+    assert moved == {opened.id: AvailableTaskStates.ARCHIVED}
+    assert refused == {blocked.id: AvailableTaskStates.ARCHIVED}
+    blocked.refresh_from_db()
+    assert blocked.state == AvailableTaskStates.ARCHIVED
+    assert blocked.archived_from == AvailableTaskStates.BLOCKED
+
+    moved, refused, forbidden = Task.objects.transition([blocked.id], AvailableTaskStates.BLOCKED)
+
+    assert moved == {blocked.id: AvailableTaskStates.ARCHIVED}
+    blocked.refresh_from_db()
+    assert blocked.state == AvailableTaskStates.BLOCKED
+    assert blocked.archived_from is None
+
+
+@pytest.mark.django_db(transaction=True)
+def test_guests_may_not_transition_tasks():
+    project = create_dummy_project_with_user()
+    task = Task.objects.create(project.created_by, project, "Task")
+    guest = User.objects.create_superuser('ringo', 'ringo@thebeatles.com', 'password')
+    project.add_guest(guest)
+    client = APIClient()
+    client.force_authenticate(guest)
+
+    response = client.post(
+        '/api/tasks/transition/',
+        {'tasks': [task.id], 'state': AvailableTaskStates.CLOSED},
+        format='json'
+    )
+
+    assert response.status_code == 200
+    assert response.data['results'] == [{'id': task.id, 'result': 'forbidden'}]
+    task.refresh_from_db()
+    assert task.state == AvailableTaskStates.OPENED
+
+
+@pytest.mark.django_db(transaction=True)
+def test_transition_rejects_unknown_states():
+    project = create_dummy_project_with_user()
+    user = project.created_by
+    user.is_superuser = True
+    user.save()
+    task = Task.objects.create(user, project, "Task")
+    client = APIClient()
+    client.force_authenticate(user)
+
+    response = client.post('/api/tasks/transition/', {'tasks': [task.id], 'state': 'DONE'}, format='json')
+
+    assert response.status_code == 400
+
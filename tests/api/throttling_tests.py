@@ -0,0 +1,123 @@
+import os
+import pytest
+from django.contrib.auth.models import AnonymousUser, User
+from rest_framework.test import APIClient, APIRequestFactory
+from api.throttling import BucketTable, TokenBucketThrottle, parse_rate, SLOT, WAYS
+
+
+@pytest.fixture
+def throttling(settings):
+    settings.THROTTLE_ENABLED = True
+    settings.THROTTLE_BUCKETS = {'TaskViewSet.list': (2, '1/min'), 'Register.post': (1, '1/min')}
+    return settings
+
+
+def test_rates():
+    assert parse_rate('10/s') == 10
+    assert parse_rate('5/min') == 5 / 60
+    assert parse_rate('0.5/s') == 0.5
+    with pytest.raises(ValueError):
+        parse_rate('10 per second')
+
+
+def test_bucket_refills_up_to_its_capacity(tmp_path):
+    table = BucketTable(str(tmp_path / 'buckets'), 64)
+    assert table.take('scope', 'ip:1', 2, 1, now=100) == 0
+    assert table.take('scope', 'ip:1', 2, 1, now=100) == 0
+    assert table.take('scope', 'ip:1', 2, 1, now=100) == pytest.approx(1)
+    assert table.take('scope', 'ip:1', 2, 1, now=100.5) == pytest.approx(0.5)
+    assert table.take('scope', 'ip:1', 2, 1, now=101) == 0
+    # a long pause refills two tokens, not ten
+    for _ in range(2):
+        assert table.take('scope', 'ip:1', 2, 1, now=111) == 0
+    assert table.take('scope', 'ip:1', 2, 1, now=111) > 0
+
+
+def test_memory_is_fixed_and_stale_buckets_go_first(tmp_path):
+    path = str(tmp_path / 'buckets')
+    table = BucketTable(path, 64)
+    for client in range(1000):
+        table.take('scope', 'ip:%d' % client, 1, 1, now=100)
+    assert os.path.getsize(path) == 64 * SLOT.size
+
+    # a single set: the client seen last keeps its (empty) bucket, the oldest one is dropped
+    table = BucketTable(str(tmp_path / 'small'), WAYS)
+    for client in range(WAYS):
+        table.take('scope', 'ip:%d' % client, 1, 0.001, now=client)
+    table.take('scope', 'ip:%d' % (WAYS - 1), 1, 0.001, now=WAYS)
+    table.take('scope', 'ip:new', 1, 0.001, now=WAYS)
+    assert table.take('scope', 'ip:%d' % (WAYS - 1), 1, 0.001, now=WAYS) > 0
+    assert table.take('scope', 'ip:0', 1, 0.001, now=WAYS) == 0
+
+
+def test_workers_share_the_buckets(tmp_path):
+    path = str(tmp_path / 'buckets')
+    worker, other_worker = BucketTable(path, 64), BucketTable(path, 64)
+    assert worker.take('scope', 'user:1', 1, 1, now=100) == 0
+    assert other_worker.take('scope', 'user:1', 1, 1, now=100) > 0
+    assert other_worker.take('other scope', 'user:1', 1, 1, now=100) == 0
+
+
+@pytest.mark.django_db
+def test_throttled_requests_get_a_retry_after(throttling):
+    user = User.objects.create_user('john', 'john@mail.com', 'password')
+    client = APIClient()
+    client.force_authenticate(user)
+    assert client.get('/api/tasks/').status_code == 200
+    assert client.get('/api/tasks/').status_code == 200
+
+    response = client.get('/api/tasks/')
+    assert response.status_code == 429
+    assert 50 < int(response['Retry-After']) <= 60
+
+    # other actions, and other users, have their own budget
+    assert client.get('/api/projects/').status_code == 200
+    client.force_authenticate(User.objects.create_user('jane', 'jane@mail.com', 'password'))
+    assert client.get('/api/tasks/').status_code == 200
+
+
+@pytest.mark.django_db
+def test_anonymous_clients_are_told_apart_by_ip(throttling):
+    client = APIClient()
+
+    def signup(username, ip):
+        data = {'username': username, 'email': '%s@mail.com' % username, 'password': 'password',
+                'first_name': username, 'last_name': 'Doe'}
+        return client.post('/api/signup', data, REMOTE_ADDR=ip).status_code
+
+    assert signup('john', '10.0.0.1') == 201
+    assert signup('jane', '10.0.0.1') == 429
+    assert signup('jane', '10.0.0.2') == 201
+
+
+@pytest.mark.django_db
+def test_bogus_authorization_headers_share_the_ip_bucket(throttling):
+    client = APIClient()
+
+    def signup(username, authorization):
+        data = {'username': username, 'email': '%s@mail.com' % username, 'password': 'password',
+                'first_name': username, 'last_name': 'Doe'}
+        return client.post('/api/signup', data, REMOTE_ADDR='10.0.0.1',
+                           HTTP_AUTHORIZATION=authorization).status_code
+
+    assert signup('john', 'Junk 1') == 201
+    assert signup('jane', 'Junk 2') == 429
+    assert signup('paul', 'Junk 3') == 429
+
+
+def test_clients_are_keyed_by_user_then_ip():
+    throttle = TokenBucketThrottle()
+    request = APIRequestFactory().get('/api/tasks/', REMOTE_ADDR='10.0.0.1')
+    request.user = AnonymousUser()
+    assert throttle.get_key(request) == 'ip:10.0.0.1'
+
+    # a header that authenticated no one
+    request.META['HTTP_AUTHORIZATION'] = 'Junk some-token'
+    assert throttle.get_key(request) == 'ip:10.0.0.1'
+
+    request.user = User(pk=7)
+    assert throttle.get_key(request) == 'user:7'
+
+
+def test_turned_off_by_default_in_tests(settings):
+    assert settings.THROTTLE_ENABLED is False
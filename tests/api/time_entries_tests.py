@@ -0,0 +1,126 @@
+import json
+import pytest
+from datetime import datetime, timezone
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from tests.models.test_helper import create_dummy_project_with_user
+from api.models.tasks import Task
+from api.models.time_entries import TimeEntry
+from api.models.webhooks import Webhook, OutboxMessage
+from api.webhooks import subscriptions
+
+
+@pytest.mark.django_db(transaction=True)
+def test_log_adds_to_hours_spent_without_losing_concurrent_entries():
+    project = create_dummy_project_with_user()
+    user = project.created_by
+    task = Task.objects.create(user, project, "Task")
+    # two workers holding the same task
+    stale = Task.objects.get(pk=task.pk)
+
+    TimeEntry.objects.log(task, user, 3)
+    entry = TimeEntry.objects.log(stale, user, 2)
+    stale.update_title("Renamed")
+
+    task.refresh_from_db()
+    assert task.hours_spent == 5
+    entry.delete()
+    task.refresh_from_db()
+    assert task.hours_spent == 3
+
+
+@pytest.mark.django_db(transaction=True)
+def test_logged_hours_are_announced():
+    subscriptions.entries.clear()
+    project = create_dummy_project_with_user()
+    user = project.created_by
+    task = Task.objects.create(user, project, "Task")
+    Webhook.objects.create(project=project, url='http://93.184.216.34/hook')
+
+    entry = TimeEntry.objects.log(task, user, 3)
+    entry.delete()
+
+    events = [json.loads(message.payload) for message in OutboxMessage.objects.order_by('id')]
+    assert [(event['event'], event['tasks']) for event in events] == [
+        ('tasks.hours_changed', [task.id]),
+        ('tasks.hours_changed', [task.id]),
+    ]
+    assert all(event['project'] == project.id for event in events)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_time_reports_group_in_one_query():
+    project = create_dummy_project_with_user()
+    user = project.created_by
+    other = User.objects.create_user('paul', 'paul@thebeatles.com', 'password')
+    project.add_participant(other)
+    first = Task.objects.create(user, project, "First")
+    second = Task.objects.create(user, project, "Second")
+    monday = datetime(2024, 3, 4, 9, tzinfo=timezone.utc)
+    tuesday = datetime(2024, 3, 5, 9, tzinfo=timezone.utc)
+    TimeEntry.objects.log(first, user, 2, monday)
+    TimeEntry.objects.log(second, user, 3, tuesday)
+    TimeEntry.objects.log(first, other, 4, tuesday)
+    client = APIClient()
+    client.force_authenticate(user)
+
+    with CaptureQueriesContext(connection) as queries:
+        by_user = client.get('/api/projects/%d/time/' % project.id, {'by': 'user'})
+    assert by_user.status_code == 200
+    assert by_user.data['results'] == [
+        {'user': user.id, 'hours': 5, 'entries': 2},
+        {'user': other.id, 'hours': 4, 'entries': 1},
+    ]
+    assert len([query for query in queries.captured_queries if 'api_timeentry' in query['sql']]) == 1
+
+    by_day = client.get('/api/projects/%d/time/' % project.id, {'by': 'day', 'since': '2024-03-05'})
+    assert [(row['day'], row['hours']) for row in by_day.data['results']] == [(tuesday.date(), 7)]
+
+    by_task = client.get('/api/users/%d/time/' % user.id, {'by': 'task'})
+    assert by_task.data['results'] == [
+        {'task': first.id, 'hours': 2, 'entries': 1},
+        {'task': second.id, 'hours': 3, 'entries': 1},
+    ]
+    assert client.get('/api/users/%d/time/' % other.id, {'by': 'task'}).status_code == 403
+    assert client.get('/api/projects/%d/time/' % project.id, {'by': 'project'}).status_code == 400
+
+
+@pytest.mark.django_db(transaction=True)
+def test_book_time_through_the_api():
+    project = create_dummy_project_with_user()
+    user = project.created_by
+    user.is_superuser = True
+    user.save()
+    task = Task.objects.create(user, project, "Task")
+    # past the model permissions, not a member of the project
+    stranger = User.objects.create_superuser('ringo', 'ringo@thebeatles.com', 'password')
+    client = APIClient()
+    client.force_authenticate(user)
+
+    response = client.post('/api/tasks/%d/time/' % task.id, {'duration': 2}, format='json')
+
+    assert response.status_code == 201
+    assert client.get('/api/tasks/%d/' % task.id).data['hours_spent'] == 2
+    assert [entry['duration'] for entry in client.get('/api/tasks/%d/time/' % task.id).data['results']] == [2]
+    assert client.post('/api/tasks/%d/time/' % task.id, {'duration': 0}, format='json').status_code == 400
+    client.force_authenticate(stranger)
+    assert client.post('/api/tasks/%d/time/' % task.id, {'duration': 1}, format='json').status_code == 403
+
+
+@pytest.mark.django_db(transaction=True)
+def test_only_members_see_the_time_of_a_task():
+    project = create_dummy_project_with_user()
+    user = project.created_by
+    task = Task.objects.create(user, project, "Task")
+    TimeEntry.objects.log(task, user, 2)
+    guest = User.objects.create_user('paul', 'paul@thebeatles.com', 'password')
+    project.add_guest(guest)
+    stranger = User.objects.create_superuser('ringo', 'ringo@thebeatles.com', 'password')
+    client = APIClient()
+
+    client.force_authenticate(guest)
+    assert [entry['duration'] for entry in client.get('/api/tasks/%d/time/' % task.id).data['results']] == [2]
+    client.force_authenticate(stranger)
+    assert client.get('/api/tasks/%d/time/' % task.id).status_code == 403
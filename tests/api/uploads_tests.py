@@ -0,0 +1,78 @@
+import io
+import os
+import pytest
+from django.core.files.storage import default_storage
+from django.http.multipartparser import MultiPartParser
+from django.test.client import encode_multipart, BOUNDARY, MULTIPART_CONTENT
+from rest_framework.exceptions import ValidationError
+from api.uploads import AvatarUploadHandler, UploadTooLarge, sniff_image_header
+
+PNG_HEADER = b'\x89PNG\r\n\x1a\n'
+
+
+def parse_upload(content: bytes, name='avatar.png'):
+    upload = io.BytesIO(content)
+    upload.name = name
+    body = encode_multipart(BOUNDARY, {'title': 'Project', 'avatar': upload})
+    meta = {
+        'CONTENT_TYPE': MULTIPART_CONTENT,
+        'CONTENT_LENGTH': len(body),
+    }
+    parser = MultiPartParser(
+        meta, io.BytesIO(body), [AvatarUploadHandler()], 'utf-8')
+    return parser.parse()
+
+
+@pytest.fixture
+def media_root(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    settings.AVATAR_MAX_UPLOAD_SIZE = 256 * 1024
+    return tmp_path
+
+
+def test_sniff_image_header():
+    assert sniff_image_header(PNG_HEADER + b'rest') == ('.png', 'image/png')
+    assert sniff_image_header(b'\xff\xd8\xff\xe0') == ('.jpg', 'image/jpeg')
+    assert sniff_image_header(b'RIFF\x00\x00\x00\x00WEBPVP8 ') == ('.webp', 'image/webp')
+    assert sniff_image_header(b'<?php echo 1;') is None
+
+
+def test_upload_is_hashed_and_named_after_its_content(media_root):
+    content = PNG_HEADER + b'x' * 200 * 1024
+    data, files = parse_upload(content)
+    avatar = files['avatar']
+
+    assert data['title'] == 'Project'
+    assert avatar.size == len(content)
+    assert avatar.content_type == 'image/png'
+    assert avatar.name == avatar.content_hash + '.png'
+    # written next to the final location, not to the system temp dir
+    assert os.path.dirname(avatar.temporary_file_path()) == str(media_root)
+    assert avatar.read() == content
+    avatar.close()
+
+
+def test_upload_rejects_non_images(media_root):
+    with pytest.raises(ValidationError):
+        parse_upload(b'#!/bin/sh\nrm -rf /', 'avatar.png')
+    assert os.listdir(str(media_root)) == []
+
+
+def test_upload_rejects_oversized_files_while_streaming(media_root):
+    with pytest.raises(UploadTooLarge):
+        parse_upload(PNG_HEADER + b'x' * 300 * 1024)
+    assert os.listdir(str(media_root)) == []
+
+
+def test_same_avatar_is_stored_only_once(media_root):
+    content = PNG_HEADER + b'y' * 1024
+    first = parse_upload(content)[1]['avatar']
+    second = parse_upload(content)[1]['avatar']
+
+    first_name = default_storage.save('project/' + first.name, first)
+    second_name = default_storage.save('project/' + second.name, second)
+    first.close()
+    second.close()
+
+    assert first_name == second_name
+    assert os.listdir(str(media_root / 'project')) == [first.name]
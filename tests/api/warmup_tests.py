@@ -0,0 +1,32 @@
+import pytest
+from django.db import connection
+from api import warmup
+
+
+@pytest.mark.django_db
+def test_warm_up_runs_every_step(caplog):
+    connection.close()
+
+    timings = warmup.warm_up()
+
+    assert list(timings) == [name for name, _ in warmup.STEPS]
+    assert all(seconds >= 0 for seconds in timings.values())
+    assert connection.connection is not None
+    assert not [record for record in caplog.records if record.levelname == 'ERROR']
+
+
+def test_warm_up_can_be_turned_off(settings):
+    settings.WARM_UP = False
+
+    assert warmup.warm_up() == {}
+
+
+def test_a_failing_step_does_not_stop_the_worker(monkeypatch, caplog):
+    def broken():
+        raise RuntimeError('no database')
+    monkeypatch.setattr(warmup, 'STEPS', (('database', broken), ('models', warmup.warm_models)))
+
+    timings = warmup.warm_up()
+
+    assert list(timings) == ['database', 'models']
+    assert 'warm-up step database failed' in caplog.text
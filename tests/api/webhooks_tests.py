@@ -0,0 +1,244 @@
+import hashlib
+import hmac
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.test import APIClient
+from tests.models.test_helper import create_dummy_project_with_user
+from api.models.tasks import Task
+from api.models.webhooks import Webhook, OutboxMessage
+from api.webhooks import Dispatcher, subscriptions
+
+
+class Stub:
+    """
+    a local endpoint answering with `statuses` in turn (then 200), recording what it got
+    """
+
+    def __init__(self, statuses=(), delay=0):
+        self.statuses = list(statuses)
+        self.delay = delay
+        self.requests = []
+        self.connections = set()
+        self.running = 0
+        self.most_running = 0
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                with stub.lock:
+                    stub.running += 1
+                    stub.most_running = max(stub.most_running, stub.running)
+                    stub.connections.add(self.client_address)
+                    code = stub.statuses.pop(0) if stub.statuses else 200
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                time.sleep(stub.delay)
+                with stub.lock:
+                    stub.running -= 1
+                    stub.requests.append((self.path, dict(self.headers), body))
+                self.send_response(code)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def url(self, path='/hook'):
+        return 'http://127.0.0.1:%d%s' % (self.server.server_address[1], path)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def dispatcher(settings):
+    # the stubs listen on 127.0.0.1
+    settings.WEBHOOK_ALLOW_PRIVATE = True
+    dispatcher = Dispatcher()
+    yield dispatcher
+    dispatcher.close()
+
+
+@pytest.fixture(autouse=True)
+def fresh_subscriptions():
+    # the rows they point at are gone after the test
+    subscriptions.entries.clear()
+    yield
+    subscriptions.entries.clear()
+
+
+@pytest.mark.django_db
+def test_writes_add_outbox_messages_only_for_projects_with_webhooks():
+    project = create_dummy_project_with_user()
+    user = project.created_by
+    Task.objects.create(user, project, 'Before the webhook')
+    assert not OutboxMessage.objects.exists()
+
+    webhook = Webhook.objects.create(project=project, url='http://127.0.0.1:9/hook')
+    task = Task.objects.create(user, project, 'Watched')
+    task.update_title('Renamed')
+    # nothing changed, nothing to tell
+    task.update_title('Renamed')
+    with pytest.raises(ValueError):
+        with transaction.atomic():
+            task.update_title('Rolled back')
+            raise ValueError()
+    task.delete()
+
+    events = [json.loads(message.payload) for message in OutboxMessage.objects.order_by('id')]
+    assert [event['event'] for event in events] == ['task.created', 'task.updated', 'task.deleted']
+    assert events[1]['changed'] == ['title'] and events[1]['task']['title'] == 'Renamed'
+    assert all(message.webhook_id == webhook.pk for message in OutboxMessage.objects.all())
+
+
+@pytest.mark.django_db
+def test_dispatcher_delivers_batches_and_deletes_them(settings, dispatcher):
+    settings.WEBHOOK_EVENTS_PER_REQUEST = 2
+    settings.WEBHOOK_ENDPOINT_CONCURRENCY = 1
+    project = create_dummy_project_with_user()
+    with Stub() as stub:
+        webhook = Webhook.objects.create(project=project, url=stub.url())
+        for number in range(5):
+            Task.objects.create(project.created_by, project, 'Task %d' % number)
+
+        assert dispatcher.dispatch_once() == 5
+        assert dispatcher.dispatch_once() == 0
+
+    assert not OutboxMessage.objects.exists()
+    assert [len(json.loads(body)['events']) for _, _, body in stub.requests] == [2, 2, 1]
+    path, headers, body = stub.requests[0]
+    assert path == '/hook'
+    assert headers['X-Tmrex-Signature'] == 'sha256=' + hmac.new(
+        webhook.secret.encode(), body, hashlib.sha256).hexdigest()
+    # one at a time, on the same kept-alive connection
+    assert len(stub.connections) == 1
+
+
+@pytest.mark.django_db
+def test_messages_of_deactivated_webhooks_are_dropped(dispatcher):
+    project = create_dummy_project_with_user()
+    with Stub() as stub:
+        webhook = Webhook.objects.create(project=project, url=stub.url())
+        Task.objects.create(project.created_by, project, 'Queued')
+        # deactivated by another worker, this one still has it cached
+        Webhook.objects.filter(pk=webhook.pk).update(active=False)
+        Task.objects.create(project.created_by, project, 'Written after')
+
+        assert dispatcher.dispatch_once() == 2
+
+    assert stub.requests == []
+    assert not OutboxMessage.objects.exists()
+
+
+@pytest.mark.django_db
+def test_failed_deliveries_back_off_then_give_up(settings, dispatcher):
+    settings.WEBHOOK_MAX_ATTEMPTS = 3
+    project = create_dummy_project_with_user()
+    with Stub(statuses=[500, 503, 500]) as stub:
+        Webhook.objects.create(project=project, url=stub.url())
+        Task.objects.create(project.created_by, project, 'Task')
+
+        delays = []
+        for attempt in range(1, 4):
+            OutboxMessage.objects.update(next_attempt_on=timezone.now())
+            before = timezone.now()
+            assert dispatcher.dispatch_once() == 1
+            message = OutboxMessage.objects.get()
+            assert message.attempts == attempt
+            if message.next_attempt_on is not None:
+                delays.append((message.next_attempt_on - before).total_seconds())
+
+    assert message.next_attempt_on is None and message.last_error == 'HTTP 500'
+    assert dispatcher.dispatch_once() == 0
+    # 10s then 20s, jittered down to half
+    assert 5 <= delays[0] <= 10 and 10 <= delays[1] <= 20
+
+
+@pytest.mark.django_db
+def test_requests_to_an_endpoint_are_limited(settings, dispatcher):
+    settings.WEBHOOK_EVENTS_PER_REQUEST = 1
+    settings.WEBHOOK_ENDPOINT_CONCURRENCY = 2
+    project = create_dummy_project_with_user()
+    with Stub(delay=0.05) as stub:
+        for path in ('/a', '/b', '/c'):
+            Webhook.objects.create(project=project, url=stub.url(path))
+        for number in range(3):
+            Task.objects.create(project.created_by, project, 'Task %d' % number)
+
+        assert dispatcher.dispatch_once() == 9
+
+    assert len(stub.requests) == 9
+    assert stub.most_running == 2
+
+
+@pytest.mark.django_db
+def test_owners_manage_the_webhooks_of_their_project():
+    project = create_dummy_project_with_user()
+    user = project.created_by
+    user.is_superuser = True
+    user.save()
+    client = APIClient()
+    client.force_authenticate(user)
+
+    created = client.post(
+        '/api/projects/%d/webhooks/' % project.pk, {'url': 'https://93.184.216.34/hook'}, format='json')
+    assert created.status_code == 201
+    assert len(created.data['secret']) == 64
+    listed = client.get('/api/projects/%d/webhooks/' % project.pk)
+    assert [webhook['url'] for webhook in listed.data] == ['https://93.184.216.34/hook']
+
+    removed = client.delete('/api/projects/%d/webhooks/%d/' % (project.pk, created.data['id']))
+    assert removed.status_code == 204
+    assert not Webhook.objects.exists()
+
+
+@pytest.mark.django_db
+def test_webhooks_may_not_point_at_private_addresses():
+    project = create_dummy_project_with_user()
+    user = project.created_by
+    user.is_superuser = True
+    user.save()
+    client = APIClient()
+    client.force_authenticate(user)
+
+    for url in ('http://127.0.0.1:8000/hook', 'http://169.254.169.254/latest/meta-data/',
+                'http://10.0.0.5/hook', 'http://[::1]/hook', 'http://[::ffff:192.168.0.1]/hook',
+                'ftp://93.184.216.34/hook'):
+        response = client.post('/api/projects/%d/webhooks/' % project.pk, {'url': url}, format='json')
+        assert response.status_code == 400, url
+    assert not Webhook.objects.exists()
+
+
+@pytest.mark.django_db
+def test_dispatcher_does_not_connect_to_private_addresses(settings):
+    settings.WEBHOOK_ALLOW_PRIVATE = False
+    dispatcher = Dispatcher()
+    project = create_dummy_project_with_user()
+    try:
+        with Stub() as stub:
+            # added before the name pointed somewhere private, or straight in the database
+            Webhook.objects.create(project=project, url=stub.url())
+            Task.objects.create(project.created_by, project, 'Task')
+
+            assert dispatcher.dispatch_once() == 1
+    finally:
+        dispatcher.close()
+
+    assert stub.requests == [] and stub.connections == set()
+    message = OutboxMessage.objects.get()
+    assert message.attempts == 1 and 'not a public address' in message.last_error
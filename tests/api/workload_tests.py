@@ -0,0 +1,67 @@
+import pytest
+from datetime import date, datetime, timezone
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from tests.models.test_helper import create_dummy_project_with_user
+from api.models.tasks import Task, AvailableTaskStates
+
+
+def task_due(project, assignee, day, estimated_hours, hours_spent=0, state=AvailableTaskStates.OPENED):
+    task = Task.objects.create(project.created_by, project, "Task", assignee=assignee, estimated_hours=estimated_hours)
+    task.due_on = None if day is None else datetime(2024, 3, day, tzinfo=timezone.utc)
+    task.hours_spent = hours_spent
+    task.state = state
+    task.save()
+    return task
+
+
+@pytest.mark.django_db(transaction=True)
+def test_project_workload_sums_open_hours_per_assignee_and_week():
+    project = create_dummy_project_with_user()
+    user = project.created_by
+    other = User.objects.create_user('paul', 'paul@thebeatles.com', 'password')
+    project.add_participant(other)
+    # monday the 4th and the 11th of march 2024
+    task_due(project, user, 5, 30, hours_spent=10)
+    task_due(project, user, 7, 25)
+    task_due(project, user, 12, 8, hours_spent=20)
+    task_due(project, user, 12, 50, state=AvailableTaskStates.CLOSED)
+    task_due(project, other, None, 6)
+    client = APIClient()
+    client.force_authenticate(user)
+
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get('/api/projects/%d/workload/' % project.id)
+
+    assert response.status_code == 200
+    assert len([q for q in queries.captured_queries if 'api_task' in q['sql']]) == 1
+    assert response.data['weeks'] == [date(2024, 3, 4), date(2024, 3, 11), None]
+    assert response.data['assignees'] == [
+        {'assignee': user.id, 'hours': [45, 0, 0], 'tasks': [2, 1, 0], 'total_hours': 45, 'overloaded': True},
+        {'assignee': other.id, 'hours': [0, 0, 6], 'tasks': [0, 0, 1], 'total_hours': 6, 'overloaded': False},
+    ]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_users_workload_spans_projects():
+    project = create_dummy_project_with_user()
+    user = project.created_by
+    other = User.objects.create_user('paul', 'paul@thebeatles.com', 'password')
+    project.add_participant(other)
+    task_due(project, user, 5, 4)
+    task_due(project, other, 5, 3)
+    client = APIClient()
+    client.force_authenticate(user)
+
+    mine = client.get('/api/users/%d/workload/' % user.id)
+    assert [entry['assignee'] for entry in mine.data['assignees']] == [user.id]
+    assert client.get('/api/users/%d/workload/' % other.id).status_code == 403
+    assert client.get('/api/users/workload/', {'ids': '%d,%d' % (user.id, other.id)}).status_code == 403
+
+    user.is_staff = True
+    user.save()
+    both = client.get('/api/users/workload/', {'ids': '%d,%d' % (user.id, other.id)})
+    assert both.status_code == 200
+    assert [entry['total_hours'] for entry in both.data['assignees']] == [4, 3]
@@ -0,0 +1,103 @@
+import json
+import os
+import statistics
+import tracemalloc
+from time import perf_counter
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+# BENCHMARK_UPDATE=1 pytest tests/benchmarks rewrites the baseline with the current numbers
+UPDATE_BASELINE = os.environ.get('BENCHMARK_UPDATE') == '1'
+REPEAT = int(os.environ.get('BENCHMARK_REPEAT', 5))
+# wall time and memory are noisy, queries are not. Allow some slack on the first two
+TIME_TOLERANCE = float(os.environ.get('BENCHMARK_TIME_TOLERANCE', 3.0))
+TIME_SLACK_MS = 25
+MEMORY_TOLERANCE = 1.5
+MEMORY_SLACK_KB = 128
+
+
+class Measurement:
+    def __init__(self, queries, time_ms, peak_kb):
+        self.queries = queries
+        self.time_ms = time_ms
+        self.peak_kb = peak_kb
+
+    def as_dict(self):
+        return {
+            'queries': self.queries,
+            'time_ms': round(self.time_ms, 3),
+            'peak_kb': round(self.peak_kb, 1),
+        }
+
+
+def measure(func, repeat: int = REPEAT):
+    """
+    `func(i)` is called once to warm up, once to count queries, `repeat` times for the median
+    wall time and once under tracemalloc for the peak memory. `i` is different on every call
+    so create style calls can make unique rows
+    """
+    calls = iter(range(repeat + 3))
+    func(next(calls))
+
+    with CaptureQueriesContext(connection) as context:
+        func(next(calls))
+    queries = len(context.captured_queries)
+
+    timings = []
+    for _ in range(repeat):
+        i = next(calls)
+        start = perf_counter()
+        func(i)
+        timings.append((perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    try:
+        func(next(calls))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return Measurement(queries, statistics.median(timings), peak / 1024)
+
+
+class Baseline:
+    def __init__(self, path: str = BASELINE_PATH):
+        self.path = path
+        self.results = {}
+        if os.path.exists(path):
+            with open(path) as file:
+                self.results = json.load(file)
+
+    def save(self):
+        with open(self.path, 'w', newline='\r\n') as file:
+            json.dump(self.results, file, indent=2, sort_keys=True)
+            file.write('\n')
+
+    def check(self, name: str, measurement: Measurement):
+        """
+        returns the list of regressions of `measurement` against the stored baseline
+        """
+        if UPDATE_BASELINE:
+            self.results[name] = measurement.as_dict()
+            self.save()
+            return []
+
+        expected = self.results.get(name)
+        if expected is None:
+            return ['%s has no baseline, run with BENCHMARK_UPDATE=1 to record one' % name]
+
+        regressions = []
+        if measurement.queries > expected['queries']:
+            regressions.append('%s ran %d queries, baseline is %d' % (
+                name, measurement.queries, expected['queries']))
+        if measurement.time_ms > expected['time_ms'] * TIME_TOLERANCE + TIME_SLACK_MS:
+            regressions.append('%s took %.1fms, baseline is %.1fms' % (
+                name, measurement.time_ms, expected['time_ms']))
+        if measurement.peak_kb > expected['peak_kb'] * MEMORY_TOLERANCE + MEMORY_SLACK_KB:
+            regressions.append('%s peaked at %.0fkB, baseline is %.0fkB' % (
+                name, measurement.peak_kb, expected['peak_kb']))
+        return regressions
+
+
+baseline = Baseline()
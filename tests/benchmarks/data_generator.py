@@ -0,0 +1,137 @@
+import random
+from datetime import datetime, timedelta
+from django.contrib.auth.models import User
+from django.utils.timezone import utc
+from tests.models.test_helper import DefaultUser, DefaultTask
+from api.models.projects import Project, ProjectUser, AvailableAccessTypes, AvailableProjectStates
+from api.models.tasks import Task, TaskUser, RelatedTask, AvailableTaskStates, AvailableTaskRelations, Relationships
+
+EPOCH = datetime(2020, 1, 1, tzinfo=utc)
+
+
+class DatasetSize:
+    PROJECTS = 3
+    TASKS_PER_PROJECT = 20
+    # edges, each one is a single RelatedTask row
+    RELATIONS_PER_PROJECT = 15
+    USERS = 10
+
+
+class Dataset:
+    def __init__(self, owner, users, projects, tasks):
+        self.owner = owner
+        self.users = users
+        self.projects = projects
+        self.tasks = tasks
+
+    def tasks_of(self, project):
+        return [task for task in self.tasks if task.project_id == project.id]
+
+
+def create_dummy_users(count: int):
+    """
+    DefaultUser is a superuser owning every project, the others get random access.
+    Every one of them has DefaultUser.PASSWORD, hashed only once
+    """
+    owner = User.objects.create_superuser(
+        DefaultUser.USER_NAME,
+        DefaultUser.EMAIL,
+        DefaultUser.PASSWORD
+    )
+    User.objects.bulk_create([
+        User(
+            username='user%d' % i,
+            email='user%d@mail.com' % i,
+            first_name='First%d' % i,
+            last_name='Last%d' % i,
+            password=owner.password
+        )
+        for i in range(count)
+    ])
+    return owner, list(User.objects.exclude(id=owner.id).order_by('id'))
+
+
+def add_dummy_relations(rng, tasks, count: int):
+    relations = []
+    seen = set()
+    while len(relations) < count and len(seen) < len(tasks) * (len(tasks) - 1):
+        task_a, task_b = rng.sample(tasks, 2)
+        if (task_a.id, task_b.id) in seen:
+            continue
+        seen.add((task_a.id, task_b.id))
+        seen.add((task_b.id, task_a.id))
+        relation = rng.choice(AvailableTaskRelations.values)
+        # same row Task.add_related_task would write
+        task_a_id, task_b_id, relation = Relationships.canonical(task_a.id, task_b.id, relation)
+        relations.append(RelatedTask(task_a_id=task_a_id, task_b_id=task_b_id, is_connected_as=relation))
+    RelatedTask.objects.bulk_create(relations)
+
+
+def create_dummy_dataset(
+    projects: int = DatasetSize.PROJECTS,
+    tasks_per_project: int = DatasetSize.TASKS_PER_PROJECT,
+    relations_per_project: int = DatasetSize.RELATIONS_PER_PROJECT,
+    users: int = DatasetSize.USERS,
+    seed: int = 42
+):
+    """
+    Deterministic N projects x M tasks x K relations x U users, the same seed always gives the
+    same rows. Rows are bulk inserted, but look exactly like what the managers would create
+    """
+    rng = random.Random(seed)
+    owner, other_users = create_dummy_users(users)
+
+    Project.objects.bulk_create([
+        Project(
+            title='Project %d' % i,
+            description='Its project number %d' % i,
+            created_by=owner,
+            state=rng.choice(AvailableProjectStates.values),
+            started_on=EPOCH + timedelta(days=rng.randint(0, 30)),
+            avatar='project/avatar%d.png' % i
+        )
+        for i in range(projects)
+    ])
+    all_projects = list(Project.objects.order_by('id'))
+
+    project_users = []
+    members = {}
+    for project in all_projects:
+        members[project.id] = rng.sample(other_users, min(len(other_users), rng.randint(1, 5)))
+        project_users.append(ProjectUser(project=project, user=owner, access=AvailableAccessTypes.OWNER))
+        project_users.extend(
+            ProjectUser(project=project, user=user, access=rng.choice(AvailableAccessTypes.values))
+            for user in members[project.id]
+        )
+    ProjectUser.objects.bulk_create(project_users)
+
+    Task.objects.bulk_create([
+        Task(
+            title='%s %d' % (DefaultTask.TITLE, i),
+            description=DefaultTask.DESCRIPTION,
+            project=project,
+            author=owner,
+            assignee=rng.choice(members[project.id] + [None]),
+            estimated_hours=rng.randint(0, 40),
+            hours_spent=rng.randint(0, 40),
+            state=rng.choice(AvailableTaskStates.values),
+            started_on=EPOCH + timedelta(days=rng.randint(0, 60)),
+            due_on=EPOCH + timedelta(days=rng.randint(30, 120)),
+            avatar='task/avatar%d.png' % i
+        )
+        for project in all_projects
+        for i in range(tasks_per_project)
+    ])
+    all_tasks = list(Task.objects.order_by('id'))
+
+    task_users = []
+    for task in all_tasks:
+        task_users.append(TaskUser(task=task, user=owner, access=AvailableAccessTypes.OWNER))
+        if task.assignee_id is not None:
+            task_users.append(TaskUser(task=task, user_id=task.assignee_id, access=AvailableAccessTypes.PARTICIPANT))
+    TaskUser.objects.bulk_create(task_users)
+
+    dataset = Dataset(owner, other_users, all_projects, all_tasks)
+    for project in all_projects:
+        add_dummy_relations(rng, dataset.tasks_of(project), relations_per_project)
+    return dataset
@@ -0,0 +1,93 @@
+import io
+import pytest
+from rest_framework.test import APIClient
+from tests.models.test_helper import DefaultUser
+from tests.benchmarks.benchmark import baseline, measure
+from tests.benchmarks.data_generator import create_dummy_dataset
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 512
+
+
+def avatar():
+    upload = io.BytesIO(PNG)
+    upload.name = 'avatar.png'
+    return upload
+
+
+def obtain_token(client):
+    return client.post('/api/token/', {
+        'username': DefaultUser.USER_NAME,
+        'password': DefaultUser.PASSWORD
+    }).data
+
+
+ENDPOINTS = {
+    'GET /api/': (200, lambda client, data, i: client.get('/api/')),
+    'GET /api/users/': (200, lambda client, data, i: client.get('/api/users/')),
+    'GET /api/users/{id}/': (200, lambda client, data, i: client.get('/api/users/%d/' % data.users[0].id)),
+    'GET /api/projects/': (200, lambda client, data, i: client.get('/api/projects/')),
+    'GET /api/projects/{id}/': (
+        200, lambda client, data, i: client.get('/api/projects/%d/' % data.projects[0].id)),
+    'POST /api/projects/': (201, lambda client, data, i: client.post('/api/projects/', {
+        'title': 'Benchmark project %d' % i,
+        'description': 'created by the benchmarks',
+        'created_by': data.owner.id,
+        'avatar': avatar(),
+    })),
+    'GET /api/tasks/': (200, lambda client, data, i: client.get('/api/tasks/')),
+    'GET /api/tasks/{id}/': (200, lambda client, data, i: client.get('/api/tasks/%d/' % data.tasks[0].id)),
+    'POST /api/tasks/': (201, lambda client, data, i: client.post('/api/tasks/', {
+        'title': 'Benchmark task %d' % i,
+        'project': data.projects[0].id,
+        'author': data.owner.id,
+        'avatar': avatar(),
+    })),
+    'POST /api/signup': (201, lambda client, data, i: client.post('/api/signup', {
+        'username': 'signup%d' % i,
+        'email': 'signup%d@mail.com' % i,
+        'first_name': 'Sign',
+        'last_name': 'Up',
+        'password': DefaultUser.PASSWORD,
+    })),
+    'POST /api/token/': (200, lambda client, data, i: client.post('/api/token/', {
+        'username': DefaultUser.USER_NAME,
+        'password': DefaultUser.PASSWORD,
+    })),
+    'POST /api/token/refresh/': (200, lambda client, data, i: client.post(
+        '/api/token/refresh/', {'refresh': data.token['refresh']})),
+    'POST /api/token/verify/': (200, lambda client, data, i: client.post(
+        '/api/token/verify/', {'token': data.token['access']})),
+    'GET /api/profile/': ((200, 404), lambda client, data, i: client.get('/api/profile/')),
+    'GET /metrics': (200, lambda client, data, i: client.get('/metrics')),
+    'GET /media/{path}': (200, lambda client, data, i: client.get('/media/project/avatar.png')),
+}
+
+
+@pytest.fixture
+def media_root(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    (tmp_path / 'project').mkdir()
+    (tmp_path / 'project' / 'avatar.png').write_bytes(PNG)
+    return tmp_path
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('endpoint', ENDPOINTS.keys())
+def test_endpoint_benchmark(endpoint, media_root, settings):
+    # every request computes its response, the one before is not served again
+    settings.COALESCE_WINDOW = 0
+    data = create_dummy_dataset()
+    client = APIClient()
+    data.token = obtain_token(client)
+    client.force_authenticate(data.owner)
+    expected_status, call = ENDPOINTS[endpoint]
+    expected_status = expected_status if isinstance(expected_status, tuple) else (expected_status,)
+
+    def request(i):
+        response = call(client, data, i)
+        assert response.status_code in expected_status, response.content
+        if hasattr(response, 'streaming_content'):
+            b''.join(response.streaming_content)
+
+    regressions = baseline.check(endpoint, measure(request))
+    assert not regressions, '\n'.join(regressions)
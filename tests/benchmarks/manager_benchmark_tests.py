@@ -0,0 +1,70 @@
+import pytest
+from tests.benchmarks.benchmark import baseline, measure
+from tests.benchmarks.data_generator import create_dummy_dataset
+from api.models.projects import Project, ProjectUser, ProjectActions
+from api.models.tasks import Task, TaskUser, AvailableTaskRelations
+
+
+def evaluate_relations(task):
+    return [
+        list(task.sub_tasks),
+        list(task.parent_task),
+        list(task.just_related_tasks),
+        list(task.blocked_tasks),
+        list(task.blocked_by_tasks),
+    ]
+
+
+def add_and_remove_guest(data, i):
+    project = data.projects[0]
+    user = data.users[i % len(data.users)]
+    ProjectUser.objects.add_guest(project, user)
+    ProjectUser.objects.remove(project, user)
+
+
+def archive_and_unarchive_with_tasks(data, i):
+    project = data.projects[2]
+    project.archive(cascade=True)
+    project.unarchive(cascade=True)
+    project.activate()
+
+
+def add_and_remove_relation(data, i):
+    tasks = data.tasks_of(data.projects[1])
+    tasks[0].add_related_task(tasks[i + 1], AvailableTaskRelations.BLOCKED_BY)
+    tasks[0].remove_related_task(tasks[i + 1], AvailableTaskRelations.BLOCKED_BY)
+
+
+MANAGER_METHODS = {
+    'ProjectManager.create': lambda data, i: Project.objects.create(
+        data.owner, 'Benchmark project %d' % i, 'created by the benchmarks'),
+    'ProjectUserManager.find_user': lambda data, i: ProjectUser.objects.find_user(
+        data.projects[0], data.owner),
+    'ProjectUserManager.add_participant': lambda data, i: ProjectUser.objects.add_participant(
+        data.projects[0], data.users[i % len(data.users)]),
+    'ProjectUserManager.add_guest+remove': add_and_remove_guest,
+    'Project.owners+guests+participants': lambda data, i: [
+        list(data.projects[0].owners),
+        list(data.projects[0].guests),
+        list(data.projects[0].participants),
+    ],
+    'Project.has_access': lambda data, i: data.projects[0].has_access(data.owner, ProjectActions.ADD_TASK),
+    'TaskManager.create': lambda data, i: Task.objects.create(
+        data.owner, data.projects[0], 'Benchmark task %d' % i, None, data.users[i % len(data.users)]),
+    'TaskUserManager.find_user': lambda data, i: TaskUser.objects.find_user(data.tasks[0], data.owner),
+    'TaskUserManager.add_participant': lambda data, i: TaskUser.objects.add_participant(
+        data.tasks[0], data.users[i % len(data.users)]),
+    'Task.relations': lambda data, i: evaluate_relations(data.tasks[i % len(data.tasks)]),
+    'Task.add_related_task+remove_related_task': add_and_remove_relation,
+    'Project.archive+unarchive(cascade)': archive_and_unarchive_with_tasks,
+}
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('method', MANAGER_METHODS.keys())
+def test_manager_benchmark(method):
+    data = create_dummy_dataset()
+    call = MANAGER_METHODS[method]
+
+    regressions = baseline.check(method, measure(lambda i: call(data, i)))
+    assert not regressions, '\n'.join(regressions)
@@ -0,0 +1,35 @@
+import pytest
+from io import StringIO
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+
+@pytest.fixture
+def cold_worker_env(tmp_path, monkeypatch):
+    # the probe runs in its own interpreter, keep it off the development database
+    monkeypatch.setenv('TMREX_DATABASE', str(tmp_path / 'startup.sqlite3'))
+    monkeypatch.setenv('TMREX_MEDIA_ROOT', str(tmp_path / 'media'))
+
+
+@pytest.mark.parametrize('server', ['wsgi', 'asgi'])
+def test_worker_starts_within_budget(cold_worker_env, server):
+    out = StringIO()
+
+    call_command('startup_report', server=server, runs=1, imports=0, stdout=out)
+
+    report = out.getvalue()
+    assert 'warm-up: urls' in report
+    assert 'within budget' in report
+
+
+def test_report_fails_past_the_budget(cold_worker_env):
+    with pytest.raises(CommandError, match='ready after'):
+        call_command('startup_report', runs=1, imports=0, budget_ms=1, stdout=StringIO())
+
+
+def test_report_fails_when_a_deferred_module_is_imported(cold_worker_env, settings):
+    # the probe itself imports json, as good as any module the workers load
+    settings.STARTUP_DEFERRED_MODULES = ('json',)
+
+    with pytest.raises(CommandError, match='imported before the first request: json'):
+        call_command('startup_report', runs=1, imports=0, stdout=StringIO())
@@ -0,0 +1,15 @@
+import pytest
+from api.coalescing import singleflight
+
+
+@pytest.fixture(autouse=True)
+def no_throttling(settings, tmp_path):
+    # the buckets outlive a test (and the test run) in THROTTLE_FILE, the tests turn them on themselves
+    settings.THROTTLE_ENABLED = False
+    settings.THROTTLE_FILE = str(tmp_path / 'throttle')
+
+
+@pytest.fixture(autouse=True)
+def fresh_reads():
+    # a body rendered by the previous test may still be within COALESCE_WINDOW
+    singleflight.clear()
@@ -0,0 +1,430 @@
+"""
+Load generation harness. Seeds a fresh SQLite database, starts the app under WSGI or ASGI and
+replays a weighted mix of api calls from asyncio clients on the same machine, then reports
+throughput, p50/p95/p99 latency and error rate per endpoint.
+
+    python -m tests.load.harness --server gunicorn --workers 4 --duration 30
+
+`--server` is one of runserver (default, always available), gunicorn (WSGI) or uvicorn (ASGI);
+the last two have to be installed. `--url` points the harness at a server you started yourself
+on the database given with `--database`.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+TMREX_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'tmrex')
+
+DEFAULT_MIX = {
+    'signup': 1,
+    'token': 2,
+    'project_list': 5,
+    'task_list': 10,
+    'task_create': 2,
+    'task_detail': 5,
+}
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 1024
+BOUNDARY = 'tmrex-load-boundary'
+
+
+def parse_mix(value: str):
+    """
+    `task_list=10,token=1` -> {'task_list': 10, 'token': 1}
+    """
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError('unknown call %r, pick from %s' % (name, ', '.join(DEFAULT_MIX)))
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def percentile(sorted_values, q: float):
+    """
+    nearest-rank percentile of an already sorted list
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(q / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.started = None
+        self.finished = None
+
+    def record(self, endpoint: str, seconds: float, status: int):
+        self.latencies[endpoint].append(seconds * 1000)
+        self.statuses[endpoint][status] += 1
+        if status == 0 or status >= 400:
+            self.errors[endpoint] += 1
+
+    def report(self):
+        elapsed = max((self.finished or time.monotonic()) - self.started, 1e-9)
+        rows = {}
+        for endpoint in sorted(self.latencies):
+            latencies = sorted(self.latencies[endpoint])
+            rows[endpoint] = {
+                'requests': len(latencies),
+                'rps': len(latencies) / elapsed,
+                'p50_ms': percentile(latencies, 50),
+                'p95_ms': percentile(latencies, 95),
+                'p99_ms': percentile(latencies, 99),
+                'error_rate': self.errors[endpoint] / len(latencies),
+                'statuses': dict(self.statuses[endpoint]),
+            }
+        return {'duration_s': elapsed, 'endpoints': rows}
+
+
+def format_report(report):
+    lines = ['%-14s %9s %9s %9s %9s %9s %8s' % ('endpoint', 'requests', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms', 'errors')]
+    total = 0
+    for endpoint, row in report['endpoints'].items():
+        total += row['requests']
+        lines.append('%-14s %9d %9.1f %9.1f %9.1f %9.1f %7.1f%%' % (
+            endpoint, row['requests'], row['rps'], row['p50_ms'], row['p95_ms'], row['p99_ms'],
+            row['error_rate'] * 100))
+    lines.append('%d requests in %.1fs, %.1f req/s' % (
+        total, report['duration_s'], total / report['duration_s']))
+    return '\n'.join(lines)
+
+
+class HttpClient:
+    """
+    Bare bones keep-alive HTTP/1.1 client on asyncio streams, so the harness needs nothing
+    outside the standard library
+    """
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def request(self, method, path, body=b'', headers=None):
+        head = ['%s %s HTTP/1.1' % (method, path), 'Host: %s:%d' % (self.host, self.port),
+                'Content-Length: %d' % len(body)]
+        head.extend('%s: %s' % header for header in (headers or {}).items())
+        data = ('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body
+
+        for attempt in range(2):
+            if self.writer is None:
+                self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+            try:
+                self.writer.write(data)
+                await self.writer.drain()
+                return await self.read_response()
+            except (ConnectionError, asyncio.IncompleteReadError):
+                # the server dropped an idle keep-alive connection, try once on a new one
+                self.close()
+                if attempt:
+                    raise
+
+    async def read_response(self):
+        status_line = await self.reader.readuntil(b'\r\n')
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readuntil(b'\r\n')
+            if line == b'\r\n':
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if 'content-length' in headers:
+            body = await self.reader.readexactly(int(headers['content-length']))
+        elif headers.get('transfer-encoding', '').lower() == 'chunked':
+            body = b''
+            while True:
+                size = int((await self.reader.readuntil(b'\r\n')).split(b';')[0], 16)
+                chunk = await self.reader.readexactly(size + 2)
+                if size == 0:
+                    break
+                body += chunk[:-2]
+        else:
+            body = await self.reader.read()
+            headers['connection'] = 'close'
+
+        if headers.get('connection', '').lower() == 'close':
+            self.close()
+        return status, body
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+def multipart(fields, files):
+    parts = []
+    for name, value in fields.items():
+        parts.append('--%s\r\nContent-Disposition: form-data; name="%s"\r\n\r\n%s\r\n' % (BOUNDARY, name, value))
+    body = ''.join(parts).encode('utf-8')
+    for name, (file_name, content, content_type) in files.items():
+        body += ('--%s\r\nContent-Disposition: form-data; name="%s"; filename="%s"\r\n'
+                 'Content-Type: %s\r\n\r\n' % (BOUNDARY, name, file_name, content_type)).encode('utf-8')
+        body += content + b'\r\n'
+    return body + ('--%s--\r\n' % BOUNDARY).encode('utf-8')
+
+
+class Scenario:
+    """
+    One method per call in the mix, each returns the response status
+    """
+
+    def __init__(self, seed_data, rng):
+        self.seed = seed_data
+        self.rng = rng
+        self.access = None
+        self.run_id = uuid.uuid4().hex[:8]
+        self.counter = 0
+
+    def auth(self):
+        return {'Authorization': 'Bearer %s' % self.access}
+
+    async def json(self, client, method, path, payload, authenticated=True):
+        headers = {'Content-Type': 'application/json'}
+        if authenticated:
+            headers.update(self.auth())
+        return await client.request(method, path, json.dumps(payload).encode('utf-8'), headers)
+
+    async def login(self, client):
+        status, body = await self.json(client, 'POST', '/api/token/', {
+            'username': self.seed['username'],
+            'password': self.seed['password'],
+        }, authenticated=False)
+        if status == 200:
+            self.access = json.loads(body)['access']
+        return status
+
+    async def signup(self, client):
+        self.counter += 1
+        name = 'load-%s-%d' % (self.run_id, self.counter)
+        status, _ = await self.json(client, 'POST', '/api/signup', {
+            'username': name,
+            'email': '%s@mail.com' % name,
+            'first_name': 'Load',
+            'last_name': 'Test',
+            'password': 'loadtestpassword',
+        }, authenticated=False)
+        return status
+
+    async def token(self, client):
+        return await self.login(client)
+
+    async def project_list(self, client):
+        status, _ = await client.request('GET', '/api/projects/', headers=self.auth())
+        return status
+
+    async def task_list(self, client):
+        status, _ = await client.request('GET', '/api/tasks/', headers=self.auth())
+        return status
+
+    async def task_create(self, client):
+        self.counter += 1
+        body = multipart({
+            'title': 'Load task %s-%d' % (self.run_id, self.counter),
+            'project': self.rng.choice(list(self.seed['tasks'])),
+            'author': self.seed['user_id'],
+        }, {'avatar': ('avatar.png', PNG, 'image/png')})
+        headers = dict(self.auth(), **{'Content-Type': 'multipart/form-data; boundary=%s' % BOUNDARY})
+        status, _ = await client.request('POST', '/api/tasks/', body, headers)
+        return status
+
+    async def task_detail(self, client):
+        # the seeded relations show in the task's *_tasks fields
+        task = self.rng.choice(self.seed['tasks'][self.rng.choice(list(self.seed['tasks']))])
+        status, _ = await client.request('GET', '/api/tasks/%d/' % task, headers=self.auth())
+        return status
+
+
+async def worker(scenario, client, mix, stats, deadline):
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    while time.monotonic() < deadline:
+        name = scenario.rng.choices(names, weights)[0]
+        start = time.perf_counter()
+        try:
+            status = await getattr(scenario, name)(client)
+            if status == 401:
+                # access tokens only live for a few minutes
+                await scenario.login(client)
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            client.close()
+            status = 0
+        stats.record(name, time.perf_counter() - start, status)
+
+
+async def run_load(host, port, seed_data, mix, concurrency, duration, seed):
+    stats = Stats()
+    clients = []
+    scenarios = []
+    for i in range(concurrency):
+        scenario = Scenario(seed_data, random.Random(seed + i))
+        client = HttpClient(host, port)
+        if await scenario.login(client) != 200:
+            raise RuntimeError('could not obtain a token for %s' % seed_data['username'])
+        clients.append(client)
+        scenarios.append(scenario)
+
+    stats.started = time.monotonic()
+    deadline = stats.started + duration
+    await asyncio.gather(*(
+        worker(scenario, client, mix, stats, deadline)
+        for scenario, client in zip(scenarios, clients)
+    ))
+    stats.finished = time.monotonic()
+    for client in clients:
+        client.close()
+    return stats
+
+
+def seed_database(database, projects, tasks, relations, users):
+    """
+    migrates and fills `database` with the benchmark data generator, returns what the
+    scenario needs to know about it
+    """
+    os.environ['TMREX_DATABASE'] = database
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tmrex.settings')
+    import django
+    django.setup()
+    from django.core.management import call_command
+    from tests.models.test_helper import DefaultUser
+    from tests.benchmarks.data_generator import create_dummy_dataset
+
+    call_command('migrate', verbosity=0)
+    dataset = create_dummy_dataset(projects, tasks, relations, users)
+    task_ids = defaultdict(list)
+    for task in dataset.tasks:
+        task_ids[task.project_id].append(task.id)
+    return {
+        'username': DefaultUser.USER_NAME,
+        'password': DefaultUser.PASSWORD,
+        'user_id': dataset.owner.id,
+        'tasks': dict(task_ids),
+    }
+
+
+def seed_database_info(database):
+    os.environ['TMREX_DATABASE'] = database
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tmrex.settings')
+    import django
+    django.setup()
+    from tests.models.test_helper import DefaultUser
+    from django.contrib.auth.models import User
+    from api.models.tasks import Task
+
+    task_ids = defaultdict(list)
+    for task_id, project_id in Task.objects.values_list('id', 'project_id'):
+        task_ids[project_id].append(task_id)
+    return {
+        'username': DefaultUser.USER_NAME,
+        'password': DefaultUser.PASSWORD,
+        'user_id': User.objects.get(username=DefaultUser.USER_NAME).id,
+        'tasks': dict(task_ids),
+    }
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(kind, port, database, workers):
+    commands = {
+        'runserver': [sys.executable, 'manage.py', 'runserver', '--noreload', '127.0.0.1:%d' % port],
+        'gunicorn': [sys.executable, '-m', 'gunicorn', '--workers', str(workers), '--threads', '4',
+                     '--bind', '127.0.0.1:%d' % port, 'tmrex.wsgi:application'],
+        'uvicorn': [sys.executable, '-m', 'uvicorn', '--workers', str(workers), '--no-access-log',
+                    '--host', '127.0.0.1', '--port', str(port), 'tmrex.asgi:application'],
+    }
+    env = dict(os.environ, TMREX_DATABASE=database, TMREX_THROTTLE='0', TMREX_MEDIA_ROOT=os.path.join(os.path.dirname(database), 'media'))
+    process = subprocess.Popen(
+        commands[kind], cwd=TMREX_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('%s exited: %s' % (kind, process.stderr.read().decode(errors='replace')))
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError('%s did not start listening on port %d' % (kind, port))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--server', choices=['runserver', 'gunicorn', 'uvicorn'], default='runserver')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--url', help='use an already running server instead of starting one')
+    parser.add_argument('--database', help='SQLite file to seed, a temporary one by default')
+    parser.add_argument('--no-seed', action='store_true', help='--database is already seeded')
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX,
+                        help='weighted calls, default: %s' % ','.join('%s=%g' % item for item in DEFAULT_MIX.items()))
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--duration', type=float, default=30, help='seconds')
+    parser.add_argument('--projects', type=int, default=10)
+    parser.add_argument('--tasks', type=int, default=100, help='per project')
+    parser.add_argument('--relations', type=int, default=100, help='per project')
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', help='also write the report to this file')
+    args = parser.parse_args(argv)
+    # same as running from inside tmrex/, like manage.py does
+    sys.path.insert(0, TMREX_DIR)
+
+    database = args.database or os.path.join(tempfile.mkdtemp(prefix='tmrex-load-'), 'db.sqlite3')
+    if args.no_seed and not args.database:
+        parser.error('--no-seed needs --database')
+    if args.no_seed:
+        seed_data = seed_database_info(database)
+    else:
+        seed_data = seed_database(database, args.projects, args.tasks, args.relations, args.users)
+
+    process = None
+    if args.url:
+        url = urlsplit(args.url)
+        host, port = url.hostname, url.port or 80
+    else:
+        host, port = '127.0.0.1', free_port()
+        process = start_server(args.server, port, database, args.workers)
+
+    try:
+        stats = asyncio.run(run_load(
+            host, port, seed_data, args.mix, args.concurrency, args.duration, args.seed))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(10)
+
+    report = stats.report()
+    report['server'] = args.url or args.server
+    print(format_report(report))
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+import argparse
+import pytest
+from tests.load.harness import Stats, parse_mix, percentile, format_report
+
+
+def test_parse_mix():
+    assert parse_mix('task_list=10, token=1,signup') == {'task_list': 10, 'token': 1, 'signup': 1}
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_mix('delete_everything=1')
+
+
+def test_percentile_is_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
+    assert percentile(values, 99) == 99
+    assert percentile([7], 99) == 7
+    assert percentile([], 50) == 0.0
+
+
+def test_report_counts_errors_per_endpoint():
+    stats = Stats()
+    stats.started = 0
+    stats.finished = 2
+    for status in (200, 200, 500, 0):
+        stats.record('task_list', 0.010, status)
+    stats.record('token', 0.300, 200)
+
+    report = stats.report()
+    assert report['endpoints']['task_list']['requests'] == 4
+    assert report['endpoints']['task_list']['rps'] == 2
+    assert report['endpoints']['task_list']['error_rate'] == 0.5
+    assert report['endpoints']['token']['p99_ms'] == pytest.approx(300)
+    assert '5 requests in 2.0s' in format_report(report)
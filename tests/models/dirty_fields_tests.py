@@ -0,0 +1,67 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from tests.models.test_helper import create_dummy_project_with_user
+from api.models.projects import Project, AvailableProjectStates
+from api.models.tasks import Task, AvailableTaskStates
+
+
+@pytest.mark.django_db(transaction=True)
+def test_project_state_change_writes_only_the_state():
+    create_dummy_project_with_user()
+    project = Project.objects.first()
+
+    with CaptureQueriesContext(connection) as context:
+        project.archive()
+
+    # the state change is logged too (api.activity)
+    queries = [query for query in context.captured_queries if 'api_project' in query['sql']]
+    assert len(queries) == 1
+    sql = queries[0]['sql']
+    assert sql.startswith('UPDATE') and '"state"' in sql
+    assert '"description"' not in sql and '"avatar"' not in sql
+    assert Project.objects.first().state == AvailableProjectStates.ARCHIVED
+
+
+@pytest.mark.django_db(transaction=True)
+def test_save_without_changes_does_not_write():
+    create_dummy_project_with_user()
+    project = Project.objects.first()
+
+    with CaptureQueriesContext(connection) as context:
+        project.save()
+        project.update_title(project.title)
+
+    assert context.captured_queries == []
+
+
+@pytest.mark.django_db(transaction=True)
+def test_task_changes_are_tracked_after_save():
+    project = create_dummy_project_with_user()
+    task = Task.objects.create(project.created_by, project, "First Task")
+    assert not task.is_dirty()
+
+    task.update_title("Renamed")
+    task.state = AvailableTaskStates.CLOSED
+    assert task.get_dirty_fields() == ['state']
+
+    task.save()
+    assert not task.is_dirty()
+    fresh_copy_from_db = Task.objects.get(id=task.id)
+    assert fresh_copy_from_db.title == "Renamed"
+    assert fresh_copy_from_db.state == AvailableTaskStates.CLOSED
+
+
+@pytest.mark.django_db(transaction=True)
+def test_deferred_and_refreshed_fields():
+    create_dummy_project_with_user()
+    project = Project.objects.only('id', 'state').first()
+    project.title = "Only the title"
+    assert project.get_dirty_fields() == ['title']
+    project.save()
+    assert Project.objects.first().title == "Only the title"
+
+    project.state = AvailableProjectStates.INACTIVE
+    project.description = "not saved yet"
+    project.refresh_from_db(fields=['state'])
+    assert project.get_dirty_fields() == ['description']
@@ -0,0 +1,66 @@
+import pytest
+from django.core.exceptions import ValidationError
+from django.db import connection
+from tests.models.test_helper import create_dummy_project_with_user
+from api.serializers import ProjectReadSerializer, TaskReadSerializer
+from api.models.fields import SmallIntegerChoicesField
+from api.models.projects import AvailableAccessTypes
+from api.models.tasks import Task, TaskUser, AvailableTaskStates
+
+
+def raw_state(task):
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT state FROM api_task WHERE id = %s', [task.id])
+        return cursor.fetchone()[0]
+
+
+@pytest.mark.django_db
+def test_enum_is_stored_as_small_integer_and_read_back_as_member():
+    project = create_dummy_project_with_user()
+    task = Task.objects.create(project.owners.first().user, project, 'First Task')
+
+    assert raw_state(task) == 1
+    task.state = AvailableTaskStates.CLOSED
+    task.save()
+    assert raw_state(task) == 3
+
+    task = Task.objects.get(id=task.id)
+    assert task.state is AvailableTaskStates.CLOSED
+    assert task.state == 'CLOSED'
+    assert Task.objects.filter(state='CLOSED').count() == 1
+    assert Task.objects.filter(state__in=[AvailableTaskStates.OPENED, 'CLOSED']).count() == 1
+    assert list(Task.objects.values_list('state', flat=True)) == [AvailableTaskStates.CLOSED]
+    assert TaskUser.objects.get(task=task).access is AvailableAccessTypes.OWNER
+
+
+@pytest.mark.django_db
+def test_api_still_sees_the_enum_values():
+    project = create_dummy_project_with_user()
+    task = Task.objects.create(project.owners.first().user, project, 'First Task')
+    project.refresh_from_db()
+
+    assert ProjectReadSerializer(project).data['state'] == 'ACTIVE'
+    assert TaskReadSerializer(Task.objects.get(id=task.id)).data['task_users'][0]['access'] == 'OWNER'
+
+
+@pytest.mark.django_db
+def test_unknown_values_are_refused():
+    project = create_dummy_project_with_user()
+    task = Task.objects.create(project.owners.first().user, project, 'First Task')
+
+    with pytest.raises(ValueError):
+        Task.objects.filter(state='REOPENED').count()
+
+    task.state = 'REOPENED'
+    with pytest.raises(ValidationError):
+        task.full_clean()
+
+
+def test_codes_follow_declaration_order():
+    field = SmallIntegerChoicesField(enum=AvailableTaskStates)
+
+    assert [field.get_prep_value(state) for state in AvailableTaskStates] == [1, 2, 3, 4, 5]
+    assert field.to_python(2) is AvailableTaskStates.BLOCKED
+    assert field.to_python('BLOCKED') is AvailableTaskStates.BLOCKED
+    name, path, args, kwargs = field.deconstruct()
+    assert kwargs == {'enum': AvailableTaskStates}
@@ -274,3 +274,44 @@ def test_project_unarchive():
     fresh_copy_from_db = Project.objects.first()
 
     assert fresh_copy_from_db.state != previous_archived_status and fresh_copy_from_db.state == AvailableProjectStates.INACTIVE
+
+
+@pytest.mark.django_db(transaction=True)
+def test_project_archive_cascades_to_tasks_and_unarchive_restores_them():
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from api.models.tasks import Task, AvailableTaskStates
+
+    project = create_dummy_project_with_user()
+    user = project.created_by
+    opened, blocked, archived = [Task.objects.create(user, project, title) for title in ('a', 'b', 'c')]
+    Task.objects.filter(pk=blocked.pk).update(state=AvailableTaskStates.BLOCKED)
+    archived.archive()
+
+    with CaptureQueriesContext(connection) as context:
+        project.archive(cascade=True)
+    updates = [query['sql'] for query in context.captured_queries if query['sql'].startswith('UPDATE "api_task"')]
+    assert len(updates) == 1 and '"project_id" = %d' % project.pk in updates[0]
+    assert set(Task.objects.values_list('state', flat=True)) == {AvailableTaskStates.ARCHIVED}
+
+    project.unarchive(cascade=True)
+    states = dict(Task.objects.values_list('title', 'state'))
+    # the task archived on its own stays archived
+    assert states == {
+        'a': AvailableTaskStates.OPENED,
+        'b': AvailableTaskStates.BLOCKED,
+        'c': AvailableTaskStates.ARCHIVED,
+    }
+    assert not Task.objects.filter(archived_from__isnull=False).exists()
+    assert project.state == AvailableProjectStates.INACTIVE
+
+
+@pytest.mark.django_db(transaction=True)
+def test_project_archive_without_cascade_leaves_tasks_alone():
+    from api.models.tasks import Task, AvailableTaskStates
+
+    project = create_dummy_project_with_user()
+    task = Task.objects.create(project.created_by, project, 'a')
+    project.archive()
+    task.refresh_from_db()
+    assert task.state == AvailableTaskStates.OPENED
@@ -0,0 +1,88 @@
+import importlib
+import pytest
+from types import SimpleNamespace
+from django.apps import apps
+from django.db import connection
+from tests.models.test_helper import create_dummy_project_with_user
+from api.models.tasks import (
+    Task,
+    RelatedTask,
+    AvailableTaskRelations,
+    Relationships
+)
+
+migration = importlib.import_module('api.migrations.0002_canonical_task_relations')
+
+
+def create_tasks(count):
+    project = create_dummy_project_with_user()
+    user = project.owners.first().user
+    return [Task.objects.create(user, project, 'Task %d' % i) for i in range(count)]
+
+
+def relation_ids(task):
+    return {
+        'sub_tasks': {t.id for t in task.sub_tasks},
+        'parent_task': {t.id for t in task.parent_task},
+        'just_related_tasks': {t.id for t in task.just_related_tasks},
+        'blocked_tasks': {t.id for t in task.blocked_tasks},
+        'blocked_by_tasks': {t.id for t in task.blocked_by_tasks},
+    }
+
+
+@pytest.mark.parametrize('rel, forward, backward', [
+    (AvailableTaskRelations.PARENT_TASK_OF, 'sub_tasks', 'parent_task'),
+    (AvailableTaskRelations.SUB_TASK_OF, 'parent_task', 'sub_tasks'),
+    (AvailableTaskRelations.IS_BLOCKING, 'blocked_tasks', 'blocked_by_tasks'),
+    (AvailableTaskRelations.BLOCKED_BY, 'blocked_by_tasks', 'blocked_tasks'),
+    (AvailableTaskRelations.JUST_RELATED, 'just_related_tasks', 'just_related_tasks'),
+])
+@pytest.mark.django_db
+def test_relation_is_stored_once_and_seen_from_both_sides(rel, forward, backward):
+    task1, task2 = create_tasks(2)
+
+    task2.add_related_task(task1, rel)
+    # adding it again, from either side, is a no-op
+    task2.add_related_task(task1, rel)
+    task1.add_related_task(task2, Relationships.MAP[rel])
+
+    assert RelatedTask.objects.count() == 1
+    assert {name: ids for name, ids in relation_ids(task2).items() if ids} == {forward: {task1.id}}
+    assert {name: ids for name, ids in relation_ids(task1).items() if ids} == {backward: {task2.id}}
+    assert list(task1.related_tasks) == [task2]
+    assert list(task2.related_tasks) == [task1]
+
+    task1.remove_related_task(task2, Relationships.MAP[rel])
+    assert not RelatedTask.objects.exists()
+
+
+@pytest.mark.django_db
+def test_collapse_relations_migration_keeps_one_row_per_edge():
+    task1, task2, task3, task4 = create_tasks(4)
+    # rows the way add_related_task used to write them, plus an inverse row without its pair
+    RelatedTask.objects.bulk_create([
+        RelatedTask(task_a=task1, task_b=task2, is_connected_as=AvailableTaskRelations.SUB_TASK_OF),
+        RelatedTask(task_a=task2, task_b=task1, is_connected_as=AvailableTaskRelations.PARENT_TASK_OF),
+        RelatedTask(task_a=task3, task_b=task1, is_connected_as=AvailableTaskRelations.JUST_RELATED),
+        RelatedTask(task_a=task1, task_b=task3, is_connected_as=AvailableTaskRelations.JUST_RELATED),
+        RelatedTask(task_a=task4, task_b=task2, is_connected_as=AvailableTaskRelations.BLOCKED_BY),
+    ])
+    before = {task.id: relation_ids(task) for task in (task1, task2, task3, task4)}
+
+    # RunPython only looks at schema_editor.connection
+    schema_editor = SimpleNamespace(connection=connection)
+    migration.collapse_relations(apps, schema_editor)
+
+    assert set(RelatedTask.objects.values_list('task_a', 'task_b', 'is_connected_as')) == {
+        (task2.id, task1.id, AvailableTaskRelations.PARENT_TASK_OF),
+        (task1.id, task3.id, AvailableTaskRelations.JUST_RELATED),
+        (task2.id, task4.id, AvailableTaskRelations.IS_BLOCKING),
+    }
+    for task in (task1, task3):
+        assert relation_ids(task) == before[task.id]
+    # a lone inverse row is not read until it is turned around
+    assert relation_ids(task4) == dict(before[task4.id], blocked_by_tasks={task2.id})
+    assert relation_ids(task2) == dict(before[task2.id], blocked_tasks={task4.id})
+
+    migration.expand_relations(apps, schema_editor)
+    assert RelatedTask.objects.count() == 6
@@ -0,0 +1,136 @@
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from enum import Enum
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from rest_framework import serializers
+from rest_framework.decorators import action
+from rest_framework.pagination import CursorPagination
+from api.models.activity import Activity, ActivityVerbs
+from api.serializer_cache import CachedFieldsMixin
+
+local = threading.local()
+
+
+def as_text(value):
+    if value is None:
+        return ''
+    if isinstance(value, Enum):
+        return str(value.value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def record(verb: str, subject, user=None, before=None, after=None):
+    """
+    Logs an event of `subject`, a project or a task, once the transaction that changed it commits,
+    nothing is logged when it rolls back. Inside batch() events wait for the end of the batch and go
+    in one INSERT per database, otherwise each one is written on its own
+    """
+    is_task = subject._meta.model_name == 'task'
+    alias = subject._state.db or DEFAULT_DB_ALIAS
+    event = Activity(
+        project_id=subject.project_id if is_task else subject.pk,
+        task_id=subject.pk if is_task else None,
+        verb=verb,
+        user_id=getattr(user, 'pk', user),
+        before=as_text(before),
+        after=as_text(after)
+    )
+    if connections[alias].in_atomic_block:
+        transaction.on_commit(lambda: add(alias, event), using=alias)
+    else:
+        add(alias, event)
+
+
+def add(alias, event):
+    pending = getattr(local, 'pending', None)
+    if pending is None:
+        write(alias, [event])
+    else:
+        pending[alias].append(event)
+
+
+def write(alias, events):
+    Activity.objects.using(alias).bulk_create(events)
+
+
+@contextmanager
+def batch():
+    """
+    events recorded inside are written together when it ends, batches nest
+    """
+    if getattr(local, 'pending', None) is not None:
+        yield
+        return
+    local.pending = defaultdict(list)
+    try:
+        yield
+    finally:
+        pending, local.pending = local.pending, None
+        for alias, events in pending.items():
+            write(alias, events)
+
+
+class RecordedChangesMixin(object):
+    """
+    For DirtyFieldsMixin models, goes before it. Saves changing one of `recorded_fields` log it,
+    whatever changed them (the model methods or a serializer)
+    """
+    recorded_fields = {
+        'state': ActivityVerbs.STATE_CHANGED,
+        'started_on': ActivityVerbs.STARTED,
+        'ended_on': ActivityVerbs.ENDED,
+    }
+
+    def save(self, *args, **kwargs):
+        loaded = None if self._state.adding else getattr(self, '_loaded_values', None)
+        # mark_clean() updates the snapshot in place
+        loaded = None if loaded is None else dict(loaded)
+        super().save(*args, **kwargs)
+        if loaded is None:
+            return
+        for name, verb in self.recorded_fields.items():
+            if name in loaded and loaded[name] != getattr(self, name):
+                record(verb, self, before=loaded[name], after=getattr(self, name))
+
+
+def record_membership(subject, user, access, previous):
+    """
+    a member of `subject` got `access`, `previous` is what they had before (None when they are new)
+    """
+    if previous is None:
+        record(ActivityVerbs.MEMBER_ADDED, subject, user, after=access)
+    elif previous != access:
+        record(ActivityVerbs.ACCESS_CHANGED, subject, user, before=previous, after=access)
+
+
+class ActivitySerializer(CachedFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Activity
+        fields = ['id', 'project', 'task', 'verb', 'user', 'before', 'after', 'created_on']
+
+
+class ActivityPagination(CursorPagination):
+    """
+    keyset pages, `WHERE id < cursor ORDER BY id DESC`, on the (project, id) / (task, id) indexes
+    """
+    ordering = '-id'
+    page_size = 50
+
+
+class ActivityFeedMixin(object):
+    """
+    `/<objects>/{id}/activity/`, the history of a project or task, newest first
+    """
+
+    @action(detail=True, methods=['get'])
+    def activity(self, request, pk=None):
+        instance = self.get_object()
+        events = Activity.objects.using(instance._state.db).filter(
+            **{instance._meta.model_name: instance})
+        paginator = ActivityPagination()
+        page = paginator.paginate_queryset(events, request, view=self)
+        return paginator.get_paginated_response(ActivitySerializer(page, many=True).data)
@@ -1,9 +1,120 @@
-from django.contrib.auth.admin import UserAdmin
+from django.conf import settings
 from django.contrib import admin
-# from api.models.users import User
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Max, Q
+from django.utils.functional import cached_property
+from api.models.projects import Project, ProjectUser
+from api.models.tasks import Task, TaskUser, RelatedTask
 
 # admin.py
 # Register your models here.
 
 
-# admin.site.register(User, UserAdmin)
+def estimated_rows(queryset):
+    """
+    rows in the table of `queryset` as the database guesses them, without a scan.
+    None when the database can't tell
+    """
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                           [queryset.model._meta.db_table])
+            row = cursor.fetchone()
+        return row[0] if row and row[0] > 0 else None
+    if connection.vendor == 'sqlite':
+        # the highest rowid, one b-tree lookup. Deleted rows make it a bit high
+        return queryset.model._base_manager.using(queryset.db).aggregate(highest=Max('pk'))['highest']
+    return None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Counts at most ADMIN_EXACT_COUNT_LIMIT + 1 rows. Past that an unfiltered list shows the
+    database's estimate of the table size and a filtered one the limit, instead of a COUNT(*)
+    over millions of rows
+    """
+
+    @cached_property
+    def count(self):
+        limit = settings.ADMIN_EXACT_COUNT_LIMIT
+        queryset = self.object_list
+        # SELECT COUNT(*) FROM (SELECT ... LIMIT n), stops after n rows
+        counted = queryset.order_by()[:limit + 1].count()
+        if counted <= limit or queryset.query.where:
+            return counted
+        return max(estimated_rows(queryset) or 0, counted)
+
+
+class FastChangeListAdmin(admin.ModelAdmin):
+    """
+    Changelists for big tables: bounded counts, no second count of the whole table when filtered,
+    related objects joined, newest first on the primary key.
+    Search takes an id or the start of the title (case sensitive), both answered by an index
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+    ordering = ('-id',)
+    search_fields = ('title',)
+    # searched by prefix
+    prefix_search_field = 'title'
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        if term.isdigit():
+            return queryset.filter(pk=int(term)), False
+        # a range instead of LIKE 'term%', sqlite and postgresql both walk the index for it
+        field = self.prefix_search_field
+        return queryset.filter(**{field + '__gte': term, field + '__lt': term + '\U0010ffff'}), False
+
+
+class ProjectUserInline(admin.TabularInline):
+    model = ProjectUser
+    autocomplete_fields = ('user',)
+    extra = 0
+
+
+class TaskUserInline(admin.TabularInline):
+    model = TaskUser
+    autocomplete_fields = ('user',)
+    extra = 0
+
+
+@admin.register(Project)
+class ProjectAdmin(FastChangeListAdmin):
+    list_display = ('id', 'title', 'state', 'created_by', 'started_on', 'ended_on')
+    list_select_related = ('created_by',)
+    list_filter = ('state',)
+    autocomplete_fields = ('created_by', 'updated_by')
+    inlines = (ProjectUserInline,)
+
+
+@admin.register(Task)
+class TaskAdmin(FastChangeListAdmin):
+    list_display = ('id', 'title', 'project', 'state', 'author', 'assignee', 'due_on')
+    list_select_related = ('project', 'author', 'assignee')
+    list_filter = ('state',)
+    autocomplete_fields = ('project', 'author', 'assignee')
+    inlines = (TaskUserInline,)
+
+
+@admin.register(RelatedTask)
+class RelatedTaskAdmin(FastChangeListAdmin):
+    list_display = ('id', 'task_a', 'is_connected_as', 'task_b')
+    list_select_related = ('task_a', 'task_b')
+    list_filter = ('is_connected_as',)
+    autocomplete_fields = ('task_a', 'task_b')
+    search_fields = ('task_a__id', 'task_b__id')
+
+    def get_search_results(self, request, queryset, search_term):
+        # the relations of a task, either side
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        if not term.isdigit():
+            return queryset.none(), False
+        return queryset.filter(Q(task_a_id=int(term)) | Q(task_b_id=int(term))), False
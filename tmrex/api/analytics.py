@@ -0,0 +1,155 @@
+from bisect import bisect_right
+from datetime import date, timedelta
+from itertools import accumulate
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.response import Response
+from api.metrics import cache_hit, cache_miss
+from api.models.projects import ProjectActions
+from api.models.tasks import Task, AvailableTaskStates
+
+try:
+    import numpy
+except ImportError:
+    # numpy is in requirement.txt, without it the same series come from bisect (the tests run
+    # both), slower on big projects
+    numpy = None
+
+# the day number of a date that never came
+NEVER = date.max.toordinal()
+
+
+def day_number(value):
+    if value is None:
+        return NEVER
+    return timezone.localdate(value).toordinal()
+
+
+def counts_by_day(days, marks):
+    """
+    for every day of `days`, how many of `marks` (day numbers) are on or before it
+    """
+    if numpy is not None:
+        return numpy.searchsorted(numpy.sort(numpy.asarray(marks, dtype=numpy.int64)), days, side='right').tolist()
+    marks = sorted(marks)
+    return [bisect_right(marks, day) for day in days]
+
+
+def sums_by_day(days, marks, weights):
+    """
+    for every day of `days`, the sum of the `weights` whose mark is on or before it
+    """
+    if numpy is not None:
+        marks = numpy.asarray(marks, dtype=numpy.int64)
+        order = numpy.argsort(marks, kind='stable')
+        totals = numpy.concatenate(([0], numpy.cumsum(numpy.asarray(weights, dtype=numpy.int64)[order])))
+        return totals[numpy.searchsorted(marks[order], days, side='right')].tolist()
+    pairs = sorted(zip(marks, weights))
+    marks = [mark for mark, weight in pairs]
+    totals = [0] + list(accumulate(weight for mark, weight in pairs))
+    return [totals[bisect_right(marks, day)] for day in days]
+
+
+def series(rows, first: date, last: date):
+    """
+    Daily burndown and cumulative flow of the tasks in `rows`, (started_on, ended_on, due_on,
+    estimated_hours, state) tuples, from `first` to `last`. A task is in progress from the day
+    it started and done from the day it ended, closed tasks without an end date count as done
+    all along. Each series is a sorted search of the days in the start/end/due dates, no loop over
+    tasks per day
+    """
+    starts, ends, dues, estimates = [], [], [], []
+    for started_on, ended_on, due_on, estimated_hours, state in rows:
+        end = day_number(ended_on)
+        if end == NEVER and state == AvailableTaskStates.CLOSED:
+            end = 0
+        starts.append(min(day_number(started_on), end))
+        ends.append(end)
+        dues.append(day_number(due_on))
+        estimates.append(estimated_hours or 0)
+
+    days = list(range(first.toordinal(), last.toordinal() + 1))
+    total_tasks, total_hours = len(rows), sum(estimates)
+    started = counts_by_day(days, starts)
+    done = counts_by_day(days, ends)
+    done_hours = sums_by_day(days, ends, estimates)
+    due_hours = sums_by_day(days, dues, estimates)
+    span = max(len(days) - 1, 1)
+
+    return {
+        'days': [date.fromordinal(day) for day in days],
+        'burndown': {
+            'remaining_hours': [total_hours - hours for hours in done_hours],
+            'remaining_tasks': [total_tasks - count for count in done],
+            'ideal_hours': [round(total_hours * (span - index) / span, 2) for index in range(len(days))],
+            'due_hours': due_hours,
+        },
+        'cumulative_flow': {
+            'to_do': [total_tasks - count for count in started],
+            'in_progress': [count - finished for count, finished in zip(started, done)],
+            'done': done,
+        },
+    }
+
+
+def version(project):
+    """
+    what changes when the project's tasks do: how many there are and the last time one changed.
+    Both come out of the (project, updated_on) index
+    """
+    tasks = Task.objects.using(project._state.db).filter(project=project)
+    latest = tasks.aggregate(count=Count('id'), changed=Max('updated_on'))
+    return '%d-%s' % (latest['count'], latest['changed'].isoformat() if latest['changed'] else '')
+
+
+def project_series(project, first: date, last: date):
+    """
+    series() of the project's tasks but the archived ones, cached until one of its tasks changes
+    """
+    key = 'analytics:%s:%d:%s:%s:%s' % (
+        project._state.db, project.pk, version(project), first.isoformat(), last.isoformat())
+    result = cache.get(key)
+    if result is not None:
+        cache_hit('analytics')
+        return result
+
+    cache_miss('analytics')
+    rows = Task.objects.using(project._state.db).filter(project=project).exclude(
+        state=AvailableTaskStates.ARCHIVED
+    ).values_list('started_on', 'ended_on', 'due_on', 'estimated_hours', 'state')
+    result = series(list(rows), first, last)
+    cache.set(key, result, settings.ANALYTICS_CACHE_TIMEOUT)
+    return result
+
+
+class AnalyticsQuerySerializer(serializers.Serializer):
+    since = serializers.DateField(required=False)
+    until = serializers.DateField(required=False)
+
+
+class ProjectAnalyticsMixin(object):
+    """
+    `/projects/{id}/analytics/?since=<date>&until=<date>`, burndown and cumulative flow of a
+    project, day by day. From the project's start (30 days back without one) to today by default
+    """
+
+    @action(detail=True, methods=['get'])
+    def analytics(self, request, pk=None):
+        project = self.get_object()
+        if not project.has_access(request.user, ProjectActions.VIEW_PROJECT_DETAILS):
+            raise PermissionDenied()
+        query = AnalyticsQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        last = query.validated_data.get('until') or timezone.localdate()
+        first = query.validated_data.get('since') or (
+            timezone.localdate(project.started_on) if project.started_on else last - timedelta(days=30))
+        if first > last:
+            raise ValidationError({'since': ['comes after until']})
+        if (last - first).days >= settings.ANALYTICS_MAX_DAYS:
+            raise ValidationError({'since': ['at most %d days at once' % settings.ANALYTICS_MAX_DAYS]})
+        return Response(project_series(project, first, last))
@@ -3,3 +3,17 @@ from django.apps import AppConfig
 
 class ApiConfig(AppConfig):
     name = 'api'
+
+    def ready(self):
+        # receivers of the sharding signals
+        from api import sharding
+        # changes published to the event streams
+        from api.events import connect_receivers
+        connect_receivers()
+        # time entries, their serializer is precompiled with the others
+        from api import timetracking
+        # written by `manage.py scan_due_tasks`
+        from api.models import notifications
+        from api import serializers
+        from api.serializer_cache import precompile_serializers
+        precompile_serializers()
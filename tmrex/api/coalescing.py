@@ -0,0 +1,171 @@
+import threading
+from time import monotonic
+from django.conf import settings
+from django.db.models.signals import post_save, m2m_changed
+from django.dispatch import receiver
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+from api.metrics import cache_hit, cache_miss
+from api.signals import tasks_updated
+
+
+class Flight:
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        # monotonic time the result stops being served, None while in flight
+        self.expires = None
+
+
+class SingleFlight:
+    """
+    Runs a computation once for every caller asking for the same key at the same time, callers
+    arriving while it runs wait and get its result. The result is kept `window` seconds more.
+    A computation returning None is not shared, the callers waiting on it run their own.
+    invalidate() forgets every result, including the ones still being computed.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flights = {}
+        self.generation = 0
+
+    def do(self, key, compute, window=0.0, wait=5.0, max_entries=1024):
+        now = monotonic()
+        with self.lock:
+            flight = self.flights.get(key)
+            if flight is not None and flight.expires is not None and flight.expires <= now:
+                del self.flights[key]
+                flight = None
+            if flight is None:
+                if len(self.flights) >= max_entries:
+                    self.prune(now)
+                if len(self.flights) >= max_entries:
+                    # too many different requests at once, nothing to share anyway
+                    cache_miss('coalesce')
+                    return compute()
+                flight = self.flights[key] = Flight()
+                leader = True
+            else:
+                leader = False
+            generation = self.generation
+
+        if not leader:
+            # the wait is bounded, a stuck (or same thread) leader must not hang its followers
+            if flight.done.wait(wait) and flight.result is not None:
+                cache_hit('coalesce')
+                return flight.result
+            cache_miss('coalesce')
+            return compute()
+
+        cache_miss('coalesce')
+        try:
+            flight.result = compute()
+        finally:
+            with self.lock:
+                if flight.result is None or window <= 0 or generation != self.generation:
+                    if self.flights.get(key) is flight:
+                        del self.flights[key]
+                else:
+                    flight.expires = monotonic() + window
+            flight.done.set()
+        return flight.result
+
+    def prune(self, now):
+        for key, flight in list(self.flights.items()):
+            if flight.expires is not None and flight.expires <= now:
+                del self.flights[key]
+
+    def invalidate(self):
+        with self.lock:
+            self.generation += 1
+            for key, flight in list(self.flights.items()):
+                if flight.expires is not None:
+                    del self.flights[key]
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.flights.clear()
+
+
+singleflight = SingleFlight()
+
+
+@receiver(post_save, dispatch_uid='coalescing.post_save')
+@receiver(m2m_changed, dispatch_uid='coalescing.m2m_changed')
+@receiver(tasks_updated, dispatch_uid='coalescing.tasks_updated')
+def forget_reads(sender, **kwargs):
+    # any write of this process may show in any read. No post_delete receiver, it would turn
+    # every fast queryset delete into a select + delete, deletes through the viewsets are
+    # covered by CoalescedReadMixin.dispatch(). queryset.update() and bulk writes outside of
+    # the viewsets have to call singleflight.invalidate() themselves
+    singleflight.invalidate()
+
+
+class CoalescedReadMixin(object):
+    """
+    Identical list/retrieve requests to a viewset running at the same time, same url (query string
+    included) and same user, share one queryset, serialization and rendering. The rendered body is
+    served again for COALESCE_WINDOW seconds, writes of this process drop it right away, other workers
+    may serve it until the window ends.
+    Only 200 responses of the json renderer are shared, `response.data` is shared too and must not
+    be modified.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            if request.method not in SAFE_METHODS:
+                singleflight.invalidate()
+
+    def list(self, request, *args, **kwargs):
+        return self.coalesce(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.coalesce(super().retrieve, request, *args, **kwargs)
+
+    def coalesce(self, handler, request, *args, **kwargs):
+        renderer = getattr(request, 'accepted_renderer', None)
+        if not settings.COALESCE_ENABLED or renderer is None or renderer.format != 'json':
+            return handler(request, *args, **kwargs)
+
+        key = (
+            type(self).__name__,
+            self.action,
+            request.build_absolute_uri(),
+            request.user.pk,
+            request.accepted_media_type,
+        )
+        # the response of this thread when it is not shared
+        own = []
+
+        def compute():
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200 or not isinstance(response, Response):
+                own.append(response)
+                return None
+            response.accepted_renderer = request.accepted_renderer
+            response.accepted_media_type = request.accepted_media_type
+            response.renderer_context = self.get_renderer_context()
+            response.render()
+            return response.data, response['Content-Type'], response.content
+
+        rendered = singleflight.do(
+            key,
+            compute,
+            window=settings.COALESCE_WINDOW,
+            wait=settings.COALESCE_WAIT,
+            max_entries=settings.COALESCE_MAX_ENTRIES
+        )
+        if rendered is None:
+            return own[0]
+
+        data, content_type, content = rendered
+        response = Response(data)
+        # set as rendered, finalize_response() and the middlewares won't render it again
+        response.content = content
+        response['Content-Type'] = content_type
+        return response
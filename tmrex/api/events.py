@@ -0,0 +1,382 @@
+import asyncio
+import json
+import threading
+import uuid
+from collections import deque
+from urllib.parse import parse_qs
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, transaction
+from django.db.models.signals import post_delete, post_save
+from djangorestframework_camel_case.util import camelize
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, AuthenticationFailed
+from api.metrics import registry
+from api.signals import tasks_updated
+from api.sharding import fan_out, shards
+
+# what the stream sends when the event loop has nothing for HEARTBEAT seconds
+HEARTBEAT = object()
+
+
+class Event:
+    __slots__ = ('sequence', 'project_id', 'user_id', 'left', 'frame')
+
+    def __init__(self, sequence, project_id, user_id, left, frame):
+        self.sequence = sequence
+        self.project_id = project_id
+        # the member of a project membership event, None otherwise
+        self.user_id = user_id
+        # whether that member left the project
+        self.left = left
+        self.frame = frame
+
+
+class Subscription:
+    """
+    the events of one connection, pushed from any thread through the loop of the connection
+    """
+
+    def __init__(self, loop, size):
+        self.loop = loop
+        self.queue = asyncio.Queue(size)
+        # fell `size` events behind, the client reconnects and replays from Last-Event-ID
+        self.overflowed = False
+        self.closed = False
+
+    def push(self, event):
+        if self.overflowed or self.closed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    def close(self):
+        self.closed = True
+        try:
+            # wakes the stream up
+            self.queue.put_nowait(None)
+        except asyncio.QueueFull:
+            pass
+
+    async def next(self, timeout):
+        if not self.queue.empty():
+            return self.queue.get_nowait()
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return HEARTBEAT
+
+
+def deliver(subscriptions, event):
+    for subscription in subscriptions:
+        subscription.push(event)
+
+
+class EventBus:
+    """
+    In-process publish/subscribe of changes, published from the request threads and fanned out
+    to every connection's loop. Frames are encoded once per event, not once per connection.
+    The last `replay_size` events are kept for clients resuming with Last-Event-ID. Ids are
+    `<epoch>-<sequence>`, the epoch changes with the process so ids of a restarted or another
+    worker are never taken for ours
+    """
+
+    def __init__(self, replay_size):
+        self.lock = threading.Lock()
+        self.epoch = uuid.uuid4().hex[:8]
+        self.sequence = 0
+        self.replay = deque(maxlen=replay_size)
+        # loop -> its subscriptions, a publish wakes each loop up once
+        self.subscriptions = {}
+
+    def publish(self, project_id: int, name: str, data: dict, user_id=None):
+        with self.lock:
+            self.sequence += 1
+            frame = 'id: %s-%d\nevent: %s\ndata: %s\n\n' % (
+                self.epoch,
+                self.sequence,
+                name,
+                json.dumps(camelize(data), cls=DjangoJSONEncoder, separators=(',', ':'))
+            )
+            left = user_id is not None and data.get('action') == 'deleted'
+            event = Event(self.sequence, project_id, user_id, left, frame.encode('utf-8'))
+            self.replay.append(event)
+            loops = [(loop, tuple(subscriptions)) for loop, subscriptions in self.subscriptions.items()]
+
+        for loop, subscriptions in loops:
+            try:
+                loop.call_soon_threadsafe(deliver, subscriptions, event)
+            except RuntimeError:
+                # the loop is gone
+                with self.lock:
+                    self.subscriptions.pop(loop, None)
+        return event
+
+    def subscribe(self, loop, size):
+        subscription = Subscription(loop, size)
+        with self.lock:
+            self.subscriptions.setdefault(loop, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subscriptions = self.subscriptions.get(subscription.loop)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self.subscriptions[subscription.loop]
+
+    def since(self, last_event_id: str):
+        """
+        the events after `last_event_id`, None when some of them are not in the replay buffer anymore
+        """
+        epoch, _, sequence = last_event_id.partition('-')
+        if epoch != self.epoch or not sequence.isdigit():
+            return None
+        sequence = int(sequence)
+        with self.lock:
+            events = list(self.replay)
+            current = self.sequence
+        if sequence >= current:
+            return []
+        oldest = events[0].sequence if events else current + 1
+        if sequence + 1 < oldest:
+            return None
+        return [event for event in events if event.sequence > sequence]
+
+
+bus = EventBus(settings.EVENTS_REPLAY_SIZE)
+
+# tells the client to load what it shows again, its events can't be replayed
+RESET = b'event: reset\ndata: {}\n\n'
+
+
+def publish_on_commit(using, project_id, name, data, user_id=None):
+    if not settings.EVENTS_ENABLED or project_id is None:
+        return
+    transaction.on_commit(
+        lambda: bus.publish(project_id, name, data, user_id),
+        using=using or DEFAULT_DB_ALIAS
+    )
+
+
+def task_data(task, action):
+    return {
+        'action': action,
+        'id': task.pk,
+        'project': task.project_id,
+        'title': task.title,
+        'state': task.state,
+        'assignee': task.assignee_id,
+        'due_on': task.due_on,
+    }
+
+
+def project_of(task_user):
+    field = task_user._meta.get_field('task')
+    if field.is_cached(task_user):
+        return task_user.task.project_id
+    from api.models.tasks import Task
+    return Task._base_manager.using(task_user._state.db).filter(
+        pk=task_user.task_id).values_list('project_id', flat=True).first()
+
+
+def receive_task(sender, instance, **kwargs):
+    action = 'deleted' if 'created' not in kwargs else 'saved'
+    publish_on_commit(instance._state.db, instance.project_id, 'task', task_data(instance, action))
+
+
+def receive_member(sender, instance, **kwargs):
+    action = 'deleted' if 'created' not in kwargs else 'saved'
+    is_task_user = instance._meta.model_name == 'taskuser'
+    project_id = project_of(instance) if is_task_user else instance.project_id
+    data = {
+        'action': action,
+        'project': project_id,
+        'task': instance.task_id if is_task_user else None,
+        'user': instance.user_id,
+        'access': instance.access,
+    }
+    # only project memberships open or close a project to a stream
+    publish_on_commit(instance._state.db, project_id, 'member', data, None if is_task_user else instance.user_id)
+
+
+def receive_tasks_updated(sender, project_id, using, action, count, state=None, tasks=None, **kwargs):
+    # one event for the lot, clients load the tasks of the project again
+    data = {'action': action, 'project': project_id, 'count': count, 'state': state, 'tasks': tasks}
+    publish_on_commit(using, project_id, 'tasks', data)
+
+
+def connect_receivers():
+    """
+    Changes of tasks and memberships go to the bus. The post_delete receivers cost membership rows
+    their fast delete, a cascade selects them before deleting
+    """
+    from api.models.projects import ProjectUser
+    from api.models.tasks import Task, TaskUser
+    tasks_updated.connect(receive_tasks_updated, dispatch_uid='events.tasks_updated')
+    for signal in (post_save, post_delete):
+        signal.connect(receive_task, sender=Task, dispatch_uid='events.task')
+        for model in (ProjectUser, TaskUser):
+            signal.connect(receive_member, sender=model, dispatch_uid='events.%s' % model._meta.model_name)
+
+
+def authenticate(scope):
+    """
+    the user of the bearer token in the Authorization header, or in `?token=` as EventSource can't
+    send headers (with EVENTS_QUERY_TOKEN only, see settings). A request with both is refused,
+    the url token would only end up in the logs. None without a valid token
+    """
+    headers = dict(scope.get('headers') or ())
+    query_token = parse_qs(scope.get('query_string', b'').decode('latin1')).get('token', [None])[0]
+    authorization = headers.get(b'authorization')
+    if authorization is not None:
+        if query_token is not None:
+            return None
+        authorization = authorization.decode('latin1').split()
+        raw_token = authorization[1] if len(authorization) == 2 and authorization[0].lower() == 'bearer' else None
+    else:
+        raw_token = query_token if settings.EVENTS_QUERY_TOKEN else None
+    if not raw_token:
+        return None
+
+    close_old_connections()
+    authentication = JWTAuthentication()
+    try:
+        user = authentication.get_user(authentication.get_validated_token(raw_token))
+    except (InvalidToken, AuthenticationFailed):
+        return None
+    return user if user.is_active else None
+
+
+def project_ids(user_id):
+    from api.models.projects import ProjectUser
+
+    def member_of(alias):
+        return list(ProjectUser._base_manager.using(alias).filter(user_id=user_id).values_list('project_id', flat=True))
+
+    close_old_connections()
+    found = fan_out(member_of, shards() or (DEFAULT_DB_ALIAS,))
+    return set(project_id for ids in found.values() for project_id in ids)
+
+
+def visible(event, user_id, projects):
+    """
+    whether the user sees `event`, keeps `projects` up to date with their project memberships
+    """
+    if event.user_id is not None and event.user_id == user_id:
+        if event.left:
+            # the last event they get of the project
+            seen = event.project_id in projects
+            projects.discard(event.project_id)
+            return seen
+        projects.add(event.project_id)
+    return event.project_id in projects
+
+
+async def stream(subscription, user_id, projects, last_event_id=None):
+    """
+    the frames of a connection, the events it missed first when resuming. Ends when the connection
+    closes or falls behind
+    """
+    yield b'retry: %d\n\n' % settings.EVENTS_RETRY_MS
+    sent = 0
+    if last_event_id:
+        missed = bus.since(last_event_id)
+        if missed is None:
+            yield RESET
+        else:
+            for event in missed:
+                sent = event.sequence
+                if visible(event, user_id, projects):
+                    yield event.frame
+
+    while not subscription.closed:
+        event = await subscription.next(settings.EVENTS_HEARTBEAT)
+        if subscription.overflowed:
+            registry.inc('tmrex_event_streams_dropped_total')
+            return
+        if event is None:
+            return
+        if event is HEARTBEAT:
+            # keeps proxies from closing an idle connection
+            yield b': heartbeat\n\n'
+        elif event.sequence > sent and visible(event, user_id, projects):
+            yield event.frame
+
+
+async def wait_for_disconnect(receive, subscription):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            subscription.close()
+            return
+
+
+def response_headers(scope, content_type):
+    headers = [(b'content-type', content_type)]
+    origin = dict(scope.get('headers') or ()).get(b'origin')
+    if origin is not None and (settings.CORS_ORIGIN_ALLOW_ALL or origin.decode('latin1') in settings.CORS_ORIGIN_WHITELIST):
+        headers += [(b'access-control-allow-origin', origin), (b'vary', b'Origin')]
+    return headers
+
+
+async def refuse(scope, send, status, detail):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': response_headers(scope, b'application/json'),
+    })
+    await send({'type': 'http.response.body', 'body': json.dumps({'detail': detail}).encode('utf-8')})
+
+
+async def serve(scope, receive, send):
+    if scope['method'] != 'GET':
+        return await refuse(scope, send, 405, 'Method "%s" not allowed.' % scope['method'])
+    user = await sync_to_async(authenticate)(scope)
+    if user is None:
+        return await refuse(scope, send, 401, 'Authentication credentials were not provided.')
+    projects = await sync_to_async(project_ids)(user.pk)
+
+    headers = dict(scope.get('headers') or ())
+    last_event_id = headers.get(b'last-event-id', b'').decode('latin1') or None
+    subscription = bus.subscribe(asyncio.get_running_loop(), settings.EVENTS_QUEUE_SIZE)
+    disconnect = asyncio.ensure_future(wait_for_disconnect(receive, subscription))
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': response_headers(scope, b'text/event-stream') + [
+                (b'cache-control', b'no-cache'),
+                # nginx would buffer the stream
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+        async for frame in stream(subscription, user.pk, projects, last_event_id):
+            await send({'type': 'http.response.body', 'body': frame, 'more_body': True})
+        if not subscription.closed:
+            await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        bus.unsubscribe(subscription)
+        disconnect.cancel()
+
+
+class EventStreamApplication:
+    """
+    ASGI application serving the change feed at EVENTS_PATH itself, an open stream only costs a
+    coroutine instead of a worker thread. Everything else goes to `application`.
+    `GET EVENTS_PATH` with a bearer token streams task and membership changes of the projects the
+    user is a member of, as Server-Sent Events. Only the changes made by this process are seen,
+    run the ASGI server with a single worker process
+    """
+
+    def __init__(self, application):
+        self.application = application
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['path'] == settings.EVENTS_PATH and settings.EVENTS_ENABLED:
+            return await serve(scope, receive, send)
+        return await self.application(scope, receive, send)
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from api.webhooks import Dispatcher
+
+
+class Command(BaseCommand):
+    help = (
+        "Delivers the webhook outbox until interrupted (see api.webhooks.Dispatcher), "
+        "run a single one"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="one round over every database, then exit")
+
+    def handle(self, *args, **options):
+        dispatcher = Dispatcher()
+        try:
+            if options['once']:
+                attempted = dispatcher.dispatch_once()
+                self.stdout.write('%d messages attempted' % attempted)
+            else:
+                dispatcher.run()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            dispatcher.close()
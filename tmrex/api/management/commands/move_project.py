@@ -0,0 +1,102 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Q
+from api.models.activity import Activity
+from api.models.notifications import Notification
+from api.models.projects import Project, ProjectUser
+from api.models.sharding import ProjectShard
+from api.models.tasks import Task, TaskUser, RelatedTask
+from api.models.time_entries import TimeEntry
+from api.models.webhooks import Webhook, OutboxMessage
+from api.sharding import directory, shards
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves a project, its tasks, members and task relations to another shard, projects and "
+        "tasks keep their ids. The copy is written first, then the directory points at it and the "
+        "old rows go after --grace seconds, while workers still read the old entry. Writes to the "
+        "project while it moves may be lost, move it while nobody works on it"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('project', type=int)
+        parser.add_argument('shard', help="one of PROJECT_SHARDS")
+        parser.add_argument(
+            '--grace',
+            type=float,
+            default=None,
+            help="seconds between the switch and the removal of the old rows, SHARD_DIRECTORY_TTL by default"
+        )
+
+    def handle(self, *args, **options):
+        project_id, target = options['project'], options['shard']
+        if not settings.PROJECT_SHARDS:
+            raise CommandError("PROJECT_SHARDS is empty, every project is on the default database")
+        if target not in shards():
+            raise CommandError("%s is not a shard, pick one of %s" % (target, ', '.join(shards())))
+
+        directory.forget()
+        source = directory.shard_for(project_id)
+        if source == target:
+            self.stdout.write('project %d is already on %s' % (project_id, target))
+            return
+
+        project = Project._base_manager.using(source).filter(pk=project_id).first()
+        if project is None:
+            raise CommandError("project %d is not on %s, where the directory puts it" % (project_id, source))
+        if Project._base_manager.using(target).filter(pk=project_id).exists():
+            raise CommandError("%s already has a project %d, remove it first" % (target, project_id))
+
+        tasks = list(Task._base_manager.using(source).filter(project_id=project_id))
+        task_ids = set(task.pk for task in tasks)
+        relations = list(RelatedTask._base_manager.using(source).filter(
+            Q(task_a_id__in=task_ids) | Q(task_b_id__in=task_ids)))
+        outside = sorted(set(
+            task_id
+            for relation in relations
+            for task_id in (relation.task_a_id, relation.task_b_id)
+            if task_id not in task_ids
+        ))
+        if outside:
+            raise CommandError(
+                "tasks of project %d are linked to tasks of other projects (%s), unlink them first"
+                % (project_id, ', '.join(map(str, outside))))
+        project_users = list(ProjectUser._base_manager.using(source).filter(project_id=project_id))
+        task_users = list(TaskUser._base_manager.using(source).filter(task_id__in=task_ids))
+        # in id order, the feeds keep their order under the new ids
+        activities = list(Activity._base_manager.using(source).filter(project_id=project_id).order_by('pk'))
+        webhooks = list(Webhook._base_manager.using(source).filter(project_id=project_id))
+        outbox = list(OutboxMessage._base_manager.using(source).filter(webhook__project_id=project_id).order_by('pk'))
+        time_entries = list(TimeEntry._base_manager.using(source).filter(project_id=project_id))
+        notifications = list(Notification._base_manager.using(source).filter(task_id__in=task_ids))
+
+        with transaction.atomic(using=target):
+            Project._base_manager.using(target).bulk_create([project])
+            Task._base_manager.using(target).bulk_create(tasks)
+            Webhook._base_manager.using(target).bulk_create(webhooks)
+            # nothing refers to these by id, the target numbers them
+            for model, rows in ((ProjectUser, project_users), (TaskUser, task_users), (RelatedTask, relations),
+                                (Activity, activities), (OutboxMessage, outbox), (TimeEntry, time_entries),
+                                (Notification, notifications)):
+                for row in rows:
+                    row.pk = None
+                model._base_manager.using(target).bulk_create(rows)
+
+        ProjectShard.objects.using(DEFAULT_DB_ALIAS).update_or_create(
+            project_id=project_id,
+            defaults={'shard': target}
+        )
+        directory.forget()
+
+        grace = settings.SHARD_DIRECTORY_TTL if options['grace'] is None else options['grace']
+        if grace > 0:
+            time.sleep(grace)
+        Project._base_manager.using(source).filter(pk=project_id).delete()
+
+        self.stdout.write(self.style.SUCCESS(
+            'moved project %d from %s to %s: %d tasks, %d members, %d task members, %d task relations'
+            % (project_id, source, target, len(tasks), len(project_users), len(task_users), len(relations))
+        ))
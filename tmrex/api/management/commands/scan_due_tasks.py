@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from api.reminders import DueScanner
+
+
+class Command(BaseCommand):
+    help = (
+        "Notifies the owners and assignees of tasks due soon or overdue (see api.reminders.DueScanner), "
+        "scanning every DUE_SCAN_INTERVAL seconds until interrupted, or once with --once"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="one scan of every database, then exit")
+
+    def handle(self, *args, **options):
+        scanner = DueScanner()
+        try:
+            if options['once']:
+                notified = scanner.scan_once()
+                self.stdout.write('%d notifications written' % notified)
+            else:
+                scanner.run()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,152 @@
+import json
+import os
+import subprocess
+import sys
+from statistics import median
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# runs in a fresh interpreter, prints one json line
+PROBE = r'''
+import asyncio, io, json, sys
+from time import perf_counter
+
+start = perf_counter()
+import tmrex.%(server)s as entry
+ready = perf_counter() - start
+
+from api import warmup
+loaded = sorted(name for name in %(deferred)r if name in sys.modules)
+
+path = %(path)r
+start = perf_counter()
+if %(server)r == 'wsgi':
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'SERVER_NAME': 'localhost', 'SERVER_PORT': '80',
+        'REMOTE_ADDR': '127.0.0.1', 'HTTP_ACCEPT': 'application/json',
+        'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr, 'wsgi.url_scheme': 'http',
+    }
+    response = entry.application(environ, lambda status, headers, exc_info=None: None)
+    b''.join(response)
+    response.close()
+else:
+    async def request():
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+            'headers': [(b'host', b'localhost'), (b'accept', b'application/json')],
+            'client': ('127.0.0.1', 0), 'server': ('localhost', 80),
+        }
+        messages = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+
+        async def receive():
+            return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+        async def send(message):
+            pass
+
+        await entry.application(scope, receive, send)
+    asyncio.get_event_loop().run_until_complete(request())
+first_request = perf_counter() - start
+
+print(json.dumps({
+    'ready': ready,
+    'warmup': list(warmup.timings.items()),
+    'first_request': first_request,
+    'loaded': loaded,
+}))
+'''
+
+
+def parse_importtime(stderr, top):
+    """
+    time spent importing each top level package (its own modules only, not what they import),
+    from `python -X importtime` output
+    """
+    packages = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        try:
+            own, _, name = line[len('import time:'):].split('|')
+            own = int(own)
+        except ValueError:
+            # the header line
+            continue
+        package = name.strip().split('.')[0]
+        packages[package] = packages.get(package, 0) + own
+    return sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+
+
+class Command(BaseCommand):
+    help = (
+        "Starts fresh interpreters the way a worker does (import tmrex.wsgi/asgi, warm-up included), "
+        "reports where the time goes and fails past STARTUP_BUDGET_MS / FIRST_REQUEST_BUDGET_MS "
+        "or when one of STARTUP_DEFERRED_MODULES was imported before the first request"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--server', choices=['wsgi', 'asgi'], default='wsgi')
+        parser.add_argument('--runs', type=int, default=3, help="median of that many cold starts")
+        parser.add_argument('--path', default='/api/tasks/', help="the first request")
+        parser.add_argument('--budget-ms', type=float, default=settings.STARTUP_BUDGET_MS)
+        parser.add_argument('--first-request-budget-ms', type=float, default=settings.FIRST_REQUEST_BUDGET_MS)
+        parser.add_argument('--imports', type=int, default=10, help="list the N packages slowest to import")
+
+    def probe(self, options, importtime=False):
+        command = [sys.executable]
+        if importtime:
+            command += ['-X', 'importtime']
+        command += ['-c', PROBE % {
+            'server': options['server'],
+            'path': options['path'],
+            'deferred': tuple(settings.STARTUP_DEFERRED_MODULES),
+        }]
+        result = subprocess.run(
+            command,
+            cwd=settings.BASE_DIR,
+            env=dict(os.environ, DJANGO_SETTINGS_MODULE='tmrex.settings'),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True
+        )
+        if result.returncode != 0:
+            raise CommandError("the worker did not start:\n%s" % result.stderr[-2000:])
+        return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+    def handle(self, *args, **options):
+        runs = [self.probe(options)[0] for _ in range(max(options['runs'], 1))]
+
+        ready_ms = median(run['ready'] for run in runs) * 1000
+        first_request_ms = median(run['first_request'] for run in runs) * 1000
+        warmup_ms = [
+            (name, median(dict(run['warmup'])[name] for run in runs) * 1000)
+            for name, _ in runs[0]['warmup']
+        ]
+        loaded = sorted(set(name for run in runs for name in run['loaded']))
+
+        self.stdout.write('%s startup, median of %d cold starts' % (options['server'], len(runs)))
+        self.stdout.write('  %-28s %9.1fms' % ('import + setup', ready_ms - sum(ms for _, ms in warmup_ms)))
+        for name, ms in warmup_ms:
+            self.stdout.write('  %-28s %9.1fms' % ('warm-up: %s' % name, ms))
+        self.stdout.write('  %-28s %9.1fms  (budget %.0fms)' % ('ready', ready_ms, options['budget_ms']))
+        self.stdout.write('  %-28s %9.1fms  (budget %.0fms)' % (
+            'first request %s' % options['path'], first_request_ms, options['first_request_budget_ms']))
+
+        if options['imports'] > 0:
+            _, stderr = self.probe(options, importtime=True)
+            self.stdout.write('import time by package (own modules, -X importtime adds some overhead)')
+            for package, microseconds in parse_importtime(stderr, options['imports']):
+                self.stdout.write('  %-28s %9.1fms' % (package, microseconds / 1000))
+
+        failures = []
+        if ready_ms > options['budget_ms']:
+            failures.append('ready after %.1fms, budget is %.0fms' % (ready_ms, options['budget_ms']))
+        if first_request_ms > options['first_request_budget_ms']:
+            failures.append('first request took %.1fms, budget is %.0fms' % (
+                first_request_ms, options['first_request_budget_ms']))
+        if loaded:
+            failures.append('imported before the first request: %s' % ', '.join(loaded))
+        if failures:
+            raise CommandError('startup budget exceeded: %s' % '; '.join(failures))
+        self.stdout.write(self.style.SUCCESS('within budget'))
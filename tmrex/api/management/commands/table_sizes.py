@@ -0,0 +1,76 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, DEFAULT_DB_ALIAS
+
+
+class Command(BaseCommand):
+    help = "On-disk size of the api tables and of their indexes (sqlite and postgresql)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('tables', nargs='*', help="defaults to every table of the api app")
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument(
+            '--vacuum',
+            action='store_true',
+            help="VACUUM first so free pages and bloat don't count"
+        )
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        tables = options['tables'] or [
+            model._meta.db_table for model in apps.get_app_config('api').get_models()
+        ]
+
+        if options['vacuum']:
+            with connection.cursor() as cursor:
+                cursor.execute('VACUUM')
+
+        if connection.vendor == 'sqlite':
+            sizes = self.sqlite_sizes(connection, tables)
+        elif connection.vendor == 'postgresql':
+            sizes = self.postgresql_sizes(connection, tables)
+        else:
+            raise CommandError("table sizes aren't supported on %s" % connection.vendor)
+
+        self.stdout.write('%-24s %10s %12s %12s' % ('table', 'rows', 'table bytes', 'index bytes'))
+        total_table = total_index = 0
+        for table in tables:
+            rows, table_bytes, index_bytes = sizes[table]
+            total_table += table_bytes
+            total_index += index_bytes
+            self.stdout.write('%-24s %10d %12d %12d' % (table, rows, table_bytes, index_bytes))
+        self.stdout.write('%-24s %10s %12d %12d' % ('total', '', total_table, total_index))
+
+    def count(self, cursor, table, quote):
+        cursor.execute('SELECT COUNT(*) FROM %s' % quote(table))
+        return cursor.fetchone()[0]
+
+    def sqlite_sizes(self, connection, tables):
+        quote = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            try:
+                cursor.execute(
+                    "SELECT m.tbl_name, m.type, SUM(s.pgsize) FROM dbstat s "
+                    "JOIN sqlite_master m ON m.name = s.name GROUP BY m.tbl_name, m.type"
+                )
+            except Exception as e:
+                raise CommandError("this sqlite build has no dbstat table: %s" % e)
+            pages = {(table, kind): size for table, kind, size in cursor.fetchall()}
+            return {
+                table: (
+                    self.count(cursor, table, quote),
+                    pages.get((table, 'table'), 0),
+                    pages.get((table, 'index'), 0)
+                )
+                for table in tables
+            }
+
+    def postgresql_sizes(self, connection, tables):
+        quote = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            sizes = {}
+            for table in tables:
+                cursor.execute('SELECT pg_table_size(%s), pg_indexes_size(%s)', [table, table])
+                table_bytes, index_bytes = cursor.fetchone()
+                sizes[table] = (self.count(cursor, table, quote), table_bytes, index_bytes)
+            return sizes
@@ -0,0 +1,146 @@
+import mimetypes
+import os
+import re
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, HttpResponse, HttpResponseNotFound, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_etags
+from django.views.decorators.http import require_safe
+
+CONTENT_ADDRESSED_NAME = re.compile(r'^[0-9a-f]{64}$')
+RANGE_HEADER = re.compile(r'^bytes=(\d*)-(\d*)$')
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'public, max-age=0, must-revalidate'
+
+
+class RangeFile:
+    """
+    Read only window over an open file, so a byte range can still be handed to `wsgi.file_wrapper`.
+    Servers that sendfile (gunicorn) start at the current offset and stop after Content-Length,
+    the rest just call `read()` until it runs dry.
+    """
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.name = file.name
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def media_etag(path, stat):
+    """
+    uploaded avatars are named after the sha256 of their content, so the name itself is a strong etag,
+    anything else falls back to mtime and size like most web servers do
+    """
+    name = os.path.splitext(os.path.basename(path))[0]
+    if CONTENT_ADDRESSED_NAME.match(name):
+        return '"%s"' % name, True
+    return '"%x-%x"' % (int(stat.st_mtime), stat.st_size), False
+
+
+def parse_range(header, size):
+    """
+    Only a single `bytes=start-end` range is supported, returns (start, end) inclusive,
+    None to serve the whole file or raises ValueError when the range can not be satisfied
+    """
+    match = RANGE_HEADER.match(header.replace(' ', ''))
+    if not match or not any(match.groups()):
+        return None
+
+    start, end = match.groups()
+    if not start:
+        # suffix range, the last N bytes
+        length = int(end)
+        if length == 0:
+            raise ValueError('empty suffix range')
+        return max(size - length, 0), size - 1
+
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start > end or start >= size:
+        raise ValueError('range out of bounds')
+    return start, end
+
+
+@require_safe
+def serve_media(request, path):
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        stat = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError):
+        return HttpResponseNotFound()
+    if not os.path.isfile(full_path):
+        return HttpResponseNotFound()
+
+    etag, immutable = media_etag(full_path, stat)
+    cache_headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(stat.st_mtime),
+        'Cache-Control': IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL,
+    }
+
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match and (if_none_match.strip() == '*' or etag in parse_etags(if_none_match)):
+        response = HttpResponseNotModified()
+        for header, value in cache_headers.items():
+            response[header] = value
+        return response
+
+    content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+    mode = settings.MEDIA_SERVE_MODE
+
+    if mode in ('x-accel-redirect', 'x-sendfile'):
+        # the web server does the actual work, ranges included
+        response = HttpResponse(content_type=content_type)
+        if mode == 'x-accel-redirect':
+            response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_REDIRECT_PREFIX + path.lstrip('/')
+        else:
+            response['X-Sendfile'] = full_path
+    else:
+        response = serve_file(request, full_path, stat.st_size, etag, content_type)
+
+    for header, value in cache_headers.items():
+        response[header] = value
+    return response
+
+
+def serve_file(request, full_path, size, etag, content_type):
+    byte_range = None
+    range_header = request.META.get('HTTP_RANGE')
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if range_header and (not if_range or if_range.strip() == etag):
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = 'bytes */%d' % size
+            return response
+
+    file = open(full_path, 'rb')
+    if byte_range is None:
+        response = FileResponse(file, content_type=content_type)
+        response['Content-Length'] = size
+    else:
+        start, end = byte_range
+        length = end - start + 1
+        response = FileResponse(RangeFile(file, start, length), content_type=content_type, status=206)
+        response['Content-Length'] = length
+        response['Content-Range'] = 'bytes %d-%d/%d' % (start, end, size)
+
+    response.block_size = 64 * 1024
+    response['Accept-Ranges'] = 'bytes'
+    return response
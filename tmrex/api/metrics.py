@@ -0,0 +1,232 @@
+import json
+import os
+import threading
+from bisect import bisect_left
+from time import monotonic, perf_counter
+from django.conf import settings
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRICS = {
+    'tmrex_http_requests_total': ('counter', 'Requests served, by view, method and status code'),
+    'tmrex_http_request_duration_seconds': ('histogram', 'Time spent serving a request, by view'),
+    'tmrex_db_queries_total': ('counter', 'Database queries run, by view'),
+    'tmrex_db_query_duration_seconds_total': ('counter', 'Time spent in the database, by view'),
+    'tmrex_cache_hits_total': ('counter', 'In-process cache hits, by cache'),
+    'tmrex_cache_misses_total': ('counter', 'In-process cache misses, by cache'),
+    'tmrex_throttled_requests_total': ('counter', 'Requests refused by a token bucket, by view action'),
+    'tmrex_event_streams_dropped_total': ('counter', 'Event streams closed for falling behind'),
+}
+
+
+class Shard:
+    """
+    Metrics of a single thread. Only the owning thread ever writes to it, which is what lets
+    the hot path go without locks
+    """
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+
+
+class MetricsRegistry:
+    """
+    Counters and histograms for this process. Every process flushes its own snapshot to
+    `<directory>/<pid>.json` from time to time, the /metrics view adds all of them up,
+    so each worker can be scraped and still report for the whole server.
+    """
+
+    def __init__(self, directory, flush_interval=5, buckets=DEFAULT_BUCKETS, name=None):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.buckets = tuple(buckets)
+        self.name = name
+        self.local = threading.local()
+        self.shards = []
+        self.lock = threading.Lock()
+        self.last_flush = monotonic()
+
+    def shard(self):
+        shard = getattr(self.local, 'shard', None)
+        if shard is None:
+            shard = self.local.shard = Shard()
+            with self.lock:
+                self.shards.append(shard)
+        return shard
+
+    def inc(self, name, labels=(), value=1):
+        counters = self.shard().counters
+        key = (name, labels)
+        counters[key] = counters.get(key, 0) + value
+
+    def observe(self, name, value, labels=()):
+        histograms = self.shard().histograms
+        key = (name, labels)
+        histogram = histograms.get(key)
+        if histogram is None:
+            # one slot per bucket, +Inf, then sum
+            histogram = histograms[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        histogram[bisect_left(self.buckets, value)] += 1
+        histogram[-1] += value
+
+    def snapshot(self):
+        counters = {}
+        histograms = {}
+        with self.lock:
+            shards = list(self.shards)
+        for shard in shards:
+            for key, value in list(shard.counters.items()):
+                counters[key] = counters.get(key, 0) + value
+            for key, values in list(shard.histograms.items()):
+                merge_histogram(histograms, key, list(values))
+        return counters, histograms
+
+    def path(self):
+        return os.path.join(self.directory, '%s.json' % (self.name or os.getpid()))
+
+    def flush(self):
+        self.last_flush = monotonic()
+        counters, histograms = self.snapshot()
+        data = {
+            'buckets': self.buckets,
+            'counters': [[name, labels, value] for (name, labels), value in counters.items()],
+            'histograms': [[name, labels, values] for (name, labels), values in histograms.items()],
+        }
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path()
+        temporary = '%s.%d.tmp' % (path, threading.get_ident())
+        with open(temporary, 'w') as file:
+            json.dump(data, file)
+        os.replace(temporary, path)
+
+    def maybe_flush(self):
+        if monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def collect(self):
+        """
+        adds up the snapshots of every process, this one included
+        """
+        self.flush()
+        counters = {}
+        histograms = {}
+        for file_name in os.listdir(self.directory):
+            if not file_name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, file_name)) as file:
+                    data = json.load(file)
+            except (OSError, ValueError):
+                # worker went away or is halfway through its first flush
+                continue
+            if tuple(data['buckets']) != self.buckets:
+                continue
+            for name, labels, value in data['counters']:
+                key = (name, tuple(tuple(label) for label in labels))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, values in data['histograms']:
+                merge_histogram(histograms, (name, tuple(tuple(label) for label in labels)), values)
+        return counters, histograms
+
+    def render(self):
+        """
+        Prometheus text exposition format 0.0.4
+        """
+        counters, histograms = self.collect()
+        lines = []
+        for name, (kind, help_text) in METRICS.items():
+            lines.append('# HELP %s %s' % (name, help_text))
+            lines.append('# TYPE %s %s' % (name, kind))
+            if kind == 'histogram':
+                for (metric, labels), values in sorted(histograms.items()):
+                    if metric == name:
+                        lines.extend(self.render_histogram(name, labels, values))
+            else:
+                for (metric, labels), value in sorted(counters.items()):
+                    if metric == name:
+                        lines.append('%s%s %s' % (name, format_labels(labels), format_value(value)))
+        return '\n'.join(lines) + '\n'
+
+    def render_histogram(self, name, labels, values):
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), values):
+            cumulative += count
+            bucket_labels = labels + (('le', '+Inf' if bound == float('inf') else repr(bound)),)
+            yield '%s_bucket%s %d' % (name, format_labels(bucket_labels), cumulative)
+        yield '%s_sum%s %s' % (name, format_labels(labels), format_value(values[-1]))
+        yield '%s_count%s %d' % (name, format_labels(labels), cumulative)
+
+
+def merge_histogram(histograms, key, values):
+    current = histograms.get(key)
+    if current is None:
+        histograms[key] = values
+    else:
+        histograms[key] = [a + b for a, b in zip(current, values)]
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join(
+        '%s="%s"' % (key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in labels
+    )
+
+
+def format_value(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+class QueryCounter:
+    """
+    cheapest possible execute wrapper, just a count and the time spent
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += perf_counter() - start
+            self.count += 1
+
+
+def view_name(request):
+    """
+    `TaskViewSet.list`, `Register.post`, `serve_media`... keeps the label set small and readable
+    """
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+
+    view_class = getattr(match.func, 'cls', None)
+    if view_class is None:
+        return match.func.__name__
+
+    method = request.method.lower()
+    actions = getattr(match.func, 'actions', None)
+    if actions:
+        return '%s.%s' % (view_class.__name__, actions.get(method, method))
+    return '%s.%s' % (view_class.__name__, method)
+
+
+registry = MetricsRegistry(
+    settings.METRICS_DIR,
+    flush_interval=settings.METRICS_FLUSH_INTERVAL
+)
+
+
+def cache_hit(cache: str):
+    registry.inc('tmrex_cache_hits_total', (('cache', cache),))
+
+
+def cache_miss(cache: str):
+    registry.inc('tmrex_cache_misses_total', (('cache', cache),))
@@ -0,0 +1,172 @@
+import hashlib
+import logging
+import random
+import re
+from collections import Counter
+from contextlib import ExitStack
+from time import perf_counter
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from api.metrics import registry, QueryCounter, view_name
+from api import activity
+
+logger = logging.getLogger('api.sql')
+
+# `IN (%s, %s, %s)` and `VALUES (%s, %s), (%s, %s)` are the same query no matter how many params
+REPEATED_PLACEHOLDERS = re.compile(r'%s(?:\s*,\s*%s)+')
+REPEATED_GROUPS = re.compile(r'\((?:%s\.\.\.|%s)\)(?:\s*,\s*\((?:%s\.\.\.|%s)\))+')
+
+
+def fingerprint(sql: str):
+    normalized = REPEATED_PLACEHOLDERS.sub('%s...', sql)
+    normalized = REPEATED_GROUPS.sub('(%s...)...', normalized)
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:12], normalized
+
+
+class QueryCollector:
+    """
+    Execute wrapper (see `connection.execute_wrapper`) counting queries, db time and
+    repeated statements for a single request
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += perf_counter() - start
+            self.count += 1
+            self.statements[sql] += 1
+
+    @property
+    def duration_ms(self):
+        return self.duration * 1000
+
+    def duplicates(self):
+        """
+        returns [(fingerprint, times, sql)] for every query that ran more than once, worst first
+        """
+        grouped = {}
+        for sql, times in self.statements.items():
+            key, normalized = fingerprint(sql)
+            previous = grouped.get(key, (0, normalized))[0]
+            grouped[key] = (previous + times, normalized)
+
+        return sorted(
+            ((key, times, sql) for key, (times, sql) in grouped.items() if times > 1),
+            key=lambda duplicate: duplicate[1],
+            reverse=True
+        )
+
+    def server_timing(self):
+        duplicated = sum(times for _, times, _ in self.duplicates())
+        return 'db;desc="%d queries";dur=%.2f, db-dup;desc="%d duplicated"' % (
+            self.count, self.duration_ms, duplicated)
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Instruments a sample of the requests (SQL_SAMPLE_RATE) with a QueryCollector on every db connection.
+    Sampled responses get a `Server-Timing` header and requests above SQL_LOG_QUERY_COUNT queries
+    or SQL_LOG_DB_TIME_MS are logged to `api.sql` along with their repeated queries.
+    With sampling turned off the middleware removes itself from the chain.
+    """
+
+    def __init__(self, get_response):
+        self.sample_rate = settings.SQL_SAMPLE_RATE
+        if self.sample_rate <= 0:
+            raise MiddlewareNotUsed()
+
+        self.get_response = get_response
+        self.max_queries = settings.SQL_LOG_QUERY_COUNT
+        self.max_db_time_ms = settings.SQL_LOG_DB_TIME_MS
+
+    def __call__(self, request):
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        collector = QueryCollector()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(collector))
+            response = self.get_response(request)
+
+        request.sql_queries = collector
+        response['Server-Timing'] = collector.server_timing()
+        if collector.count >= self.max_queries or collector.duration_ms >= self.max_db_time_ms:
+            self.log(request, collector)
+        return response
+
+    def log(self, request, collector):
+        duplicates = collector.duplicates()
+        logger.warning(
+            '%s %s ran %d queries in %.2fms, %d of them repeated%s',
+            request.method,
+            request.path,
+            collector.count,
+            collector.duration_ms,
+            len(duplicates),
+            ''.join(
+                '\n  %s x%d %s' % (key, times, sql[:200])
+                for key, times, sql in duplicates[:10]
+            ),
+            extra={
+                'path': request.path,
+                'queries': collector.count,
+                'db_time_ms': collector.duration_ms,
+                'duplicates': [(key, times) for key, times, _ in duplicates],
+            }
+        )
+
+
+class MetricsMiddleware:
+    """
+    Feeds the metrics registry: requests by view/method/status, latency histogram and
+    db queries per view. Should sit at the top of MIDDLEWARE to time the whole chain
+    """
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = QueryCounter()
+        start = perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(queries))
+            response = self.get_response(request)
+        elapsed = perf_counter() - start
+
+        view = (('view', view_name(request)),)
+        registry.inc(
+            'tmrex_http_requests_total',
+            view + (('method', request.method), ('status', str(response.status_code)))
+        )
+        registry.observe('tmrex_http_request_duration_seconds', elapsed, view)
+        if queries.count:
+            registry.inc('tmrex_db_queries_total', view, queries.count)
+            registry.inc('tmrex_db_query_duration_seconds_total', view, queries.duration)
+        registry.maybe_flush()
+        return response
+
+
+class ActivityMiddleware:
+    """
+    Buffers the activity events of a request (see `api.activity.batch`), they are written in a
+    single INSERT per database once the response is ready
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with activity.batch():
+            return self.get_response(request)
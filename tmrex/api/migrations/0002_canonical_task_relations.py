@@ -0,0 +1,95 @@
+# Generated by Django 3.0.7 on 2026-10-19 00:00
+
+from django.db import migrations, models
+
+# frozen copy of `Relationships`, migrations must not depend on the current models
+INVERSE = {
+    'PARENT_TASK_OF': 'SUB_TASK_OF',
+    'SUB_TASK_OF': 'PARENT_TASK_OF',
+    'BLOCKED_BY': 'IS_BLOCKING',
+    'IS_BLOCKING': 'BLOCKED_BY',
+    'RELATED_TASK': 'RELATED_TASK',
+}
+STORED = ('PARENT_TASK_OF', 'IS_BLOCKING', 'RELATED_TASK')
+BATCH_SIZE = 500
+
+
+def canonical(task_a_id, task_b_id, rel):
+    if rel == 'RELATED_TASK':
+        return min(task_a_id, task_b_id), max(task_a_id, task_b_id), rel
+    if rel in STORED:
+        return task_a_id, task_b_id, rel
+    return task_b_id, task_a_id, INVERSE[rel]
+
+
+def collapse_relations(apps, schema_editor):
+    """
+    keep one row per edge: the canonical one when it exists, else the other one turned around
+    """
+    RelatedTask = apps.get_model('api', 'RelatedTask')
+    rows = RelatedTask.objects.using(schema_editor.connection.alias)
+
+    kept = {}
+    duplicates = []
+    for row_id, task_a_id, task_b_id, rel in rows.order_by('id').values_list(
+            'id', 'task_a_id', 'task_b_id', 'is_connected_as').iterator():
+        key = canonical(task_a_id, task_b_id, rel)
+        is_canonical = key == (task_a_id, task_b_id, rel)
+        previous = kept.get(key)
+        if previous is None:
+            kept[key] = (row_id, is_canonical)
+        elif is_canonical and not previous[1]:
+            duplicates.append(previous[0])
+            kept[key] = (row_id, True)
+        else:
+            duplicates.append(row_id)
+
+    for start in range(0, len(duplicates), BATCH_SIZE):
+        rows.filter(id__in=duplicates[start:start + BATCH_SIZE]).delete()
+
+    for (task_a_id, task_b_id, rel), (row_id, is_canonical) in kept.items():
+        if not is_canonical:
+            rows.filter(id=row_id).update(task_a_id=task_a_id, task_b_id=task_b_id, is_connected_as=rel)
+
+
+def expand_relations(apps, schema_editor):
+    """
+    back to a forward and an inverse row per edge
+    """
+    RelatedTask = apps.get_model('api', 'RelatedTask')
+    rows = RelatedTask.objects.using(schema_editor.connection.alias)
+
+    inverse = []
+    for task_a_id, task_b_id, rel in rows.values_list('task_a_id', 'task_b_id', 'is_connected_as').iterator():
+        if task_a_id != task_b_id or rel != INVERSE[rel]:
+            inverse.append(RelatedTask(task_a_id=task_b_id, task_b_id=task_a_id, is_connected_as=INVERSE[rel]))
+    rows.bulk_create(inverse, batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='task',
+            name='related_tasks',
+        ),
+        migrations.AlterField(
+            model_name='project',
+            name='avatar',
+            field=models.ImageField(max_length=1024, upload_to='project', verbose_name='Project Avatar'),
+        ),
+        migrations.AlterField(
+            model_name='task',
+            name='avatar',
+            field=models.ImageField(max_length=1024, upload_to='task', verbose_name='Task Avatar'),
+        ),
+        migrations.RunPython(collapse_relations, expand_relations),
+        migrations.AddConstraint(
+            model_name='relatedtask',
+            constraint=models.UniqueConstraint(fields=('task_a', 'task_b', 'is_connected_as'), name='unique_task_relation'),
+        ),
+    ]
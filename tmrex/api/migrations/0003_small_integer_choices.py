@@ -0,0 +1,108 @@
+# Generated by Django 3.0.7 on 2026-10-19 00:06
+
+import api.models.fields
+import api.models.projects
+import api.models.tasks
+from django.db import migrations, models
+
+# frozen codes, SmallIntegerChoicesField numbers the members 1..n in declaration order
+CODES = {
+    ('project', 'state'): ('ACTIVE', 'INACTIVE', 'ARCHIVED'),
+    ('projectuser', 'access'): ('OWNER', 'PARTICIPANT', 'GUEST'),
+    ('relatedtask', 'is_connected_as'): (
+        'PARENT_TASK_OF', 'SUB_TASK_OF', 'BLOCKED_BY', 'IS_BLOCKING', 'RELATED_TASK'),
+    ('task', 'state'): ('OPENED', 'BLOCKED', 'CLOSED', 'ARCHIVED', 'REVIEW_PENDING'),
+    ('taskuser', 'access'): ('OWNER', 'PARTICIPANT', 'GUEST'),
+}
+
+
+def encode(apps, schema_editor):
+    """
+    one UPDATE per enum member, `<field>_code` gets the code of the string next to it
+    """
+    for (model_name, name), values in CODES.items():
+        rows = apps.get_model('api', model_name)._base_manager.using(schema_editor.connection.alias)
+        for code, value in enumerate(values, start=1):
+            rows.filter(**{name: value}).update(**{name + '_code': code})
+
+
+def decode(apps, schema_editor):
+    for (model_name, name), values in CODES.items():
+        rows = apps.get_model('api', model_name)._base_manager.using(schema_editor.connection.alias)
+        for code, value in enumerate(values, start=1):
+            rows.filter(**{name + '_code': code}).update(**{name: value})
+
+
+def add_code_fields():
+    return [
+        migrations.AddField(
+            model_name=model_name,
+            name=name + '_code',
+            field=models.SmallIntegerField(null=True),
+        )
+        for model_name, name in CODES
+    ]
+
+
+def replace_string_fields():
+    operations = []
+    for model_name, name in CODES:
+        operations.append(migrations.RemoveField(model_name=model_name, name=name))
+        operations.append(migrations.RenameField(model_name=model_name, old_name=name + '_code', new_name=name))
+    return operations
+
+
+class Migration(migrations.Migration):
+    """
+    Strings can't be cast to integers in place on every backend, so each column is rebuilt next to
+    the old one: add `<field>_code`, fill it, drop the string column and take its name
+    """
+
+    dependencies = [
+        ('api', '0002_canonical_task_relations'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='relatedtask',
+            name='unique_task_relation',
+        ),
+        *add_code_fields(),
+        # without a default it could not be added back empty when going backwards
+        migrations.AlterField(
+            model_name='relatedtask',
+            name='is_connected_as',
+            field=models.TextField(choices=[('PARENT_TASK_OF', 'Parent task'), ('SUB_TASK_OF', 'Sub task'), ('BLOCKED_BY', 'BlockedBy'), ('IS_BLOCKING', 'IsBlocking'), ('RELATED_TASK', 'Just related')], max_length=128, null=True),
+        ),
+        migrations.RunPython(encode, decode),
+        *replace_string_fields(),
+        migrations.AlterField(
+            model_name='project',
+            name='state',
+            field=api.models.fields.SmallIntegerChoicesField(default='ACTIVE', enum=api.models.projects.AvailableProjectStates, verbose_name='Project state, Active, inactive etc'),
+        ),
+        migrations.AlterField(
+            model_name='projectuser',
+            name='access',
+            field=api.models.fields.SmallIntegerChoicesField(default='GUEST', enum=api.models.projects.AvailableAccessTypes, verbose_name='Access to Project'),
+        ),
+        migrations.AlterField(
+            model_name='relatedtask',
+            name='is_connected_as',
+            field=api.models.fields.SmallIntegerChoicesField(enum=api.models.tasks.AvailableTaskRelations),
+        ),
+        migrations.AlterField(
+            model_name='task',
+            name='state',
+            field=api.models.fields.SmallIntegerChoicesField(default='OPENED', enum=api.models.tasks.AvailableTaskStates, verbose_name='TaskState, like Open,closed, blocked, archived, based on project may be'),
+        ),
+        migrations.AlterField(
+            model_name='taskuser',
+            name='access',
+            field=api.models.fields.SmallIntegerChoicesField(default='GUEST', enum=api.models.projects.AvailableAccessTypes, verbose_name='Access to Task'),
+        ),
+        migrations.AddConstraint(
+            model_name='relatedtask',
+            constraint=models.UniqueConstraint(fields=('task_a', 'task_b', 'is_connected_as'), name='unique_task_relation'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 3.0.7 on 2026-10-19 00:50
+
+import api.models.activity
+import api.models.fields
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('api', '0005_admin_title_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Activity',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('verb', api.models.fields.SmallIntegerChoicesField(enum=api.models.activity.ActivityVerbs)),
+                ('before', models.CharField(blank=True, default='', max_length=64)),
+                ('after', models.CharField(blank=True, default='', max_length=64)),
+                ('created_on', models.DateTimeField(default=django.utils.timezone.now)),
+                ('project', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='activities', to='api.Project')),
+                ('task', models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='activities', to='api.Task')),
+                ('user', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='activity',
+            index=models.Index(fields=['project', 'id'], name='activity_project_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='activity',
+            index=models.Index(fields=['task', 'id'], name='activity_task_idx'),
+        ),
+    ]
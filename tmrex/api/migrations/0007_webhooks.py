@@ -0,0 +1,42 @@
+# Generated by Django 3.0.7 on 2026-10-19 00:59
+
+import api.models.webhooks
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('api', '0006_activity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Webhook',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField(max_length=1024)),
+                ('secret', models.CharField(default=api.models.webhooks.new_secret, max_length=64)),
+                ('active', models.BooleanField(default=True)),
+                ('created_on', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_by', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='webhooks', to='api.Project')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='OutboxMessage',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('payload', models.TextField()),
+                ('created_on', models.DateTimeField(default=django.utils.timezone.now)),
+                ('attempts', models.SmallIntegerField(default=0)),
+                ('next_attempt_on', models.DateTimeField(db_index=True, default=django.utils.timezone.now, null=True)),
+                ('last_error', models.CharField(blank=True, default='', max_length=255)),
+                ('webhook', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='outbox', to='api.Webhook')),
+            ],
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 3.0.7 on 2026-10-19 01:02
+
+import api.models.fields
+import api.models.tasks
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_webhooks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='archived_from',
+            field=api.models.fields.SmallIntegerChoicesField(blank=True, enum=api.models.tasks.AvailableTaskStates, null=True),
+        ),
+        migrations.AlterField(
+            model_name='task',
+            name='project',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='api.Project', verbose_name=''),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['project', 'state'], name='task_project_state_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 3.0.7 on 2026-10-19 01:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_time_entries'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='updated_on',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['project', 'updated_on'], name='task_project_updated_idx'),
+        ),
+    ]
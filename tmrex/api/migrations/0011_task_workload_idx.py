@@ -0,0 +1,25 @@
+# Generated by Django 3.0.7 on 2026-10-19 01:15
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('api', '0010_task_updated_on'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='task',
+            name='assignee',
+            field=models.ForeignKey(db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='assignee_task', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['assignee', 'state', 'due_on', 'estimated_hours', 'hours_spent'], name='task_workload_idx'),
+        ),
+    ]
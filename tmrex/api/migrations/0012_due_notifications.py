@@ -0,0 +1,51 @@
+# Generated by Django 3.0.7 on 2026-10-19 01:17
+
+import api.models.fields
+import api.models.notifications
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('api', '0011_task_workload_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Notification',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', api.models.fields.SmallIntegerChoicesField(enum=api.models.notifications.NotificationKinds)),
+                ('due_on', models.DateTimeField()),
+                ('created_on', models.DateTimeField(default=django.utils.timezone.now)),
+                ('read_on', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['state', 'due_on'], name='task_state_due_idx'),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='task',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to='api.Task'),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='user',
+            field=models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'id'], name='notification_user_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='notification',
+            constraint=models.UniqueConstraint(fields=('task', 'kind', 'due_on', 'user'), name='notification_once'),
+        ),
+    ]
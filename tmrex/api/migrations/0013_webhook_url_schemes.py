@@ -0,0 +1,19 @@
+# Generated by Django 3.0.7 on 2026-10-19 01:29
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_due_notifications'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='webhook',
+            name='url',
+            field=models.URLField(max_length=1024, validators=[django.core.validators.URLValidator(schemes=['http', 'https'])]),
+        ),
+    ]
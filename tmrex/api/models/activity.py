@@ -0,0 +1,65 @@
+from django.db import models
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from django.contrib.auth.models import User
+from api.models.fields import SmallIntegerChoicesField
+from api.exceptions import InvalidOperation
+
+PROJECT_MODEL = "api.Project"
+TASK_MODEL = "api.Task"
+
+
+class ActivityVerbs(models.TextChoices):
+    STATE_CHANGED = 'STATE_CHANGED', _('state changed')
+    STARTED = 'STARTED', _('start date set')
+    ENDED = 'ENDED', _('end date set')
+    MEMBER_ADDED = 'MEMBER_ADDED', _('member added')
+    ACCESS_CHANGED = 'ACCESS_CHANGED', _('access of a member changed')
+    MEMBER_REMOVED = 'MEMBER_REMOVED', _('member removed')
+    TASKS_ARCHIVED = 'TASKS_ARCHIVED', _('tasks archived with their project')
+    TASKS_UNARCHIVED = 'TASKS_UNARCHIVED', _('tasks unarchived with their project')
+
+
+class Activity(models.Model):
+    """
+    Append-only history of a project and its tasks, written by `api.activity.record`. Rows are
+    never updated, they only go away with their project or task.
+    `before`/`after` hold the old and new state, date or access, as text
+    """
+    # (project, id) and (task, id) below cover the feeds, no index of their own
+    project = models.ForeignKey(
+        PROJECT_MODEL,
+        on_delete=models.CASCADE,
+        related_name='activities',
+        db_index=False
+    )
+    task = models.ForeignKey(
+        TASK_MODEL,
+        on_delete=models.CASCADE,
+        null=True,
+        related_name='activities',
+        db_index=False
+    )
+    verb = SmallIntegerChoicesField(enum=ActivityVerbs)
+    # the member added, changed or removed
+    user = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='+',
+        db_constraint=False
+    )
+    before = models.CharField(max_length=64, blank=True, default='')
+    after = models.CharField(max_length=64, blank=True, default='')
+    created_on = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['project', 'id'], name='activity_project_idx'),
+            models.Index(fields=['task', 'id'], name='activity_task_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise InvalidOperation("Activity is append-only")
+        super().save(*args, **kwargs)
@@ -0,0 +1,65 @@
+from django.core import exceptions
+from django.db import models
+from django.utils.functional import cached_property
+
+
+class SmallIntegerChoicesField(models.SmallIntegerField):
+    """
+    Keeps a TextChoices enum in a SMALLINT column. Python, forms and the API only ever see the enum
+    members (`task.state == AvailableTaskStates.OPENED` and 'OPENED' in json), the database sees
+    1..n in the order the members are declared. So new members go at the end and existing ones are
+    never reordered or removed, or a data migration has to come along.
+    """
+
+    def __init__(self, *args, enum=None, **kwargs):
+        if enum is None:
+            raise TypeError("SmallIntegerChoicesField needs an `enum`")
+        self.enum = enum
+        self.codes = {member.value: code for code, member in enumerate(enum, start=1)}
+        self.members = {code: member for code, member in enumerate(enum, start=1)}
+        kwargs['choices'] = enum.choices
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        # choices always follow the enum
+        kwargs.pop('choices', None)
+        kwargs['enum'] = self.enum
+        return name, path, args, kwargs
+
+    @cached_property
+    def validators(self):
+        # the SMALLINT range checks of IntegerField are about codes, values here are enum members
+        return [*self.default_validators, *self._validators]
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return self.members[value]
+
+    def to_python(self, value):
+        if value is None or isinstance(value, self.enum):
+            return value
+        if isinstance(value, int) and value in self.members:
+            return self.members[value]
+        try:
+            return self.enum(value)
+        except ValueError:
+            raise exceptions.ValidationError(
+                self.error_messages['invalid_choice'],
+                code='invalid_choice',
+                params={'value': value},
+            )
+
+    def get_prep_value(self, value):
+        value = models.Field.get_prep_value(self, value)
+        if value is None:
+            return value
+        if isinstance(value, int) and value in self.members:
+            return value
+        try:
+            return self.codes[value]
+        except (KeyError, TypeError):
+            raise ValueError(
+                "Field '%s' expected one of %s but got %r." % (self.name, ', '.join(self.codes), value)
+            )
@@ -0,0 +1,45 @@
+from django.db import models
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from django.contrib.auth.models import User
+from api.models.fields import SmallIntegerChoicesField
+
+TASK_MODEL = "api.Task"
+
+
+class NotificationKinds(models.TextChoices):
+    DUE_SOON = 'DUE_SOON', _('task due soon')
+    OVERDUE = 'OVERDUE', _('task overdue')
+
+
+class Notification(models.Model):
+    """
+    Something a user should know about a task, written by `api.reminders`. There is one per user,
+    task, kind and due date: scanning a task again adds nothing, moving its due date announces
+    it again
+    """
+    # the unique constraint below leads with the task, no index of its own. (task, kind, due_on)
+    # first, the scanner looks tasks up on them
+    task = models.ForeignKey(
+        TASK_MODEL,
+        on_delete=models.CASCADE,
+        related_name='notifications',
+        db_index=False
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        db_constraint=False,
+        db_index=False
+    )
+    kind = SmallIntegerChoicesField(enum=NotificationKinds)
+    due_on = models.DateTimeField()
+    created_on = models.DateTimeField(default=timezone.now)
+    read_on = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['task', 'kind', 'due_on', 'user'], name='notification_once'),
+        ]
+        indexes = [models.Index(fields=['user', 'id'], name='notification_user_idx')]
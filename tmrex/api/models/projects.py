@@ -1,9 +1,13 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils.translation import gettext_lazy as _
 from django.contrib.auth.models import User
 from api.utils import today_as_datetime
 from datetime import date, datetime
+from api.models.tracking import DirtyFieldsMixin
+from api.models.fields import SmallIntegerChoicesField
 from api.exceptions import InvalidOperation
+from api.activity import ActivityVerbs, RecordedChangesMixin, record, record_membership
+from api.signals import tasks_updated
 # Create your models here.
 PROJECT_MODEL = "api.Project"
 
@@ -34,6 +38,7 @@ class ProjectActions(models.TextChoices):
     VIEW_PROJECT_DETAILS = 'VIEW_PROJECT_DETAILS', _(
         'Can see project details')
     VIEW_TASKS = 'VIEW_TASK', _('Can see tasks under current project')
+    MANAGE_WEBHOOKS = 'MANAGE_WEBHOOKS', _('Can add and remove webhooks')
 
 
 class ProjectAccess:
@@ -49,7 +54,8 @@ class ProjectAccess:
             ProjectActions.UNARCHIVE_PROJECT,
             ProjectActions.ADD_TASK,
             ProjectActions.VIEW_PROJECT_DETAILS,
-            ProjectActions.VIEW_TASKS
+            ProjectActions.VIEW_TASKS,
+            ProjectActions.MANAGE_WEBHOOKS
         ]),
         AvailableAccessTypes.PARTICIPANT: list([
             ProjectActions.VIEW_PROJECT_DETAILS,
@@ -76,6 +82,7 @@ class ProjectUserManager(models.Manager):
         if user already exists as a project user then only the access type will change  
         """
         project_user = self.find_user(project, user)
+        previous = project_user.access if project_user else None
 
         if not project_user:
             # Create a new one
@@ -86,6 +93,7 @@ class ProjectUserManager(models.Manager):
 
         project_user.access = access
         project_user.save(using=self._db)
+        record_membership(project, user, access, previous)
         return project_user
 
     def add_owner(self, project: PROJECT_MODEL, user: User):
@@ -104,6 +112,7 @@ class ProjectUserManager(models.Manager):
             raise InvalidOperation("invalid user")
 
         project_user.delete()
+        record(ActivityVerbs.MEMBER_REMOVED, project, user, before=project_user.access)
 
 
 class ProjectUser(models.Model):
@@ -116,10 +125,11 @@ class ProjectUser(models.Model):
         related_name='project_users'
     )
 
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
-    access = models.TextField(
+    # users stay on `default` while projects may live on a shard, no constraint across databases
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_constraint=False)
+    access = SmallIntegerChoicesField(
         _("Access to Project"),
-        choices=AvailableAccessTypes.choices,
+        enum=AvailableAccessTypes,
         default=AvailableAccessTypes.GUEST
     )
 
@@ -165,7 +175,7 @@ class ProjectManager(models.Manager):
         return project
 
 
-class Project(models.Model):
+class Project(RecordedChangesMixin, DirtyFieldsMixin, models.Model):
     title = models.CharField(max_length=256)
     description = models.TextField()
     started_on = models.DateTimeField(
@@ -174,11 +184,10 @@ class Project(models.Model):
         auto_now_add=False,
         null=True
     )
-    state = models.CharField(
+    state = SmallIntegerChoicesField(
         _("Project state, Active, inactive etc"),
-        choices=AvailableProjectStates.choices,
-        default=AvailableProjectStates.ACTIVE,
-        max_length=50
+        enum=AvailableProjectStates,
+        default=AvailableProjectStates.ACTIVE
     )
     ended_on = models.DateTimeField(
         _("Project ended on"),
@@ -190,13 +199,15 @@ class Project(models.Model):
         User,
         on_delete=models.SET_NULL,
         null=True,
-        related_name='created_by_%(class)s'
+        related_name='created_by_%(class)s',
+        db_constraint=False
     )
     updated_by = models.ForeignKey(
         User,
         on_delete=models.SET_NULL,
         null=True,
-        related_name='updated_by_%(class)s'
+        related_name='updated_by_%(class)s',
+        db_constraint=False
     )
 
     avatar = models.ImageField(
@@ -209,6 +220,13 @@ class Project(models.Model):
 
     objects = ProjectManager()
 
+    class Meta:
+        # prefix search in the admin
+        indexes = [models.Index(fields=['title'], name='project_title_idx')]
+
+    def __str__(self):
+        return self.title
+
     @property
     def owners(self):
         return self.project_users.filter(access=AvailableAccessTypes.OWNER).all()
@@ -250,23 +268,50 @@ class Project(models.Model):
         self.state = AvailableProjectStates.INACTIVE
         self.save()
 
-    def archive(self):
+    def archive(self, cascade: bool = False):
+        """
+        with `cascade` the tasks are archived along, in a single UPDATE (see TaskManager.archive_all)
+        """
         if self.state == AvailableProjectStates.ARCHIVED:
 
             raise ValueError(
                 "Common! you have already archived it once!"
             )
         self.state = AvailableProjectStates.ARCHIVED
-        self.save()
+        self.save_with_tasks('archived' if cascade else None)
 
-    def unarchive(self):
+    def unarchive(self, cascade: bool = False):
+        """
+        with `cascade` the tasks archived along with the project get their state back, the ones
+        archived on their own stay archived
+        """
         if self.state != AvailableProjectStates.ARCHIVED:
             raise InvalidOperation(
                 "Lazarus pit only works on dead people. Unarchive it first"
             )
         # After unarchival lets take to project to Inactive state
         self.state = AvailableProjectStates.INACTIVE
-        self.save()
+        self.save_with_tasks('unarchived' if cascade else None)
+
+    def save_with_tasks(self, action: str = None):
+        if action is None:
+            self.save()
+            return
+
+        with transaction.atomic(using=self._state.db):
+            self.save()
+            # task_set follows the project to its database
+            tasks = self.task_set
+            count = tasks.archive_all() if action == 'archived' else tasks.unarchive_all()
+            verb = ActivityVerbs.TASKS_ARCHIVED if action == 'archived' else ActivityVerbs.TASKS_UNARCHIVED
+            record(verb, self, after=count)
+            tasks_updated.send(
+                sender=tasks.model,
+                project_id=self.pk,
+                using=self._state.db,
+                action=action,
+                count=count
+            )
 
     def start(self):
         """
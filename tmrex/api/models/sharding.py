@@ -0,0 +1,19 @@
+from django.db import models
+
+
+class ProjectShard(models.Model):
+    """
+    Where a project lives when it is not on the shard its id points to, see `api.sharding`.
+    Only moved projects have a row. Stays on the `default` database
+    """
+    project_id = models.BigIntegerField(primary_key=True)
+    shard = models.CharField(max_length=64)
+
+
+class ShardSequence(models.Model):
+    """
+    Ids of the sharded models that are looked up by id (projects, tasks), handed out in blocks
+    so they are unique over every shard. Stays on the `default` database
+    """
+    name = models.CharField(max_length=64, primary_key=True)
+    last_id = models.BigIntegerField(default=0)
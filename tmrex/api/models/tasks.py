@@ -1,11 +1,17 @@
 
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.contrib.auth.models import User
 from api.utils import today_as_datetime
 from datetime import date, datetime
+from api.models.tracking import DirtyFieldsMixin
+from api.models.fields import SmallIntegerChoicesField
 from api.exceptions import PermissionDenied, InvalidOperation
-from api.models.projects import AvailableAccessTypes, ProjectActions
+from api.models.projects import AvailableAccessTypes, ProjectAccess, ProjectActions
+from api.activity import ActivityVerbs, RecordedChangesMixin, record, record_membership
+from api.webhooks import OutboxMixin
+from api.signals import tasks_updated
 
 PROJECT_MODEL = "api.Project"
 TASK_MODEL = "api.Task"
@@ -30,6 +36,24 @@ class Relationships:
         AvailableTaskRelations.IS_BLOCKING: AvailableTaskRelations.BLOCKED_BY,
         AvailableTaskRelations.JUST_RELATED: AvailableTaskRelations.JUST_RELATED
     }
+    # every edge is stored once as one of these, the inverse is read from the same row
+    STORED = (
+        AvailableTaskRelations.PARENT_TASK_OF,
+        AvailableTaskRelations.IS_BLOCKING,
+        AvailableTaskRelations.JUST_RELATED
+    )
+
+    @classmethod
+    def canonical(cls, task_a_id: int, task_b_id: int, rel: str):
+        """
+        the (task_a_id, task_b_id, relation) row that stores `task_a rel task_b`,
+        `B SUB_TASK_OF A` is kept as `A PARENT_TASK_OF B` and plain relations go lower id first
+        """
+        if rel == AvailableTaskRelations.JUST_RELATED:
+            return min(task_a_id, task_b_id), max(task_a_id, task_b_id), rel
+        if rel in cls.STORED:
+            return task_a_id, task_b_id, rel
+        return task_b_id, task_a_id, cls.MAP[rel]
 
 
 class AvailableTaskStates(models.TextChoices):
@@ -40,9 +64,54 @@ class AvailableTaskStates(models.TextChoices):
     REVIEW_PENDING = 'REVIEW_PENDING', _('requires a review')
 
 
+# the states of the tasks someone still has to work on
+OPEN_STATES = [AvailableTaskStates.OPENED, AvailableTaskStates.BLOCKED, AvailableTaskStates.REVIEW_PENDING]
+
+
+class Transitions:
+    """
+    the states a task can be moved to and from where, as Task.block/unblock/archive/unarchive
+    check them. Closing and asking for a review have no method, any open task can
+    """
+    ALLOWED = {
+        AvailableTaskStates.BLOCKED: (
+            AvailableTaskStates.OPENED,
+            AvailableTaskStates.REVIEW_PENDING,
+            AvailableTaskStates.ARCHIVED
+        ),
+        AvailableTaskStates.OPENED: (AvailableTaskStates.BLOCKED, AvailableTaskStates.ARCHIVED),
+        AvailableTaskStates.ARCHIVED: (
+            AvailableTaskStates.OPENED,
+            AvailableTaskStates.BLOCKED,
+            AvailableTaskStates.CLOSED,
+            AvailableTaskStates.REVIEW_PENDING
+        ),
+        AvailableTaskStates.CLOSED: (
+            AvailableTaskStates.OPENED,
+            AvailableTaskStates.BLOCKED,
+            AvailableTaskStates.REVIEW_PENDING
+        ),
+        AvailableTaskStates.REVIEW_PENDING: (AvailableTaskStates.OPENED,),
+    }
+
+    @classmethod
+    def allows(cls, current: str, target: str, archived_from: str = None):
+        """
+        an archived task only goes back to the state Task.unarchive() would give it: the one it was
+        archived from (see TaskManager.archive_all), OPENED without one
+        """
+        if current == AvailableTaskStates.ARCHIVED:
+            return target == (archived_from or AvailableTaskStates.OPENED)
+        return current in cls.ALLOWED[target]
+
+
 class TaskUserManager(models.Manager):
     def find_user(self, task: TASK_MODEL, user: User):
-        return self.filter(user=user).filter(task=task).first()
+        task_user = self.filter(user=user).filter(task=task).first()
+        if task_user is not None:
+            # spares a query to whoever follows `task_user.task` (api.events does)
+            task_user.task = task
+        return task_user
 
     def add_task_user(self, task: TASK_MODEL, user: User, access: AvailableAccessTypes):
         """
@@ -51,6 +120,7 @@ class TaskUserManager(models.Manager):
         if user already exists as a task user then only the access type will change
         """
         task_user = self.find_user(task, user)
+        previous = task_user.access if task_user else None
 
         if not task_user:
             # check if project user exists
@@ -66,6 +136,7 @@ class TaskUserManager(models.Manager):
 
         task_user.access = access
         task_user.save(using=self._db)
+        record_membership(task, user, access, previous)
         return task_user
 
     def add_owner(self, task: TASK_MODEL, user: User):
@@ -84,9 +155,85 @@ class TaskUserManager(models.Manager):
             raise InvalidOperation("invalid user")
 
         task_user.delete()
+        record(ActivityVerbs.MEMBER_REMOVED, task, user, before=task_user.access)
 
 
 class TaskManager(models.Manager):
+    # what a project archive takes along, everything but the archived tasks
+    ARCHIVABLE_STATES = [state for state in AvailableTaskStates if state != AvailableTaskStates.ARCHIVED]
+
+    def archive_all(self):
+        """
+        archives the tasks, `project.task_set.archive_all()`, in one UPDATE. Each one keeps its state in
+        `archived_from` for unarchive_all(). Returns how many were archived
+        """
+        return self.filter(state__in=self.ARCHIVABLE_STATES).update(
+            archived_from=models.F('state'),
+            state=AvailableTaskStates.ARCHIVED,
+            updated_on=timezone.now()
+        )
+
+    def transition(self, task_ids, state: str, user: User = None):
+        """
+        moves the tasks to `state` where Transitions allow it, in one transaction on this manager's
+        database: one SELECT for the current states, one UPDATE for the allowed ones. With `user`
+        only the tasks of their projects are seen, and only those of the projects where they may
+        ADD_TASK are moved. An archived task only moves to the state Task.unarchive() would give
+        it, it comes back as it was archived or not at all.
+        Returns {task id: previous state} for the tasks that moved, {task id: current state} for
+        the ones that can't go there and the ids of the tasks `user` may not move. Ids not found
+        are in none of them
+        """
+        with transaction.atomic(using=self.db):
+            tasks = self.filter(pk__in=task_ids)
+            if user is not None:
+                tasks = tasks.filter(project__project_users__user=user).annotate(
+                    access=models.F('project__project_users__access'))
+            tasks = list(tasks.select_for_update(of=('self',)).only('id', 'project_id', 'state', 'archived_from'))
+
+            forbidden = set()
+            if user is not None:
+                writers = [
+                    access for access, actions in ProjectAccess.PROJECT_PERMISSIONS.items()
+                    if ProjectActions.ADD_TASK in actions
+                ]
+                forbidden = {task.pk for task in tasks if task.access not in writers}
+                tasks = [task for task in tasks if task.pk not in forbidden]
+
+            moved = [task for task in tasks if Transitions.allows(task.state, state, task.archived_from)]
+            refused = {
+                task.pk: task.state for task in tasks if not Transitions.allows(task.state, state, task.archived_from)
+            }
+            if moved:
+                self.filter(pk__in=[task.pk for task in moved]).update(
+                    state=state, archived_from=None, updated_on=timezone.now())
+
+            by_project = {}
+            for task in moved:
+                record(ActivityVerbs.STATE_CHANGED, task, before=task.state, after=state)
+                by_project.setdefault(task.project_id, []).append(task.pk)
+            for project_id, ids in by_project.items():
+                tasks_updated.send(
+                    sender=self.model,
+                    project_id=project_id,
+                    using=self.db,
+                    action='state_changed',
+                    count=len(ids),
+                    state=state,
+                    tasks=ids
+                )
+        return {task.pk: task.state for task in moved}, refused, forbidden
+
+    def unarchive_all(self):
+        """
+        gives the tasks archived by archive_all() their state back, in one UPDATE
+        """
+        return self.filter(state=AvailableTaskStates.ARCHIVED, archived_from__isnull=False).update(
+            state=models.F('archived_from'),
+            archived_from=None,
+            updated_on=timezone.now()
+        )
+
     def create(
         self,
         author: User,
@@ -123,7 +270,7 @@ class Label(models.Model):
     hex_color = models.CharField(max_length=6)
 
 
-class Task(models.Model):
+class Task(RecordedChangesMixin, OutboxMixin, DirtyFieldsMixin, models.Model):
     """
         There are a lot of things common with project, mainly the project user and task user part.
         should wait till another such class/module comes(the sacred rule of 3 :D) and then may be a permission
@@ -151,37 +298,43 @@ class Task(models.Model):
         auto_now_add=False,
         null=True
     )
-    state = models.CharField(
+    state = SmallIntegerChoicesField(
         _("TaskState, like Open,closed, blocked, archived, based on project may be"),
-        choices=AvailableTaskStates.choices,
-        default=AvailableTaskStates.OPENED,
-        max_length=50
+        enum=AvailableTaskStates,
+        default=AvailableTaskStates.OPENED
+    )
+    # the state before the project archived it along (see TaskManager.archive_all)
+    archived_from = SmallIntegerChoicesField(
+        enum=AvailableTaskStates,
+        null=True,
+        blank=True
     )
+    # (project, state) below covers the project lookups
     project = models.ForeignKey(
         PROJECT_MODEL,
         verbose_name=_(""),
-        on_delete=models.CASCADE
+        on_delete=models.CASCADE,
+        db_index=False
     )
+    # (assignee, state, due_on, ...) below covers the assignee lookups
     assignee = models.ForeignKey(
         User,
         on_delete=models.SET_NULL,
         null=True,
-        related_name='assignee_%(class)s'
+        related_name='assignee_%(class)s',
+        db_constraint=False,
+        db_index=False
     )
     author = models.ForeignKey(
         User,
         on_delete=models.SET_NULL,
         null=True,
-        related_name='author_%(class)s'
+        related_name='author_%(class)s',
+        db_constraint=False
     )
+    # bulk updates (TaskManager) set it themselves
+    updated_on = models.DateTimeField(auto_now=True)
 
-    related_tasks = models.ManyToManyField(
-        'self',
-        verbose_name=_("related tasks"),
-        through=RELATED_TASK_MODEL,
-        symmetrical=False,
-        related_name='related_tasks+'
-    )
     avatar = models.ImageField(
         _("Task Avatar"),
         upload_to="task",
@@ -191,6 +344,25 @@ class Task(models.Model):
     )
     objects = TaskManager()
 
+    class Meta:
+        # prefix search in the admin
+        indexes = [
+            models.Index(fields=['title'], name='task_title_idx'),
+            models.Index(fields=['project', 'state'], name='task_project_state_idx'),
+            # the last change of a project's tasks, api.analytics
+            models.Index(fields=['project', 'updated_on'], name='task_project_updated_idx'),
+            # due date scans (api.reminders)
+            models.Index(fields=['state', 'due_on'], name='task_state_due_idx'),
+            # workload reports (api.workload) read nothing but this index
+            models.Index(
+                fields=['assignee', 'state', 'due_on', 'estimated_hours', 'hours_spent'],
+                name='task_workload_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return self.title
+
     @property
     def owners(self):
         return self.task_users.filter(access=AvailableAccessTypes.OWNER).all()
@@ -203,25 +375,46 @@ class Task(models.Model):
     def participants(self):
         return self.task_users.filter(access=AvailableAccessTypes.PARTICIPANT).all()
 
+    @property
+    def related_tasks(self):
+        return Task.objects.using(self._state.db).filter(
+            models.Q(id__in=RelatedTask.objects.filter(task_a=self).values('task_b'))
+            | models.Q(id__in=RelatedTask.objects.filter(task_b=self).values('task_a'))
+        )
+
     @property
     def sub_tasks(self):
-        return self.related_tasks.filter(task_b__is_connected_as=AvailableTaskRelations.PARENT_TASK_OF).all()
+        return self.tasks_linked_as(AvailableTaskRelations.PARENT_TASK_OF)
 
     @property
     def parent_task(self):
-        return self.related_tasks.filter(task_b__is_connected_as=AvailableTaskRelations.SUB_TASK_OF).all()
+        return self.tasks_linked_as(AvailableTaskRelations.SUB_TASK_OF)
 
     @property
     def just_related_tasks(self):
-        return self.related_tasks.filter(task_b__is_connected_as=AvailableTaskRelations.JUST_RELATED).all()
+        return self.tasks_linked_as(AvailableTaskRelations.JUST_RELATED)
 
     @property
     def blocked_tasks(self):
-        return self.related_tasks.filter(task_b__is_connected_as=AvailableTaskRelations.IS_BLOCKING).all()
+        return self.tasks_linked_as(AvailableTaskRelations.IS_BLOCKING)
 
     @property
     def blocked_by_tasks(self):
-        return self.related_tasks.filter(task_b__is_connected_as=AvailableTaskRelations.BLOCKED_BY).all()
+        return self.tasks_linked_as(AvailableTaskRelations.BLOCKED_BY)
+
+    def tasks_linked_as(self, rel: str):
+        """
+        tasks this one is `rel` of, `tasks_linked_as(PARENT_TASK_OF)` are its sub tasks.
+        Edges are stored once (see `Relationships.canonical`) so half of them are read backwards
+        """
+        # `task_b` is the reverse accessor of RelatedTask.task_b, the rows pointing at a task
+        tasks = Task.objects.using(self._state.db)
+        forward = tasks.filter(task_b__task_a=self, task_b__is_connected_as=rel)
+        if rel == AvailableTaskRelations.JUST_RELATED:
+            return forward.union(tasks.filter(task_a__task_b=self, task_a__is_connected_as=rel))
+        if rel in Relationships.STORED:
+            return forward
+        return tasks.filter(task_a__task_b=self, task_a__is_connected_as=Relationships.MAP[rel])
 
     def add_owner(self, user):
         self.task_users.add_owner(self, user)
@@ -242,15 +435,15 @@ class Task(models.Model):
 
     def block(self):
         if self.state == AvailableTaskStates.BLOCKED or self.state == AvailableTaskStates.CLOSED:
-            raise InvlidOperation(
+            raise InvalidOperation(
                 "Can not block this task"
             )
-        self.state = AvailableTaskStates.OPENED
+        self.state = AvailableTaskStates.BLOCKED
         self.save()
 
     def unblock(self):
         if self.state != AvailableTaskStates.BLOCKED:
-            raise InvlidOperation(
+            raise InvalidOperation(
                 "Sorry! can't do it, task isn't blocked"
             )
         self.state = AvailableTaskStates.OPENED
@@ -271,7 +464,9 @@ class Task(models.Model):
                 "This task is not archived to begin with"
             )
 
-        self.state = AvailableTaskStates.INACTIVE
+        # back to where the project archive found it
+        self.state = self.archived_from or AvailableTaskStates.OPENED
+        self.archived_from = None
         self.save()
 
     def is_blocked(self):
@@ -367,33 +562,29 @@ class Task(models.Model):
             AvailableTaskRelations.BLOCKED_BY
         )
 
-    def add_related_task(self, other_task, rel: str, symm=True):
-        related_task, created = RelatedTask.objects.get_or_create(
-            task_a=self,
-            task_b=other_task,
-            is_connected_as=rel)
-        if symm:
-            # avoid recursion by passing `symm=False`
-            other_task.add_related_task(
-                self,
-                Relationships.MAP.get(rel),
-                False
+    def add_related_task(self, other_task, rel: str):
+        """
+        a single row covers both directions, `other_task` sees the inverse relation.
+        Both tasks have to be on the same database (see api.sharding)
+        """
+        if self._state.db != other_task._state.db:
+            raise InvalidOperation(
+                "Tasks stored on different shards can not be linked"
             )
+        task_a_id, task_b_id, rel = Relationships.canonical(self.id, other_task.id, rel)
+        related_task, created = RelatedTask.objects.db_manager(self._state.db).get_or_create(
+            task_a_id=task_a_id,
+            task_b_id=task_b_id,
+            is_connected_as=rel)
         return related_task
 
-    def remove_related_task(self, task, rel, symm=True):
-        RelatedTask.objects.filter(
-            task_a=self,
-            task_b=task,
+    def remove_related_task(self, task, rel):
+        task_a_id, task_b_id, rel = Relationships.canonical(self.id, task.id, rel)
+        RelatedTask.objects.using(self._state.db).filter(
+            task_a_id=task_a_id,
+            task_b_id=task_b_id,
             is_connected_as=rel
         ).delete()
-        if symm:
-            # avoid recursion by passing `symm=False`
-            task.remove_related_task(
-                self,
-                Relationships.MAP.get(rel),
-                False
-            )
 
 
 class RelatedTask(models.Model):
@@ -402,9 +593,8 @@ class RelatedTask(models.Model):
         on_delete=models.CASCADE,
         related_name="task_a"
     )
-    is_connected_as = models.TextField(
-        max_length=128,
-        choices=AvailableTaskRelations.choices
+    is_connected_as = SmallIntegerChoicesField(
+        enum=AvailableTaskRelations
     )
     task_b = models.ForeignKey(
         TASK_MODEL,
@@ -412,6 +602,14 @@ class RelatedTask(models.Model):
         related_name="task_b"
     )
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['task_a', 'task_b', 'is_connected_as'],
+                name='unique_task_relation'
+            )
+        ]
+
 
 class TaskUser(models.Model):
     task = models.ForeignKey(
@@ -421,11 +619,12 @@ class TaskUser(models.Model):
     )
     user = models.ForeignKey(
         User,
-        on_delete=models.CASCADE
+        on_delete=models.CASCADE,
+        db_constraint=False
     )
-    access = models.TextField(
+    access = SmallIntegerChoicesField(
         _("Access to Task"),
-        choices=AvailableAccessTypes.choices,
+        enum=AvailableAccessTypes,
         default=AvailableAccessTypes.GUEST
     )
 
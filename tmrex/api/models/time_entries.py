@@ -0,0 +1,101 @@
+from django.db import models, transaction
+from django.utils import timezone
+from django.contrib.auth.models import User
+from api.exceptions import PermissionDenied, InvalidOperation
+from api.models.projects import ProjectActions
+from api.signals import tasks_updated
+
+PROJECT_MODEL = "api.Project"
+TASK_MODEL = "api.Task"
+
+
+class TimeEntryManager(models.Manager):
+    def log(self, task: TASK_MODEL, user: User, duration: int, started_on=None):
+        """
+        books `duration` hours of `user` on `task` and adds them to `task.hours_spent` in the same
+        transaction. The task is updated with `hours_spent = hours_spent + duration`, concurrent logs
+        all count. `task.hours_spent` in memory stays as it was, saving the task doesn't write it back
+        (DirtyFieldsMixin)
+        """
+        if duration <= 0:
+            raise InvalidOperation("a time entry needs some time")
+        if not task.project.has_access(user, ProjectActions.ADD_TASK):
+            raise PermissionDenied()
+
+        started_on = started_on or timezone.now()
+        entry = self.model(
+            task=task,
+            project_id=task.project_id,
+            user=user,
+            started_on=started_on,
+            day=timezone.localdate(started_on),
+            duration=duration
+        )
+        alias = task._state.db or self.db
+        with transaction.atomic(using=alias):
+            entry.save(using=alias)
+            add_hours(type(task), alias, task.project_id, task.pk, duration)
+        return entry
+
+
+def add_hours(task_model, alias: str, project_id: int, task_id: int, hours: int):
+    """
+    `hours_spent = hours_spent + hours` in one UPDATE, no post_save: tasks_updated tells the
+    coalesced reads, the event stream and the webhooks instead
+    """
+    task_model._base_manager.using(alias).filter(pk=task_id).update(
+        hours_spent=models.F('hours_spent') + hours, updated_on=timezone.now())
+    tasks_updated.send(
+        sender=task_model,
+        project_id=project_id,
+        using=alias,
+        action='hours_changed',
+        count=1,
+        tasks=[task_id]
+    )
+
+
+class TimeEntry(models.Model):
+    """
+    Time a user spent on a task, `duration` whole hours from `started_on`. The task's `hours_spent`
+    is the sum of its entries, kept by TimeEntryManager.log() and delete().
+    `project` and `day` are copies of the task's project and of the start date, the reports group
+    and filter on them with the indexes below
+    """
+    task = models.ForeignKey(
+        TASK_MODEL,
+        on_delete=models.CASCADE,
+        related_name='time_entries',
+        db_index=False
+    )
+    project = models.ForeignKey(
+        PROJECT_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+',
+        db_index=False
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='+',
+        db_constraint=False
+    )
+    started_on = models.DateTimeField()
+    day = models.DateField()
+    # hours, as hours_spent counts them
+    duration = models.PositiveIntegerField()
+    objects = TimeEntryManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['project', 'day'], name='time_entry_project_idx'),
+            models.Index(fields=['task', 'day'], name='time_entry_task_idx'),
+            models.Index(fields=['user', 'day'], name='time_entry_user_idx'),
+        ]
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(using=self._state.db):
+            task_model = self._meta.get_field('task').related_model
+            add_hours(task_model, self._state.db, self.project_id, self.task_id, -self.duration)
+            return super().delete(*args, **kwargs)
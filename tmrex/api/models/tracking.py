@@ -0,0 +1,95 @@
+from django.db.models.fields.files import FieldFile
+
+
+class DirtyFieldsMixin:
+    """
+    Remembers the column values an instance was loaded (or last saved) with, so `save()` only
+    writes the columns that actually changed and does not write at all when nothing did.
+    Inserts, explicit `update_fields` and saves to another database behave as usual.
+
+    Note that a save that is skipped does not send pre_save/post_save either. `auto_now` fields
+    go along with the changed ones.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.take_snapshot()
+        return instance
+
+    def take_snapshot(self):
+        self._loaded_values = self.current_values()
+
+    def current_values(self):
+        values = {}
+        for field in self._meta.concrete_fields:
+            # deferred fields are simply not in __dict__ yet
+            if field.attname in self.__dict__:
+                value = self.__dict__[field.attname]
+                if isinstance(value, FieldFile):
+                    value = value.name
+                values[field.attname] = value
+        return values
+
+    def get_dirty_fields(self):
+        """
+        names of the fields that changed since the last load/save
+        """
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None:
+            return None
+
+        current = self.current_values()
+        return [
+            field.name
+            for field in self._meta.concrete_fields
+            if not field.primary_key
+            and field.attname in current
+            and (field.attname not in loaded or loaded[field.attname] != current[field.attname])
+        ]
+
+    def is_dirty(self):
+        dirty_fields = self.get_dirty_fields()
+        return dirty_fields is None or bool(dirty_fields)
+
+    def save(self, *args, **kwargs):
+        using = kwargs.get('using')
+        partial = (
+            not self._state.adding
+            and kwargs.get('update_fields') is None
+            and not kwargs.get('force_insert')
+            and not args
+            and (using is None or using == self._state.db)
+            and getattr(self, '_loaded_values', None) is not None
+            and self._loaded_values.get(self._meta.pk.attname) == self.pk
+        )
+        if partial:
+            dirty_fields = self.get_dirty_fields()
+            if not dirty_fields:
+                return
+            kwargs['update_fields'] = dirty_fields + [
+                field.name
+                for field in self._meta.concrete_fields
+                if getattr(field, 'auto_now', False) and field.name not in dirty_fields
+            ]
+
+        super().save(*args, **kwargs)
+        self.mark_clean(kwargs.get('update_fields'))
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using, fields)
+        self.mark_clean(fields)
+
+    def mark_clean(self, fields=None):
+        """
+        `fields` (all of them when None) now match what is in the database
+        """
+        if fields is None or getattr(self, '_loaded_values', None) is None:
+            self.take_snapshot()
+            return
+
+        current = self.current_values()
+        for name in fields:
+            attname = self._meta.get_field(name).attname
+            if attname in current:
+                self._loaded_values[attname] = current[attname]
@@ -0,0 +1,54 @@
+import secrets
+from django.core.validators import URLValidator
+from django.db import models
+from django.utils import timezone
+from django.contrib.auth.models import User
+
+PROJECT_MODEL = "api.Project"
+WEBHOOK_MODEL = "api.Webhook"
+
+
+def new_secret():
+    return secrets.token_hex(32)
+
+
+class Webhook(models.Model):
+    """
+    A url called back with the task changes of a project, see `api.webhooks`. Requests are signed
+    with `secret`, HMAC-SHA256 of the body in the X-Tmrex-Signature header
+    """
+    project = models.ForeignKey(
+        PROJECT_MODEL,
+        on_delete=models.CASCADE,
+        related_name='webhooks'
+    )
+    url = models.URLField(max_length=1024, validators=[URLValidator(schemes=['http', 'https'])])
+    secret = models.CharField(max_length=64, default=new_secret)
+    active = models.BooleanField(default=True)
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='+',
+        db_constraint=False
+    )
+    created_on = models.DateTimeField(default=timezone.now)
+
+
+class OutboxMessage(models.Model):
+    """
+    An event waiting to be delivered to a webhook, written in the transaction of the change.
+    Delivered messages are deleted, the ones that failed WEBHOOK_MAX_ATTEMPTS times are kept
+    with no `next_attempt_on`
+    """
+    webhook = models.ForeignKey(
+        WEBHOOK_MODEL,
+        on_delete=models.CASCADE,
+        related_name='outbox'
+    )
+    # one event, json
+    payload = models.TextField()
+    created_on = models.DateTimeField(default=timezone.now)
+    attempts = models.SmallIntegerField(default=0)
+    next_attempt_on = models.DateTimeField(null=True, db_index=True, default=timezone.now)
+    last_error = models.CharField(max_length=255, blank=True, default='')
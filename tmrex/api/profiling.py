@@ -0,0 +1,169 @@
+import io
+import marshal
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from django.conf import settings
+
+OVERFLOW_STACK = '[other]'
+
+
+def collapse(frame):
+    """
+    turn a frame into a `outer;...;inner` line, the folded format flamegraph.pl and speedscope read
+    """
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append('%s (%s:%d)' % (code.co_name, os.path.basename(code.co_filename), code.co_firstlineno))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class ProfileStore:
+    """
+    Aggregates profiles of every sampled request. Size is bounded: past `max_stacks` distinct
+    stacks, new ones are counted under a single `[other]` entry, and the pstats only grow with
+    the number of distinct functions.
+    """
+
+    def __init__(self, max_stacks):
+        self.max_stacks = max_stacks
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.requests = 0
+            self.stacks = Counter()
+            self.stats = None
+
+    def add(self, profile, stacks: Counter):
+        # pstats alone takes longer to import than the rest of this module, only load it when profiling
+        import pstats
+
+        profile.create_stats()
+        with self.lock:
+            self.requests += 1
+            for stack, samples in stacks.items():
+                if stack not in self.stacks and len(self.stacks) >= self.max_stacks:
+                    stack = OVERFLOW_STACK
+                self.stacks[stack] += samples
+
+            if not profile.stats:
+                # nothing ran while the profiler was on
+                return
+            if self.stats is None:
+                self.stats = pstats.Stats(profile, stream=io.StringIO())
+            else:
+                self.stats.add(profile)
+
+    def collapsed(self):
+        with self.lock:
+            return ''.join('%s %d\n' % (stack, samples) for stack, samples in self.stacks.most_common())
+
+    def pstats_dump(self):
+        """
+        same bytes `Stats.dump_stats` writes, `pstats.Stats(path)` or snakeviz can open it
+        """
+        with self.lock:
+            if self.stats is None:
+                return marshal.dumps({})
+            return marshal.dumps(self.stats.stats)
+
+
+class StackSampler(threading.Thread):
+    """
+    One daemon thread per process, every `interval` seconds it grabs the current stack of the
+    threads that are serving a profiled request. `lock` covers `targets` and their counts, what
+    unwatch() returns is a copy the sampler no longer touches
+    """
+
+    def __init__(self, interval):
+        super().__init__(name='api-stack-sampler', daemon=True)
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.targets = {}
+
+    def watch(self, thread_id):
+        with self.lock:
+            self.targets[thread_id] = Counter()
+
+    def unwatch(self, thread_id):
+        with self.lock:
+            return Counter(self.targets.pop(thread_id, ()))
+
+    def sample(self):
+        frames = sys._current_frames()
+        with self.lock:
+            for thread_id, stacks in self.targets.items():
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    stacks[collapse(frame)] += 1
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            if self.targets:
+                self.sample()
+
+
+class Profiler:
+    def __init__(self):
+        self.store = None
+        self.sampler = None
+        # cProfile can't run twice at once in the same process, one profiled request at a time
+        self.busy = threading.Lock()
+        self.setup_lock = threading.Lock()
+
+    def setup(self):
+        with self.setup_lock:
+            if self.store is None:
+                self.store = ProfileStore(settings.PROFILE_MAX_STACKS)
+                self.sampler = StackSampler(settings.PROFILE_INTERVAL)
+                self.sampler.start()
+
+    def wants(self, request):
+        secret = settings.PROFILE_SECRET
+        if secret and request.META.get('HTTP_X_PROFILE') == secret:
+            return True
+        rate = settings.PROFILE_SAMPLE_RATE
+        return rate > 0 and random.random() < rate
+
+    def run(self, func, *args, **kwargs):
+        if not self.busy.acquire(blocking=False):
+            return func(*args, **kwargs)
+
+        try:
+            if self.store is None:
+                self.setup()
+            thread_id = threading.get_ident()
+            self.sampler.watch(thread_id)
+            import cProfile
+            profile = cProfile.Profile()
+            profile.enable()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profile.disable()
+                self.store.add(profile, self.sampler.unwatch(thread_id))
+        finally:
+            self.busy.release()
+
+
+profiler = Profiler()
+
+
+class ProfiledViewMixin(object):
+    """
+    Profiles PROFILE_SAMPLE_RATE of the requests to a view, or the ones sent with
+    `X-Profile: <PROFILE_SECRET>`. Results end up in `profiler.store`
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        if profiler.wants(request):
+            return profiler.run(super().dispatch, request, *args, **kwargs)
+        return super().dispatch(request, *args, **kwargs)
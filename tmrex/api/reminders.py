@@ -0,0 +1,100 @@
+import threading
+from datetime import timedelta
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+from api.models.notifications import Notification, NotificationKinds
+from api.models.projects import AvailableAccessTypes
+from api.models.tasks import Task, TaskUser, OPEN_STATES
+from api.sharding import shards
+
+
+def due_batches(alias, state, kind, since, until, size):
+    """
+    (id, due_on, assignee id) of the `state` tasks of `alias` due in [since, until) (no lower bound
+    when `since` is None) and without a `kind` notification for that due date yet, `size` at a
+    time. Keyset pages on the (state, due_on) index, ordered by (due_on, id): each one starts where
+    the last one ended, nothing is held but the current page. The tasks announced before cost an
+    index probe on notification_once each, no recipients query and no INSERT
+    """
+    notified = Notification.objects.using(alias).filter(task=OuterRef('pk'), kind=kind, due_on=OuterRef('due_on'))
+    tasks = Task.objects.using(alias).filter(~Exists(notified), state=state, due_on__lt=until)
+    if since is not None:
+        tasks = tasks.filter(due_on__gte=since)
+    tasks = tasks.order_by('due_on', 'id').values_list('id', 'due_on', 'assignee_id')
+
+    last = None
+    while True:
+        page = tasks
+        if last is not None:
+            page = page.filter(Q(due_on__gt=last[1]) | Q(due_on=last[1], id__gt=last[0]))
+        rows = list(page[:size])
+        if rows:
+            yield rows
+        if len(rows) < size:
+            return
+        last = rows[-1]
+
+
+def notify(alias, rows, kind):
+    """
+    a `kind` notification for the owners and the assignee of every task of `rows`, one query for
+    the owners and one INSERT. Returns how many were written. due_batches() only gives tasks
+    nobody was notified of, a scanner running alongside may have written some of them first:
+    the database skips those and they are counted by both
+    """
+    recipients = {task_id: {assignee_id} if assignee_id else set() for task_id, due_on, assignee_id in rows}
+    owners = TaskUser.objects.using(alias).filter(
+        task_id__in=list(recipients),
+        access=AvailableAccessTypes.OWNER
+    ).values_list('task_id', 'user_id')
+    for task_id, user_id in owners:
+        recipients[task_id].add(user_id)
+
+    notifications = [
+        Notification(task_id=task_id, user_id=user_id, kind=kind, due_on=due_on)
+        for task_id, due_on, assignee_id in rows
+        for user_id in recipients[task_id]
+    ]
+    Notification.objects.using(alias).bulk_create(notifications, ignore_conflicts=True)
+    return len(notifications)
+
+
+class DueScanner:
+    """
+    Notifies the owners and assignees of open tasks once they are due within DUE_SOON_HOURS and
+    again once they are overdue. Every scan looks at all of them, whenever they were created or
+    re-dated, and skips those already announced for their due date. The notification_once
+    constraint keeps a scan running along another one from adding anything twice
+    """
+
+    def __init__(self):
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.scan_once()
+            self.stopped.wait(settings.DUE_SCAN_INTERVAL)
+
+    def stop(self):
+        self.stopped.set()
+
+    def scan_once(self):
+        """
+        scans every database, returns how many notifications were written
+        """
+        now = timezone.now()
+        return sum(self.scan(alias, now) for alias in shards() or (DEFAULT_DB_ALIAS,))
+
+    def scan(self, alias, now):
+        windows = (
+            (NotificationKinds.OVERDUE, None, now),
+            (NotificationKinds.DUE_SOON, now, now + timedelta(hours=settings.DUE_SOON_HOURS)),
+        )
+        notified = 0
+        for kind, since, until in windows:
+            for state in OPEN_STATES:
+                for rows in due_batches(alias, state, kind, since, until, settings.DUE_SCAN_BATCH_SIZE):
+                    notified += notify(alias, rows, kind)
+        return notified
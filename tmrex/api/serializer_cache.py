@@ -0,0 +1,65 @@
+from collections import OrderedDict
+
+# every serializer class using CachedFieldsMixin, in definition order
+cached_serializers = []
+
+
+def clone(field):
+    """
+    a fresh, unbound copy of a prototype field. bind() only sets attributes on the field itself so
+    a shallow copy will do, except for what a field holds and binds itself: the child of nested
+    `many=True` serializers, many related fields and list fields get their own copy, bound to the copy
+    """
+    # copy.copy() without the __reduce_ex__ round trip, Field.__new__ has nothing left to do
+    prototype = field
+    field = object.__new__(type(prototype))
+    field.__dict__.update(prototype.__dict__)
+    for attribute in ('child', 'child_relation'):
+        child = field.__dict__.get(attribute)
+        if child is not None:
+            child = clone(child)
+            # undo the bind() to the prototype, it would refuse to bind twice
+            child.source = child._kwargs.get('source')
+            child.label = child._kwargs.get('label')
+            child.bind(field_name='', parent=field)
+            setattr(field, attribute, child)
+    return field
+
+
+class CachedFieldsMixin(object):
+    """
+    `ModelSerializer.get_fields()` introspects the model and builds every field again for each
+    serializer instance, nested ones included. With this mixin it runs once per class, each
+    instance gets its own copies of the ready made fields to bind.
+
+    get_fields() must not depend on the instance (context, request...), fields can still be
+    added/removed per instance through `self.fields` in `__init__`.
+    """
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._field_prototypes = None
+        cached_serializers.append(cls)
+
+    @classmethod
+    def prepare_fields(cls):
+        prototypes = cls._field_prototypes
+        if prototypes is None:
+            # two threads may both build it, same result either way
+            prototypes = cls._field_prototypes = super(CachedFieldsMixin, cls()).get_fields()
+        return prototypes
+
+    def get_fields(self):
+        return OrderedDict(
+            (field_name, clone(field))
+            for field_name, field in self.prepare_fields().items()
+        )
+
+
+def precompile_serializers():
+    """
+    builds the fields of every cached serializer up front, called once the app registry is ready
+    so the first requests of a worker don't pay for it
+    """
+    for serializer_class in cached_serializers:
+        serializer_class.prepare_fields()
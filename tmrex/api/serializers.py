@@ -1,10 +1,14 @@
 from rest_framework import serializers
+from django.conf import settings
 from django.contrib.auth.models import User
 from api.models.projects import Project, ProjectUser
-from api.models.tasks import Task, TaskUser, RelatedTask
+from api.models.tasks import Task, TaskUser, RelatedTask, AvailableTaskStates
+from api.uploads import AvatarField
+from api.serializer_cache import CachedFieldsMixin
+from api.sharding import ShardedPrimaryKeyRelatedField
 
 
-class UserReadSerializer(serializers.ModelSerializer):
+class UserReadSerializer(CachedFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = [
@@ -20,13 +24,13 @@ class UserReadSerializer(serializers.ModelSerializer):
         ]
 
 
-class UserMinReadSerializer(serializers.ModelSerializer):
+class UserMinReadSerializer(CachedFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'first_name', 'last_name', 'username', 'email']
 
 
-class UserWriteSerializer(serializers.ModelSerializer):
+class UserWriteSerializer(CachedFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = [
@@ -37,7 +41,7 @@ class UserWriteSerializer(serializers.ModelSerializer):
         ]
 
 
-class ProjectUserSerializer(serializers.ModelSerializer):
+class ProjectUserSerializer(CachedFieldsMixin, serializers.ModelSerializer):
     user = UserMinReadSerializer(read_only=True)
 
     class Meta:
@@ -45,7 +49,7 @@ class ProjectUserSerializer(serializers.ModelSerializer):
         fields = ['user', 'access']
 
 
-class ProjectReadSerializer(serializers.ModelSerializer):
+class ProjectReadSerializer(CachedFieldsMixin, serializers.ModelSerializer):
     project_users = ProjectUserSerializer(many=True, read_only=True)
     created_by = UserMinReadSerializer(read_only=True)
 
@@ -64,7 +68,10 @@ class ProjectReadSerializer(serializers.ModelSerializer):
         ]
 
 
-class ProjectWriteSerializer(serializers.ModelSerializer):
+class ProjectWriteSerializer(CachedFieldsMixin, serializers.ModelSerializer):
+    serializer_related_field = ShardedPrimaryKeyRelatedField
+    avatar = AvatarField(max_length=1024)
+
     class Meta:
         model = Project
         user = serializers.HiddenField(
@@ -78,7 +85,7 @@ class ProjectWriteSerializer(serializers.ModelSerializer):
         ]
 
 
-class TaskUserSerializer(serializers.ModelSerializer):
+class TaskUserSerializer(CachedFieldsMixin, serializers.ModelSerializer):
     user = UserMinReadSerializer(read_only=True)
 
     class Meta:
@@ -86,19 +93,29 @@ class TaskUserSerializer(serializers.ModelSerializer):
         fields = ['user', 'access']
 
 
-class RelatedTaskSerializer(serializers.ModelSerializer):
+class RelatedTaskSerializer(CachedFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = RelatedTask
         fields = ['task_b', 'is_connected_as']
 
 
-class TaskReadSerializer(serializers.ModelSerializer):
+class TaskTransitionSerializer(CachedFieldsMixin, serializers.Serializer):
+    tasks = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        min_length=1,
+        max_length=settings.TASK_TRANSITION_MAX_TASKS
+    )
+    state = serializers.ChoiceField(choices=AvailableTaskStates.choices)
+
+
+class TaskReadSerializer(CachedFieldsMixin, serializers.ModelSerializer):
     task_users = TaskUserSerializer(many=True, read_only=True)
-    sub_tasks = RelatedTaskSerializer(many=True, read_only=True)
-    parent_task = RelatedTaskSerializer(many=True, read_only=True)
-    just_related_tasks = RelatedTaskSerializer(many=True, read_only=True)
-    blocked_tasks = RelatedTaskSerializer(many=True, read_only=True)
-    blocked_by_tasks = RelatedTaskSerializer(many=True, read_only=True)
+    # the relation properties return the related Task objects, not RelatedTask rows
+    sub_tasks = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+    parent_task = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+    just_related_tasks = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+    blocked_tasks = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+    blocked_by_tasks = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
     assignee = UserMinReadSerializer(read_only=True)
     author = UserMinReadSerializer(read_only=True)
 
@@ -112,6 +129,7 @@ class TaskReadSerializer(serializers.ModelSerializer):
             'author',
             'assignee',
             'estimated_hours',
+            'hours_spent',
             'avatar',
             'task_users',
             'sub_tasks',
@@ -122,7 +140,10 @@ class TaskReadSerializer(serializers.ModelSerializer):
         ]
 
 
-class TaskWriteSerializer(serializers.ModelSerializer):
+class TaskWriteSerializer(CachedFieldsMixin, serializers.ModelSerializer):
+    serializer_related_field = ShardedPrimaryKeyRelatedField
+    avatar = AvatarField(max_length=1024)
+
     class Meta:
         model = Task
         fields = [
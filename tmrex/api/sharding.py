@@ -0,0 +1,351 @@
+import heapq
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from time import monotonic
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.exceptions import MultipleObjectsReturned
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, transaction
+from django.db.models import F, Max
+from django.db.models.signals import post_delete, pre_save
+from django.dispatch import receiver
+from rest_framework import serializers
+from api.models.sharding import ProjectShard, ShardSequence
+
+# what lives on the shards, a project and everything under it. Every other model stays on `default`
+SHARDED_MODELS = (
+    'project', 'task', 'projectuser', 'taskuser', 'relatedtask', 'activity', 'webhook', 'outboxmessage',
+    'timeentry', 'notification'
+)
+# the sharded models looked up by id, their ids are unique over every shard (see ShardSequence)
+ALLOCATED_MODELS = ('project', 'task', 'webhook')
+# where the parent of a new row is, the row goes to the same shard
+PARENTS = {
+    'task': 'project',
+    'projectuser': 'project',
+    'taskuser': 'task',
+    'relatedtask': 'task_a',
+    'activity': 'project',
+    'webhook': 'project',
+    'outboxmessage': 'webhook',
+    'timeentry': 'task',
+    'notification': 'task',
+}
+
+
+def shards():
+    return tuple(settings.PROJECT_SHARDS)
+
+
+def is_sharded(model):
+    return model._meta.app_label == 'api' and model._meta.model_name in SHARDED_MODELS
+
+
+class Directory:
+    """
+    project id -> shard. A project lives on `shards[id % len(shards)]` unless it was moved
+    (ProjectShard), moves are read again at most every SHARD_DIRECTORY_TTL seconds
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.moved = {}
+        self.expires = 0
+
+    def shard_for(self, project_id: int):
+        if monotonic() >= self.expires:
+            self.reload()
+        aliases = shards()
+        return self.moved.get(project_id) or aliases[project_id % len(aliases)]
+
+    def reload(self):
+        moved = dict(ProjectShard.objects.using(DEFAULT_DB_ALIAS).values_list('project_id', 'shard'))
+        with self.lock:
+            self.moved = moved
+            self.expires = monotonic() + settings.SHARD_DIRECTORY_TTL
+
+    def forget(self):
+        self.expires = 0
+
+
+class IdAllocator:
+    """
+    ids for ALLOCATED_MODELS, reserved SHARD_ID_BLOCK at a time per process, a single write to
+    `default` per block
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # model label -> [next id, last id of the block]
+        self.blocks = {}
+
+    def next_id(self, model):
+        name = model._meta.label_lower
+        with self.lock:
+            block = self.blocks.get(name)
+            if block is None or block[0] > block[1]:
+                block = self.blocks[name] = self.reserve(model, name)
+            block[0] += 1
+            return block[0] - 1
+
+    def reserve(self, model, name):
+        size = settings.SHARD_ID_BLOCK
+        sequences = ShardSequence.objects.using(DEFAULT_DB_ALIAS)
+        with transaction.atomic(using=DEFAULT_DB_ALIAS):
+            if not sequences.filter(name=name).exists():
+                # rows created before sharding was turned on keep their ids
+                highest = max(
+                    model._base_manager.using(alias).aggregate(highest=Max('pk'))['highest'] or 0
+                    for alias in set(shards() + (DEFAULT_DB_ALIAS,))
+                )
+                sequences.get_or_create(name=name, defaults={'last_id': highest})
+            sequences.filter(name=name).update(last_id=F('last_id') + size)
+            last_id = sequences.get(name=name).last_id
+        return [last_id - size + 1, last_id]
+
+
+directory = Directory()
+allocator = IdAllocator()
+
+
+def allocate(instance):
+    if instance.pk is None and instance._meta.model_name in ALLOCATED_MODELS:
+        instance.pk = allocator.next_id(type(instance))
+
+
+def shard_of(instance):
+    """
+    the shard a new row of a sharded model goes to
+    """
+    name = instance._meta.model_name
+    allocate(instance)
+    if name == 'project':
+        return directory.shard_for(instance.pk)
+
+    field = instance._meta.get_field(PARENTS[name])
+    if field.is_cached(instance):
+        parent = getattr(instance, field.name)
+        if not parent._state.adding:
+            return parent._state.db
+    parent_id = getattr(instance, field.attname)
+    if field.related_model._meta.model_name == 'project':
+        return directory.shard_for(parent_id)
+    return locate(field.related_model, parent_id)
+
+
+def locate(model, pk):
+    """
+    the shard holding the row `pk` of a sharded model, asks every shard but projects
+    """
+    if model._meta.model_name == 'project':
+        return directory.shard_for(pk)
+    found = fan_out(lambda alias: model._base_manager.using(alias).filter(pk=pk).exists())
+    for alias, exists in found.items():
+        if exists:
+            return alias
+    raise model.DoesNotExist('%s %s is on no shard' % (model._meta.object_name, pk))
+
+
+executor = None
+executor_lock = threading.Lock()
+
+
+def get_executor():
+    global executor
+    if executor is None:
+        with executor_lock:
+            if executor is None:
+                executor = ThreadPoolExecutor(settings.SHARD_FAN_OUT_THREADS, thread_name_prefix='shard')
+    return executor
+
+
+def shutdown_executor():
+    """
+    stops the fan out threads, their connections go with them
+    """
+    global executor
+    with executor_lock:
+        if executor is not None:
+            executor.shutdown()
+            executor = None
+
+
+def in_worker(function, alias):
+    # same as at the start of a request, drops connections past CONN_MAX_AGE or broken
+    close_old_connections()
+    return function(alias)
+
+
+def fan_out(function, aliases=None):
+    """
+    function(alias) on every shard at once, returns {alias: result}. Runs in the calling thread
+    when there is a single shard
+    """
+    aliases = shards() if aliases is None else tuple(aliases)
+    if len(aliases) <= 1:
+        return {alias: function(alias) for alias in aliases}
+    pool = get_executor()
+    futures = [(alias, pool.submit(in_worker, function, alias)) for alias in aliases]
+    return {alias: future.result() for alias, future in futures}
+
+
+class ShardedQuerySet:
+    """
+    A queryset of a sharded model run on every shard, in pk order. Implements what the generic
+    views, paginators and related fields use: count(), slicing, iteration, filter() and get().
+    Slicing fetches `stop` rows from each shard and merges them, deep pages cost more
+    """
+    ordered = True
+
+    def __init__(self, queryset):
+        self.model = queryset.model
+        self.queryset = queryset.order_by('pk')
+
+    def filter(self, *args, **kwargs):
+        return ShardedQuerySet(self.queryset.filter(*args, **kwargs))
+
+    def all(self):
+        return self
+
+    def count(self):
+        return sum(fan_out(lambda alias: self.queryset.using(alias).count()).values())
+
+    def __len__(self):
+        return self.count()
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            rows = self[index:index + 1]
+            if not rows:
+                raise IndexError(index)
+            return rows[0]
+        if index.step is not None or (index.start or 0) < 0 or (index.stop is not None and index.stop < 0):
+            raise ValueError('only positive slices without step')
+
+        def rows(alias):
+            queryset = self.queryset.using(alias)
+            return list(queryset if index.stop is None else queryset[:index.stop])
+        merged = heapq.merge(*fan_out(rows).values(), key=lambda instance: instance.pk)
+        return list(islice(merged, index.start or 0, index.stop))
+
+    def get(self, **kwargs):
+        aliases = None
+        if self.model._meta.model_name == 'project' and set(kwargs) in ({'pk'}, {'id'}):
+            try:
+                aliases = [directory.shard_for(int(next(iter(kwargs.values()))))]
+            except (TypeError, ValueError):
+                raise self.model.DoesNotExist('%s matching query does not exist.' % self.model._meta.object_name)
+
+        found = fan_out(lambda alias: list(self.queryset.using(alias).filter(**kwargs)[:2]), aliases)
+        instances = [instance for rows in found.values() for instance in rows]
+        if not instances:
+            raise self.model.DoesNotExist('%s matching query does not exist.' % self.model._meta.object_name)
+        if len(instances) > 1:
+            raise MultipleObjectsReturned('get() returned more than one %s' % self.model._meta.object_name)
+        return instances[0]
+
+
+class ProjectShardRouter:
+    """
+    Keeps a project, its tasks, project/task users and task relations on one of PROJECT_SHARDS
+    (see Directory), every other model on `default`. Rows loaded from a shard read and write their
+    relations on that shard, new rows go to the shard of their project.
+    Queries of a sharded model without an instance to go by (`Task.objects.filter(...)`) are not
+    routed, they need `.using(alias)`, a ShardedQuerySet or fan_out(). Nothing changes while
+    PROJECT_SHARDS is empty.
+    """
+
+    def route(self, model, instance):
+        if not settings.PROJECT_SHARDS:
+            return None
+        if not is_sharded(model):
+            return DEFAULT_DB_ALIAS
+        if instance is None or not is_sharded(type(instance)):
+            return None
+        if instance._state.adding:
+            # _state.db of a new row is whatever its first related object had
+            return shard_of(instance) if isinstance(instance, model) else None
+        return instance._state.db
+
+    def db_for_read(self, model, **hints):
+        return self.route(model, hints.get('instance'))
+
+    def db_for_write(self, model, **hints):
+        return self.route(model, hints.get('instance'))
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if not settings.PROJECT_SHARDS:
+            return None
+        if is_sharded(type(obj1)) and is_sharded(type(obj2)):
+            if obj1._state.adding or obj2._state.adding:
+                return True
+            return obj1._state.db == obj2._state.db
+        # users are on `default`, the foreign keys to them have no constraint
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == DEFAULT_DB_ALIAS or db not in settings.PROJECT_SHARDS:
+            return None
+        return app_label == 'api' and model_name in SHARDED_MODELS
+
+
+class ShardedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    looks related projects and tasks up on their shard
+    """
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if settings.PROJECT_SHARDS and is_sharded(queryset.model):
+            return ShardedQuerySet(queryset)
+        return queryset
+
+
+class ShardedViewMixin(object):
+    """
+    lists and looks objects of a sharded model up on every shard
+    """
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if settings.PROJECT_SHARDS and is_sharded(queryset.model):
+            return ShardedQuerySet(queryset)
+        return queryset
+
+
+@receiver(pre_save, dispatch_uid='sharding.allocate')
+def allocate_id(sender, instance, raw=False, **kwargs):
+    # QuerySet.create() and saves with `using` don't ask the router
+    if settings.PROJECT_SHARDS and not raw and is_sharded(sender):
+        allocate(instance)
+
+
+@receiver(post_delete, sender=User, dispatch_uid='sharding.forget_user')
+def forget_user(sender, instance, **kwargs):
+    """
+    what the cascade of a deleted user does on `default`, on the shards
+    """
+    if not settings.PROJECT_SHARDS:
+        return
+    from api.models.activity import Activity
+    from api.models.notifications import Notification
+    from api.models.projects import Project, ProjectUser
+    from api.models.tasks import Task, TaskUser
+    from api.models.time_entries import TimeEntry
+    from api.models.webhooks import Webhook
+
+    def forget(alias):
+        with transaction.atomic(using=alias):
+            ProjectUser._base_manager.using(alias).filter(user_id=instance.pk).delete()
+            TaskUser._base_manager.using(alias).filter(user_id=instance.pk).delete()
+            Notification._base_manager.using(alias).filter(user_id=instance.pk).delete()
+            for model, fields in ((Project, ('created_by', 'updated_by')), (Task, ('author', 'assignee')),
+                                  (Activity, ('user',)), (Webhook, ('created_by',)), (TimeEntry, ('user',))):
+                for field in fields:
+                    model._base_manager.using(alias).filter(**{field: instance.pk}).update(**{field: None})
+
+    fan_out(forget, [alias for alias in shards() if alias != DEFAULT_DB_ALIAS])
@@ -0,0 +1,7 @@
+from django.dispatch import Signal
+
+# tasks of the project `project_id` (on the database `using`) changed in bulk, no post_save for
+# them. `action` is 'archived', 'unarchived' (with the project) or 'state_changed' (to `state`),
+# `count` how many tasks changed and `tasks` their ids when known. Sent inside the transaction
+# of the update
+tasks_updated = Signal()
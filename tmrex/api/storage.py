@@ -0,0 +1,14 @@
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Files coming from the AvatarUploadHandler are named after the sha256 of their content,
+    so a file with the same name is the very same file and there is nothing left to write.
+    Everything else is stored the usual way.
+    """
+
+    def save(self, name, content, max_length=None):
+        if getattr(content, 'content_hash', None) is not None and self.exists(name):
+            return name.replace('\\', '/')
+        return super().save(name, content, max_length)
@@ -0,0 +1,173 @@
+import hashlib
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+from django.conf import settings
+from rest_framework.throttling import BaseThrottle
+from api.metrics import registry
+
+try:
+    import fcntl
+except ImportError:
+    # no cross process locking, every worker still throttles on its own
+    fcntl = None
+
+# key hash, tokens left, last refill (unix time)
+SLOT = struct.Struct('=Qdd')
+WAYS = 4
+RATE = re.compile(r'^(\d+(?:\.\d+)?)/(s|sec|m|min|h|hour|d|day)$')
+PERIODS = {'s': 1, 'sec': 1, 'm': 60, 'min': 60, 'h': 3600, 'hour': 3600, 'd': 86400, 'day': 86400}
+
+
+def parse_rate(rate: str):
+    """
+    '10/s', '5/min', '0.5/s'... into tokens per second
+    """
+    match = RATE.match(rate.replace(' ', ''))
+    if match is None:
+        raise ValueError("invalid rate %r" % rate)
+    return float(match.group(1)) / PERIODS[match.group(2)]
+
+
+def key_hash(scope: str, key: str):
+    digest = hashlib.blake2b(('%s|%s' % (scope, key)).encode('utf-8'), digest_size=8).digest()
+    # 0 marks an empty slot
+    return int.from_bytes(digest, 'little') or 1
+
+
+class BucketTable:
+    """
+    Token buckets in a fixed size table, `slots` entries of 24 bytes, memory mapped from `path`
+    so every worker on the host shares the same buckets. Keys go to one set of WAYS slots by hash,
+    a new key takes the slot that was refilled the longest time ago, so memory stays the same no
+    matter how many clients show up. An evicted client just starts again with a full bucket.
+    Sets are locked with fcntl record locks between processes, with a lock per stripe inside one.
+    """
+
+    def __init__(self, path, slots):
+        self.path = path
+        self.sets = max(slots // WAYS, 1)
+        self.size = self.sets * WAYS * SLOT.size
+        self.locks = [threading.Lock() for _ in range(64)]
+        self.pid = None
+        self.map = None
+        self.fd = None
+        self.open_lock = threading.Lock()
+
+    def open(self):
+        with self.open_lock:
+            # mappings and fcntl locks don't survive a fork, each worker maps the file itself
+            if self.pid == os.getpid():
+                return
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            if os.fstat(fd).st_size < self.size:
+                os.ftruncate(fd, self.size)
+            self.map = mmap.mmap(fd, self.size)
+            self.fd = fd
+            self.pid = os.getpid()
+
+    def take(self, scope: str, key: str, capacity: float, rate: float, now=None):
+        """
+        takes one token from the bucket of `key`, returns how long to wait when there is none left
+        (0 when the request can go)
+        """
+        if self.pid != os.getpid():
+            self.open()
+        now = time.time() if now is None else now
+        hashed = key_hash(scope, key)
+        index = hashed % self.sets
+        start = index * WAYS * SLOT.size
+
+        with self.locks[index % len(self.locks)]:
+            if fcntl is not None:
+                fcntl.lockf(self.fd, fcntl.LOCK_EX, WAYS * SLOT.size, start)
+            try:
+                return self.take_locked(start, hashed, capacity, rate, now)
+            finally:
+                if fcntl is not None:
+                    fcntl.lockf(self.fd, fcntl.LOCK_UN, WAYS * SLOT.size, start)
+
+    def take_locked(self, start, hashed, capacity, rate, now):
+        slot = None
+        oldest = None
+        for way in range(WAYS):
+            offset = start + way * SLOT.size
+            stored, tokens, updated = SLOT.unpack_from(self.map, offset)
+            if stored == hashed:
+                slot = offset
+                tokens = min(capacity, tokens + max(now - updated, 0) * rate)
+                break
+            if oldest is None or updated < oldest[1]:
+                oldest = (offset, updated)
+        if slot is None:
+            slot = oldest[0]
+            tokens = capacity
+
+        if tokens >= 1:
+            SLOT.pack_into(self.map, slot, hashed, tokens - 1, now)
+            return 0
+        SLOT.pack_into(self.map, slot, hashed, tokens, now)
+        return (1 - tokens) / rate
+
+
+# (file, slots) -> table, a change of THROTTLE_SLOTS gets a new file
+tables = {}
+tables_lock = threading.Lock()
+
+
+def get_table():
+    key = (settings.THROTTLE_FILE, settings.THROTTLE_SLOTS)
+    table = tables.get(key)
+    if table is None:
+        with tables_lock:
+            table = tables.get(key)
+            if table is None:
+                table = tables[key] = BucketTable('%s-%d.bin' % key, settings.THROTTLE_SLOTS)
+    return table
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Throttles the view actions listed in THROTTLE_BUCKETS, `'TaskViewSet.list': (burst, '10/s')`.
+    Clients are told apart by user when authenticated, else by IP: a header that didn't
+    authenticate anyone costs nothing to change, it doesn't get a bucket of its own.
+    DRF turns a refusal into a 429 with Retry-After.
+    """
+
+    def __init__(self):
+        self.delay = None
+
+    def get_scope(self, request, view):
+        scope = getattr(view, 'throttle_scope', None)
+        if scope:
+            return scope
+        action = getattr(view, 'action', None) or request.method.lower()
+        return '%s.%s' % (type(view).__name__, action)
+
+    def get_key(self, request):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return 'user:%s' % user.pk
+        return 'ip:%s' % self.get_ident(request)
+
+    def allow_request(self, request, view):
+        if not settings.THROTTLE_ENABLED:
+            return True
+        scope = self.get_scope(request, view)
+        bucket = settings.THROTTLE_BUCKETS.get(scope)
+        if bucket is None:
+            return True
+
+        capacity, rate = bucket
+        self.delay = get_table().take(scope, self.get_key(request), capacity, parse_rate(rate))
+        if self.delay:
+            registry.inc('tmrex_throttled_requests_total', (('scope', scope),))
+            return False
+        return True
+
+    def wait(self):
+        return self.delay
@@ -0,0 +1,146 @@
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Count, Sum
+from rest_framework import serializers, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+from api.models.projects import ProjectActions
+from api.models.time_entries import TimeEntry
+from api.serializer_cache import CachedFieldsMixin
+from api.sharding import fan_out, shards
+
+# what a report can group by, each one a column of TimeEntry
+REPORT_COLUMNS = {
+    'user': 'user_id',
+    'project': 'project_id',
+    'task': 'task_id',
+    'day': 'day',
+}
+
+
+def report(entries, by: str, since=None, until=None):
+    """
+    hours and number of entries of `entries` per `by` (a key of REPORT_COLUMNS) and between the
+    `since` and `until` days, both included. One `GROUP BY` query, filter `entries` on a column
+    that leads one of the TimeEntry indexes and it reads only the days asked for
+    """
+    if since is not None:
+        entries = entries.filter(day__gte=since)
+    if until is not None:
+        entries = entries.filter(day__lte=until)
+    column = REPORT_COLUMNS[by]
+    rows = entries.order_by().values(column).annotate(hours=Sum('duration'), entries=Count('id'))
+    return [
+        {by: row[column], 'hours': row['hours'], 'entries': row['entries']}
+        for row in rows.order_by(column)
+    ]
+
+
+def merge(reports, by: str):
+    """
+    one report out of the reports of several shards
+    """
+    merged = {}
+    for rows in reports:
+        for row in rows:
+            total = merged.setdefault(row[by], {by: row[by], 'hours': 0, 'entries': 0})
+            total['hours'] += row['hours']
+            total['entries'] += row['entries']
+    return [merged[key] for key in sorted(merged)]
+
+
+class TimeEntrySerializer(CachedFieldsMixin, serializers.ModelSerializer):
+    duration = serializers.IntegerField(min_value=1)
+    started_on = serializers.DateTimeField(required=False)
+
+    class Meta:
+        model = TimeEntry
+        fields = ['id', 'task', 'project', 'user', 'started_on', 'day', 'duration']
+        read_only_fields = ['task', 'project', 'user', 'day']
+
+
+class TimeReportSerializer(serializers.Serializer):
+    by = serializers.ChoiceField(choices=list(REPORT_COLUMNS))
+    since = serializers.DateField(required=False)
+    until = serializers.DateField(required=False)
+
+
+def report_query(request, allowed):
+    serializer = TimeReportSerializer(data=request.query_params)
+    serializer.is_valid(raise_exception=True)
+    if serializer.validated_data['by'] not in allowed:
+        raise ValidationError({'by': ['pick one of %s' % ', '.join(allowed)]})
+    return serializer.validated_data
+
+
+class TimeEntryPagination(CursorPagination):
+    """
+    newest days first, keyset pages on the (task, day) index
+    """
+    ordering = ('-day', '-id')
+    page_size = 50
+
+
+class TaskTimeMixin(object):
+    """
+    `/tasks/{id}/time/` lists the time booked on a task (GET, project members) and books some
+    (POST, `{"duration": <hours>, "startedOn": <datetime>}`, project owners and participants)
+    """
+
+    @action(detail=True, methods=['get', 'post'])
+    def time(self, request, pk=None):
+        task = self.get_object()
+        if request.method == 'GET':
+            if not task.project.has_access(request.user, ProjectActions.VIEW_TASKS):
+                raise PermissionDenied()
+            entries = TimeEntry.objects.using(task._state.db).filter(task=task)
+            paginator = TimeEntryPagination()
+            page = paginator.paginate_queryset(entries, request, view=self)
+            return paginator.get_paginated_response(TimeEntrySerializer(page, many=True).data)
+
+        if not task.project.has_access(request.user, ProjectActions.ADD_TASK):
+            raise PermissionDenied()
+        serializer = TimeEntrySerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        entry = TimeEntry.objects.log(
+            task,
+            request.user,
+            serializer.validated_data['duration'],
+            serializer.validated_data.get('started_on')
+        )
+        return Response(TimeEntrySerializer(entry).data, status=status.HTTP_201_CREATED)
+
+
+class ProjectTimeReportMixin(object):
+    """
+    `/projects/{id}/time/?by=user|task|day&since=<date>&until=<date>`, the hours booked on a project
+    """
+
+    @action(detail=True, methods=['get'], url_path='time')
+    def time_report(self, request, pk=None):
+        project = self.get_object()
+        if not project.has_access(request.user, ProjectActions.VIEW_PROJECT_DETAILS):
+            raise PermissionDenied()
+        query = report_query(request, ['user', 'task', 'day'])
+        entries = TimeEntry.objects.using(project._state.db).filter(project=project)
+        return Response({'results': report(entries, **query)})
+
+
+class UserTimeReportMixin(object):
+    """
+    `/users/{id}/time/?by=project|task|day&since=<date>&until=<date>`, the hours a user booked,
+    over every shard. Users see their own, staff everyone's
+    """
+
+    @action(detail=True, methods=['get'], url_path='time')
+    def time_report(self, request, pk=None):
+        user = self.get_object()
+        if user != request.user and not request.user.is_staff:
+            raise PermissionDenied()
+        query = report_query(request, ['project', 'task', 'day'])
+        reports = fan_out(
+            lambda alias: report(TimeEntry.objects.using(alias).filter(user=user), **query),
+            shards() or (DEFAULT_DB_ALIAS,)
+        )
+        return Response({'results': merge(reports.values(), query['by'])})
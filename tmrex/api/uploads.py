@@ -0,0 +1,143 @@
+import hashlib
+import os
+import tempfile
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile, TemporaryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from rest_framework import serializers, status
+from rest_framework.exceptions import APIException, ValidationError
+
+# magic bytes -> (extension, content type), checked against the first chunk of an upload
+IMAGE_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', '.png', 'image/png'),
+    (b'\xff\xd8\xff', '.jpg', 'image/jpeg'),
+    (b'GIF87a', '.gif', 'image/gif'),
+    (b'GIF89a', '.gif', 'image/gif'),
+    (b'BM', '.bmp', 'image/bmp'),
+)
+
+
+def sniff_image_header(chunk: bytes):
+    """
+    find out the image type from the first bytes of a file, returns (extension, content type)
+    or None if it does not look like an image we accept
+    """
+    if chunk[:4] == b'RIFF' and chunk[8:12] == b'WEBP':
+        return '.webp', 'image/webp'
+
+    for signature, extension, content_type in IMAGE_SIGNATURES:
+        if chunk.startswith(signature):
+            return extension, content_type
+    return None
+
+
+class UploadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Uploaded file is too large.'
+    default_code = 'upload_too_large'
+
+
+class HashedUploadedFile(TemporaryUploadedFile):
+    """
+    Same as django's TemporaryUploadedFile, but the temporary file lives inside MEDIA_ROOT so
+    the storage can `rename` it into place instead of copying it over.
+    """
+
+    def __init__(self, name, content_type, size, charset, content_type_extra=None, directory=None):
+        file = tempfile.NamedTemporaryFile(suffix='.upload', dir=directory)
+        UploadedFile.__init__(
+            self, file, name, content_type, size, charset, content_type_extra)
+        self.content_hash = None
+        self.image_format = None
+
+
+class AvatarUploadHandler(FileUploadHandler):
+    """
+    Streams avatar uploads straight to disk, hashing and size checking every chunk on the way.
+    The stored file name is the sha256 of its content, which lets us dedupe
+    and cache avatars forever.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.max_size = settings.AVATAR_MAX_UPLOAD_SIZE
+        self.directory = settings.MEDIA_ROOT
+        self.hasher = None
+        self.file = None
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        # No need to read a single byte if the whole request is already way above the limit
+        if content_length and content_length > self.max_size + settings.DATA_UPLOAD_MAX_MEMORY_SIZE:
+            raise UploadTooLarge()
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        os.makedirs(self.directory, exist_ok=True)
+        self.hasher = hashlib.sha256()
+        self.file = HashedUploadedFile(
+            self.file_name,
+            self.content_type,
+            0,
+            self.charset,
+            self.content_type_extra,
+            directory=self.directory
+        )
+
+    def receive_data_chunk(self, raw_data, start):
+        if start == 0:
+            image_type = sniff_image_header(raw_data)
+            if image_type is None:
+                self.discard()
+                raise ValidationError({
+                    self.field_name: ['Upload a valid image. Only png, jpeg, gif, bmp and webp are allowed.']
+                })
+            self.file.image_format = image_type
+
+        if start + len(raw_data) > self.max_size:
+            self.discard()
+            raise UploadTooLarge()
+
+        self.hasher.update(raw_data)
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        if self.file.image_format is None:
+            # empty file, nothing was ever sniffed
+            self.discard()
+            raise ValidationError({self.field_name: ['The submitted file is empty.']})
+
+        extension, content_type = self.file.image_format
+        self.file.seek(0)
+        self.file.size = file_size
+        self.file.content_hash = self.hasher.hexdigest()
+        self.file.content_type = content_type
+        self.file.name = self.file.content_hash + extension
+        return self.file
+
+    def discard(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class AvatarField(serializers.ImageField):
+    """
+    Avatars that came in through the AvatarUploadHandler were already checked chunk by chunk,
+    re-opening them with Pillow would read the whole file once more for nothing
+    """
+
+    def to_internal_value(self, data):
+        if getattr(data, 'content_hash', None) is not None:
+            return serializers.FileField.to_internal_value(self, data)
+        return super().to_internal_value(data)
+
+
+class AvatarUploadMixin(object):
+    """
+    Swaps django's default upload handlers with the AvatarUploadHandler for a viewset.
+    Has to happen before anything touches `request.data`
+    """
+
+    def initialize_request(self, request, *args, **kwargs):
+        request.upload_handlers = [AvatarUploadHandler(request)]
+        return super().initialize_request(request, *args, **kwargs)
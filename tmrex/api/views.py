@@ -1,14 +1,27 @@
 from rest_framework import viewsets
 from api.utils import ReadWriteSerializerMixin
+from api.uploads import AvatarUploadMixin
+from api.profiling import ProfiledViewMixin, profiler
+from api.coalescing import CoalescedReadMixin
+from api.activity import ActivityFeedMixin
+from api.webhooks import ProjectWebhooksMixin
+from api.analytics import ProjectAnalyticsMixin
+from api.timetracking import TaskTimeMixin, ProjectTimeReportMixin, UserTimeReportMixin
+from api.workload import ProjectWorkloadMixin, UserWorkloadMixin
+from api.sharding import ShardedViewMixin, fan_out, shards
+from api.metrics import registry
 from api.models.tasks import Task
 from api.models.projects import Project, ProjectUser
 from django.contrib.auth.models import User
-from rest_framework.decorators import api_view
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.http import HttpResponse, HttpResponseForbidden
+from rest_framework.decorators import api_view, action
 from rest_framework.response import responses, Response
 from rest_framework import status
 from rest_framework.exceptions import NotFound
 from rest_framework.views import APIView
-from rest_framework.permissions import BasePermission, IsAuthenticated, AllowAny, SAFE_METHODS
+from rest_framework.permissions import BasePermission, IsAuthenticated, IsAdminUser, AllowAny, SAFE_METHODS
 from rest_framework_simplejwt.tokens import RefreshToken
 
 from api.serializers import (
@@ -17,7 +30,8 @@ from api.serializers import (
     ProjectReadSerializer,
     ProjectWriteSerializer,
     TaskReadSerializer,
-    TaskWriteSerializer
+    TaskWriteSerializer,
+    TaskTransitionSerializer
 )
 # Create your views here.
 
@@ -26,6 +40,16 @@ def error404(request, exception):
     raise NotFound()
 
 
+def metrics(request):
+    """
+    Prometheus scrape endpoint, numbers are summed over every worker process
+    """
+    allowed = settings.METRICS_ALLOWED_IPS
+    if allowed is not None and request.META.get('REMOTE_ADDR') not in allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 class Register(APIView):
     permission_classes = [AllowAny]
 
@@ -45,7 +69,32 @@ class Register(APIView):
         }, status=status.HTTP_201_CREATED)
 
 
-class UserViewSet(ReadWriteSerializerMixin, viewsets.ModelViewSet):
+class ProfileView(APIView):
+    """
+    Download what the profiler collected so far, `?output=collapsed` (default) for flamegraphs
+    or `?output=pstats` for pstats/snakeviz. DELETE starts over.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        if profiler.store is None:
+            raise NotFound('Nothing has been profiled yet')
+
+        if request.query_params.get('output') == 'pstats':
+            response = HttpResponse(profiler.store.pstats_dump(), content_type='application/octet-stream')
+            response['Content-Disposition'] = 'attachment; filename="tmrex.pstats"'
+        else:
+            response = HttpResponse(profiler.store.collapsed(), content_type='text/plain; charset=utf-8')
+        response['X-Profiled-Requests'] = profiler.store.requests
+        return response
+
+    def delete(self, request):
+        if profiler.store is not None:
+            profiler.store.clear()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class UserViewSet(CoalescedReadMixin, UserTimeReportMixin, UserWorkloadMixin, ProfiledViewMixin, ReadWriteSerializerMixin, viewsets.ModelViewSet):
     """
     API endpoint that allows users to be viewed or edited.
     """
@@ -55,7 +104,7 @@ class UserViewSet(ReadWriteSerializerMixin, viewsets.ModelViewSet):
     write_serializer_class = UserWriteSerializer
 
 
-class ProjectViewSet(ReadWriteSerializerMixin, viewsets.ModelViewSet):
+class ProjectViewSet(CoalescedReadMixin, ShardedViewMixin, ActivityFeedMixin, ProjectWebhooksMixin, ProjectTimeReportMixin, ProjectAnalyticsMixin, ProjectWorkloadMixin, ProfiledViewMixin, AvatarUploadMixin, ReadWriteSerializerMixin, viewsets.ModelViewSet):
     """
     API endpoint that allows users to be viewed or edited.
     """
@@ -68,10 +117,43 @@ class ProjectViewSet(ReadWriteSerializerMixin, viewsets.ModelViewSet):
         return Project.objects.filter(project_users__user=user)
 
 
-class TaskViewSet(ReadWriteSerializerMixin, viewsets.ModelViewSet):
+class TaskViewSet(CoalescedReadMixin, ShardedViewMixin, ActivityFeedMixin, TaskTimeMixin, ProfiledViewMixin, AvatarUploadMixin, ReadWriteSerializerMixin, viewsets.ModelViewSet):
     """
     API endpoint that allows users to be viewed or edited.
     """
     queryset = Task.objects.all()
     read_serializer_class = TaskReadSerializer
     write_serializer_class = TaskWriteSerializer
+
+    @action(detail=False, methods=['post'])
+    def transition(self, request):
+        """
+        moves many tasks to a state at once, `{"tasks": [<id>, ...], "state": "CLOSED"}`. Tasks that
+        can't go there from their current state, or of projects where the user may not add tasks,
+        stay as they are, every id gets its result
+        """
+        serializer = TaskTransitionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        task_ids = list(dict.fromkeys(serializer.validated_data['tasks']))
+        state = serializer.validated_data['state']
+
+        moved, refused, forbidden = {}, {}, set()
+        # a transaction per database
+        results = fan_out(
+            lambda alias: Task.objects.db_manager(alias).transition(task_ids, state, request.user),
+            shards() or (DEFAULT_DB_ALIAS,)
+        )
+        for alias_moved, alias_refused, alias_forbidden in results.values():
+            moved.update(alias_moved)
+            refused.update(alias_refused)
+            forbidden.update(alias_forbidden)
+
+        def result(task_id):
+            if task_id in moved:
+                return {'id': task_id, 'result': 'changed', 'previous_state': moved[task_id], 'state': state}
+            if task_id in refused:
+                return {'id': task_id, 'result': 'invalid_transition', 'state': refused[task_id]}
+            if task_id in forbidden:
+                return {'id': task_id, 'result': 'forbidden'}
+            return {'id': task_id, 'result': 'not_found'}
+        return Response({'results': [result(task_id) for task_id in task_ids]})
@@ -0,0 +1,100 @@
+import io
+import logging
+from collections import OrderedDict
+from time import perf_counter
+from django.apps import apps
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import connections
+from django.urls import get_resolver, resolve, reverse
+
+logger = logging.getLogger('api.warmup')
+
+# step -> seconds, of the last warm_up() of this process
+timings = OrderedDict()
+
+
+def warm_models():
+    # builds the relation tree and field caches of every model at once
+    for model in apps.get_models():
+        model._meta.get_fields()
+
+
+def anonymous_get(path):
+    return WSGIRequest({
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': path,
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'HTTP_ACCEPT': 'application/json',
+        'REMOTE_ADDR': '127.0.0.1',
+        'wsgi.input': io.BytesIO(),
+        'wsgi.url_scheme': 'http',
+    })
+
+
+def warm_urls():
+    """
+    Imports the urlconf (views, simplejwt...) and sends an anonymous GET to the list url of
+    every router viewset. They all stop at authentication, before any query, but the view,
+    authentication, permission, renderer and exception handling code all ran once
+    """
+    resolver = get_resolver()
+    # reverse() tables, built on the first reverse otherwise
+    resolver.reverse_dict
+    router = getattr(resolver.urlconf_module, 'router', None)
+    if router is None:
+        return
+
+    for prefix, viewset, basename in router.registry:
+        path = reverse('%s-list' % basename)
+        match = resolve(path)
+        request = anonymous_get(path)
+        response = match.func(request, *match.args, **match.kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        response.close()
+
+
+def warm_serializers():
+    from api.serializer_cache import precompile_serializers
+    precompile_serializers()
+
+
+def warm_database():
+    for connection in connections.all():
+        connection.ensure_connection()
+
+
+STEPS = (
+    ('models', warm_models),
+    ('urls', warm_urls),
+    ('serializers', warm_serializers),
+    ('database', warm_database),
+)
+
+
+def warm_up():
+    """
+    Does what the first requests of a cold worker would otherwise do on their time. Called from
+    wsgi.py/asgi.py after the application is loaded, turned off with WARM_UP/TMREX_WARM_UP=0.
+    A step that fails is logged and skipped, the worker still starts.
+    """
+    timings.clear()
+    if not settings.WARM_UP:
+        return timings
+
+    for name, step in STEPS:
+        start = perf_counter()
+        try:
+            step()
+        except Exception:
+            logger.exception('warm-up step %s failed', name)
+        timings[name] = perf_counter() - start
+
+    logger.info(
+        'worker warmed up in %.1fms (%s)',
+        sum(timings.values()) * 1000,
+        ', '.join('%s %.1fms' % (name, seconds * 1000) for name, seconds in timings.items())
+    )
+    return timings
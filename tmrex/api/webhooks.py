@@ -0,0 +1,446 @@
+import hashlib
+import hmac
+import ipaddress
+import json
+import logging
+import random
+import socket
+import threading
+import uuid
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from time import monotonic
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.connection import create_connection
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DEFAULT_DB_ALIAS, router, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from djangorestframework_camel_case.util import camelize
+from rest_framework import serializers, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, PermissionDenied
+from rest_framework.response import Response
+from api.models.projects import ProjectActions
+from api.models.webhooks import Webhook, OutboxMessage
+from api.serializer_cache import CachedFieldsMixin
+from api.signals import tasks_updated
+from api.sharding import shards
+
+logger = logging.getLogger('api.webhooks')
+
+
+class Subscriptions:
+    """
+    project id -> ids of its active webhooks, read again after WEBHOOK_CACHE_TTL seconds.
+    Changes to the webhooks of this process are seen right away
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def of(self, project_id: int, alias: str):
+        now = monotonic()
+        entry = self.entries.get(project_id)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+
+        webhook_ids = tuple(Webhook.objects.using(alias).filter(
+            project_id=project_id, active=True).values_list('pk', flat=True))
+        with self.lock:
+            self.entries[project_id] = (now + settings.WEBHOOK_CACHE_TTL, webhook_ids)
+            self.entries.move_to_end(project_id)
+            while len(self.entries) > settings.WEBHOOK_CACHE_SIZE:
+                self.entries.popitem(last=False)
+        return webhook_ids
+
+    def forget(self, project_id: int):
+        with self.lock:
+            self.entries.pop(project_id, None)
+
+
+subscriptions = Subscriptions()
+
+
+@receiver(post_save, sender=Webhook, dispatch_uid='webhooks.saved')
+@receiver(post_delete, sender=Webhook, dispatch_uid='webhooks.deleted')
+def forget_subscriptions(sender, instance, **kwargs):
+    subscriptions.forget(instance.project_id)
+
+
+def payload(event, **data):
+    return json.dumps(camelize(dict(
+        id=uuid.uuid4().hex,
+        event=event,
+        occurred_on=timezone.now(),
+        **data
+    )), cls=DjangoJSONEncoder, separators=(',', ':'))
+
+
+def task_payload(task, event, changed=None):
+    return payload(
+        event,
+        task={
+            'id': task.pk,
+            'project': task.project_id,
+            'title': task.title,
+            'state': task.state,
+            'assignee': task.assignee_id,
+            'started_on': task.started_on,
+            'ended_on': task.ended_on,
+            'due_on': task.due_on,
+        },
+        changed=changed
+    )
+
+
+def enqueue(alias, body, webhook_ids):
+    OutboxMessage.objects.using(alias).bulk_create([
+        OutboxMessage(webhook_id=webhook_id, payload=body) for webhook_id in webhook_ids
+    ])
+
+
+@receiver(tasks_updated, dispatch_uid='webhooks.tasks_updated')
+def enqueue_tasks_updated(sender, project_id, using, action, count, state=None, tasks=None, **kwargs):
+    # a single message for the lot, in the transaction of the update
+    alias = using or DEFAULT_DB_ALIAS
+    webhook_ids = subscriptions.of(project_id, alias)
+    if webhook_ids and count:
+        body = payload('tasks.' + action, project=project_id, count=count, state=state, tasks=tasks)
+        enqueue(alias, body, webhook_ids)
+
+
+class OutboxMixin(object):
+    """
+    For tasks (DirtyFieldsMixin goes after it). Saves and deletes of a task whose project has
+    webhooks write their outbox messages in the same transaction, they are delivered later by
+    `manage.py dispatch_webhooks`. Writes of projects without webhooks stay as they were
+    """
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        changed = None if adding else self.get_dirty_fields()
+        if changed == []:
+            # DirtyFieldsMixin won't write
+            return super().save(*args, **kwargs)
+
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        webhook_ids = subscriptions.of(self.project_id, using)
+        if not webhook_ids:
+            return super().save(*args, **kwargs)
+        with transaction.atomic(using=using):
+            super().save(*args, **kwargs)
+            enqueue(using, task_payload(self, 'task.created' if adding else 'task.updated', changed), webhook_ids)
+
+    def delete(self, *args, **kwargs):
+        using = kwargs.get('using') or self._state.db or DEFAULT_DB_ALIAS
+        webhook_ids = subscriptions.of(self.project_id, using)
+        if not webhook_ids:
+            return super().delete(*args, **kwargs)
+        with transaction.atomic(using=using):
+            enqueue(using, task_payload(self, 'task.deleted'), webhook_ids)
+            return super().delete(*args, **kwargs)
+
+
+class BlockedAddress(OSError):
+    pass
+
+
+def is_public(address: str):
+    ip = ipaddress.ip_address(address.split('%')[0])
+    if ip.version == 6 and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+def public_addresses(host: str, port: int):
+    """
+    the addresses `host` resolves to, BlockedAddress when one of them is loopback, private,
+    link-local or otherwise not on the internet (unless WEBHOOK_ALLOW_PRIVATE)
+    """
+    addresses = list(dict.fromkeys(
+        info[4][0] for info in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)))
+    if not settings.WEBHOOK_ALLOW_PRIVATE:
+        for address in addresses:
+            if not is_public(address):
+                raise BlockedAddress('%s resolves to %s, not a public address' % (host, address))
+    return addresses
+
+
+class PublicConnectionMixin(object):
+    """
+    urllib3 connections that resolve the host themselves and only connect to an address
+    public_addresses() let through, the one checked is the one connected to
+    """
+
+    def _new_conn(self):
+        error = None
+        for address in public_addresses(self._dns_host, self.port):
+            try:
+                return create_connection((address, self.port), self.timeout, socket_options=self.socket_options)
+            except OSError as failure:
+                error = failure
+        raise error or BlockedAddress('%s resolves to nothing' % self._dns_host)
+
+
+class PublicHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = type('PublicHTTPConnection', (PublicConnectionMixin, HTTPConnection), {})
+
+
+class PublicHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = type('PublicHTTPSConnection', (PublicConnectionMixin, HTTPSConnection), {})
+
+
+class PublicAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': PublicHTTPConnectionPool,
+            'https': PublicHTTPSConnectionPool,
+        }
+
+
+class ConnectionPool:
+    """
+    A requests Session by endpoint (scheme, host, port), keeping up to `size` connections to it
+    alive. Only public addresses are connected to (PublicAdapter), redirects are not followed and
+    proxies from the environment are not used
+    """
+
+    def __init__(self, size, timeout):
+        self.size = size
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.sessions = {}
+
+    def session(self, endpoint):
+        with self.lock:
+            session = self.sessions.get(endpoint)
+            if session is None:
+                session = self.sessions[endpoint] = requests.Session()
+                session.trust_env = False
+                adapter = PublicAdapter(pool_connections=1, pool_maxsize=self.size)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+            return session
+
+    def post(self, url: str, body: bytes, headers: dict):
+        """
+        returns the status of the response
+        """
+        response = self.session(endpoint_of(url)).post(
+            url, data=body, headers=headers, timeout=self.timeout, allow_redirects=False)
+        return response.status_code
+
+    def close(self):
+        with self.lock:
+            sessions, self.sessions = self.sessions, {}
+        for session in sessions.values():
+            session.close()
+
+
+def endpoint_of(url: str):
+    parts = urlsplit(url)
+    return parts.scheme, parts.hostname, parts.port or (443 if parts.scheme == 'https' else 80)
+
+
+def sign(secret: str, body: bytes):
+    return 'sha256=' + hmac.new(secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+
+
+def backoff(attempts: int):
+    """
+    seconds before the next attempt, doubling from WEBHOOK_RETRY_BASE up to WEBHOOK_RETRY_MAX,
+    jittered so failed deliveries don't all come back at once
+    """
+    delay = min(settings.WEBHOOK_RETRY_MAX, settings.WEBHOOK_RETRY_BASE * 2 ** (attempts - 1))
+    return delay * random.uniform(0.5, 1)
+
+
+class Dispatcher:
+    """
+    Delivers the outbox of every database. Due messages are read WEBHOOK_BATCH_SIZE at a time and
+    sent to their webhook WEBHOOK_EVENTS_PER_REQUEST to a request, `{"events": [...]}`, on
+    WEBHOOK_THREADS threads with at most WEBHOOK_ENDPOINT_CONCURRENCY requests at once to the same
+    host. Delivered messages are deleted, failed ones retried with exponential backoff. Events of a
+    webhook may arrive out of order after a retry, or twice when a response got lost, receivers
+    go by the event `id`. Run a single dispatcher
+    """
+
+    def __init__(self, pool=None):
+        self.pool = pool or ConnectionPool(settings.WEBHOOK_POOL_SIZE, settings.WEBHOOK_TIMEOUT)
+        self.executor = ThreadPoolExecutor(settings.WEBHOOK_THREADS, thread_name_prefix='webhook')
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            if not self.dispatch_once():
+                self.stopped.wait(settings.WEBHOOK_POLL_INTERVAL)
+
+    def stop(self):
+        self.stopped.set()
+
+    def close(self):
+        self.executor.shutdown()
+        self.pool.close()
+
+    def dispatch_once(self):
+        """
+        one batch from every database, returns how many messages were attempted or dropped
+        """
+        return sum(self.dispatch(alias) for alias in shards() or (DEFAULT_DB_ALIAS,))
+
+    def dispatch(self, alias):
+        now = timezone.now()
+        messages = list(
+            OutboxMessage.objects.using(alias)
+            .filter(next_attempt_on__lte=now)
+            .select_related('webhook')
+            .order_by('next_attempt_on', 'id')[:settings.WEBHOOK_BATCH_SIZE]
+        )
+        if not messages:
+            return 0
+
+        # the messages of webhooks deactivated since, or written within WEBHOOK_CACHE_TTL of it,
+        # are deleted unsent
+        dropped = []
+        by_endpoint = defaultdict(lambda: defaultdict(list))
+        for message in messages:
+            if not message.webhook.active:
+                dropped.append(message)
+                continue
+            by_endpoint[endpoint_of(message.webhook.url)][message.webhook].append(message)
+
+        # at most WEBHOOK_ENDPOINT_CONCURRENCY workers take the requests of an endpoint in turn
+        futures = []
+        for webhooks in by_endpoint.values():
+            batches = [
+                (webhook, batch[start:start + settings.WEBHOOK_EVENTS_PER_REQUEST])
+                for webhook, batch in webhooks.items()
+                for start in range(0, len(batch), settings.WEBHOOK_EVENTS_PER_REQUEST)
+            ]
+            queue = iter(batches)
+            lock = threading.Lock()
+            for _ in range(min(settings.WEBHOOK_ENDPOINT_CONCURRENCY, len(batches))):
+                futures.append(self.executor.submit(self.drain, queue, lock))
+
+        delivered, failed = dropped, []
+        for future in futures:
+            done, errors = future.result()
+            delivered += done
+            failed += errors
+        self.record(alias, delivered, failed)
+        return len(messages)
+
+    def drain(self, queue, lock):
+        delivered, failed = [], []
+        while True:
+            with lock:
+                batch = next(queue, None)
+            if batch is None:
+                return delivered, failed
+            webhook, messages = batch
+            error = self.deliver(webhook, messages)
+            if error is None:
+                delivered += messages
+            else:
+                failed += [(message, error) for message in messages]
+
+    def deliver(self, webhook, messages):
+        """
+        None when the webhook took the messages, the error otherwise
+        """
+        body = ('{"events":[%s]}' % ','.join(message.payload for message in messages)).encode('utf-8')
+        headers = {
+            'Content-Type': 'application/json',
+            'User-Agent': 'tmrex-webhooks',
+            'X-Tmrex-Signature': sign(webhook.secret, body),
+        }
+        try:
+            code = self.pool.post(webhook.url, body, headers)
+        except requests.RequestException as error:
+            return '%s: %s' % (type(error).__name__, error)
+        if 200 <= code < 300:
+            return None
+        return 'HTTP %d' % code
+
+    def record(self, alias, delivered, failed):
+        outbox = OutboxMessage.objects.using(alias)
+        if delivered:
+            outbox.filter(pk__in=[message.pk for message in delivered]).delete()
+        if not failed:
+            return
+
+        now = timezone.now()
+        for message, error in failed:
+            message.attempts += 1
+            message.last_error = error[:255]
+            if message.attempts >= settings.WEBHOOK_MAX_ATTEMPTS:
+                message.next_attempt_on = None
+                logger.warning('giving up on webhook %d message %d: %s', message.webhook_id, message.pk, error)
+            else:
+                message.next_attempt_on = now + timedelta(seconds=backoff(message.attempts))
+        outbox.bulk_update([message for message, _ in failed], ['attempts', 'last_error', 'next_attempt_on'])
+
+
+class WebhookSerializer(CachedFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Webhook
+        fields = ['id', 'url', 'secret', 'active', 'created_on']
+        read_only_fields = ['secret', 'created_on']
+
+    def validate_url(self, url):
+        # checked again on every connection, the name may point elsewhere by then
+        scheme, host, port = endpoint_of(url)
+        if scheme not in ('http', 'https'):
+            raise serializers.ValidationError('must be an http or https url')
+        try:
+            public_addresses(host, port)
+        except BlockedAddress:
+            raise serializers.ValidationError('must not point at a private or local address')
+        except (socket.gaierror, UnicodeError):
+            raise serializers.ValidationError('%s does not resolve' % host)
+        return url
+
+
+class ProjectWebhooksMixin(object):
+    """
+    `/projects/{id}/webhooks/` lists and adds the webhooks of a project,
+    `/projects/{id}/webhooks/{webhook_id}/` removes one. Owners only
+    """
+
+    def get_webhook_project(self, request):
+        project = self.get_object()
+        if not project.has_access(request.user, ProjectActions.MANAGE_WEBHOOKS):
+            raise PermissionDenied()
+        return project
+
+    @action(detail=True, methods=['get', 'post'])
+    def webhooks(self, request, pk=None):
+        project = self.get_webhook_project(request)
+        webhooks = Webhook.objects.using(project._state.db).filter(project=project).order_by('id')
+        if request.method == 'GET':
+            return Response(WebhookSerializer(webhooks, many=True).data)
+
+        serializer = WebhookSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        webhook = Webhook(project=project, created_by=request.user, **serializer.validated_data)
+        webhook.save(using=project._state.db)
+        return Response(WebhookSerializer(webhook).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['delete'], url_path=r'webhooks/(?P<webhook_id>[0-9]+)')
+    def delete_webhook(self, request, pk=None, webhook_id=None):
+        project = self.get_webhook_project(request)
+        webhook = Webhook.objects.using(project._state.db).filter(project=project, pk=webhook_id).first()
+        if webhook is None:
+            raise NotFound()
+        webhook.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
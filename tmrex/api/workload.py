@@ -0,0 +1,124 @@
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Count, F, Sum, Value
+from django.db.models.functions import Greatest, TruncWeek
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.response import Response
+from api.models.projects import ProjectActions
+from api.models.tasks import Task, OPEN_STATES
+from api.sharding import fan_out, shards
+
+
+def workload(tasks):
+    """
+    (assignee id, week, hours, tasks) of the open `tasks` per assignee and week of their due date
+    (the Monday, None without one), in one `GROUP BY` query. Hours are what is left of a task's
+    estimate, nothing for a task past it. Filtered on assignees, the (assignee, state, due_on,
+    estimated_hours, hours_spent) index answers it alone
+    """
+    rows = tasks.filter(state__in=OPEN_STATES, assignee__isnull=False).order_by().values(
+        'assignee_id', week=TruncWeek('due_on')
+    ).annotate(
+        hours=Sum(Greatest(F('estimated_hours') - F('hours_spent'), Value(0))),
+        tasks=Count('id')
+    )
+    return [
+        (row['assignee_id'], timezone.localdate(row['week']) if row['week'] else None, row['hours'], row['tasks'])
+        for row in rows
+    ]
+
+
+def table(rows):
+    """
+    the rows of workload(), of one or more databases, as a table: the weeks (the ones without a
+    due date last) and per assignee the hours and tasks of each week, in the same order
+    """
+    weeks = sorted(set(row[1] for row in rows), key=lambda week: (week is None, week))
+    column = {week: index for index, week in enumerate(weeks)}
+    assignees = {}
+    for assignee, week, hours, tasks in rows:
+        entry = assignees.get(assignee)
+        if entry is None:
+            entry = assignees[assignee] = {
+                'assignee': assignee,
+                'hours': [0] * len(weeks),
+                'tasks': [0] * len(weeks)
+            }
+        entry['hours'][column[week]] += hours or 0
+        entry['tasks'][column[week]] += tasks
+
+    capacity = settings.WORKLOAD_WEEKLY_CAPACITY
+    for entry in assignees.values():
+        entry['total_hours'] = sum(entry['hours'])
+        # the tasks without a due date don't belong to a week
+        entry['overloaded'] = any(
+            hours > capacity for week, hours in zip(weeks, entry['hours']) if week is not None)
+    return {
+        'capacity': capacity,
+        'weeks': weeks,
+        'assignees': [assignees[assignee] for assignee in sorted(assignees)]
+    }
+
+
+def users_workload(user_ids):
+    """
+    workload of the tasks assigned to `user_ids` over every project, one query per shard
+    """
+    reports = fan_out(
+        lambda alias: workload(Task.objects.using(alias).filter(assignee_id__in=user_ids)),
+        shards() or (DEFAULT_DB_ALIAS,)
+    )
+    return table([row for rows in reports.values() for row in rows])
+
+
+class ProjectWorkloadMixin(object):
+    """
+    `/projects/{id}/workload/`, the open hours of every assignee of a project per week
+    """
+
+    @action(detail=True, methods=['get'])
+    def workload(self, request, pk=None):
+        project = self.get_object()
+        if not project.has_access(request.user, ProjectActions.VIEW_PROJECT_DETAILS):
+            raise PermissionDenied()
+        tasks = Task.objects.using(project._state.db).filter(project=project)
+        return Response(table(workload(tasks)))
+
+
+class UserWorkloadSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        min_length=1,
+        max_length=settings.WORKLOAD_MAX_USERS
+    )
+
+    def to_internal_value(self, data):
+        # `?ids=1,2,3`
+        if hasattr(data, 'get') and isinstance(data.get('ids'), str):
+            data = {'ids': [value for value in data['ids'].split(',') if value]}
+        return super().to_internal_value(data)
+
+
+class UserWorkloadMixin(object):
+    """
+    `/users/{id}/workload/` the open hours of a user per week over every project, staff compare
+    many users with `/users/workload/?ids=1,2,3`
+    """
+
+    @action(detail=True, methods=['get'], url_path='workload')
+    def user_workload(self, request, pk=None):
+        user = self.get_object()
+        if user != request.user and not request.user.is_staff:
+            raise PermissionDenied()
+        return Response(users_workload([user.pk]))
+
+    @action(detail=False, methods=['get'], url_path='workload')
+    def compare_workload(self, request):
+        if not request.user.is_staff:
+            raise PermissionDenied()
+        serializer = UserWorkloadSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return Response(users_workload(serializer.validated_data['ids']))
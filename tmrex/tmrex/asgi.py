@@ -14,3 +14,11 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tmrex.settings')
 
 application = get_asgi_application()
+
+# streams of changes at EVENTS_PATH (see api.events)
+from api.events import EventStreamApplication  # noqa: E402
+application = EventStreamApplication(application)
+
+# needs the app registry, so only once the application is loaded
+from api.warmup import warm_up  # noqa: E402
+warm_up()
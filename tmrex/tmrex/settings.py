@@ -11,12 +11,20 @@ https://docs.djangoproject.com/en/3.0/ref/settings/
 """
 
 import os
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
-MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+MEDIA_ROOT = os.environ.get('TMREX_MEDIA_ROOT', os.path.join(BASE_DIR, 'media'))
 MEDIA_URL = '/media/'
+DEFAULT_FILE_STORAGE = 'api.storage.ContentAddressedStorage'
+# Avatars bigger than this are rejected while they are still streaming in
+AVATAR_MAX_UPLOAD_SIZE = 2 * 1024 * 1024
+# 'sendfile' serves media from django through wsgi.file_wrapper, 'x-accel-redirect' (nginx)
+# and 'x-sendfile' (apache, lighttpd) leave the actual file transfer to the web server
+MEDIA_SERVE_MODE = 'sendfile'
+MEDIA_ACCEL_REDIRECT_PREFIX = '/protected-media/'
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/3.0/howto/deployment/checklist/
 
@@ -48,7 +56,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.MetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    'api.middleware.QueryInstrumentationMiddleware',
+    'api.middleware.ActivityMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -58,6 +69,107 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Fraction of requests whose SQL gets counted and timed (0 turns the middleware off),
+# sampled requests above either threshold are logged to `api.sql`
+SQL_SAMPLE_RATE = 0.0
+SQL_LOG_QUERY_COUNT = 50
+SQL_LOG_DB_TIME_MS = 200
+# Profiling of the api viewsets, a PROFILE_SAMPLE_RATE fraction of the requests plus the ones
+# sent with `X-Profile: <PROFILE_SECRET>`. Results are served to staff at /api/profile/
+PROFILE_SAMPLE_RATE = 0.0
+PROFILE_SECRET = None
+PROFILE_INTERVAL = 0.005
+PROFILE_MAX_STACKS = 5000
+# Prometheus metrics at /metrics. Every worker process writes its numbers to METRICS_DIR,
+# the scrape adds them up. Clear the directory when deploying a new release
+METRICS_ENABLED = True
+METRICS_DIR = os.path.join(tempfile.gettempdir(), 'tmrex-metrics')
+METRICS_FLUSH_INTERVAL = 5
+METRICS_ALLOWED_IPS = ('127.0.0.1', '::1')
+# wsgi.py/asgi.py warm a worker up before it takes traffic (see api.warmup).
+# `manage.py startup_report` fails past these budgets, or when a module of
+# STARTUP_DEFERRED_MODULES got imported before the first request
+WARM_UP = os.environ.get('TMREX_WARM_UP', '1') != '0'
+STARTUP_BUDGET_MS = 2500
+FIRST_REQUEST_BUDGET_MS = 150
+STARTUP_DEFERRED_MODULES = ('PIL', 'pstats', 'cProfile')
+# Token buckets for the expensive actions, `view.action: (burst, refill rate)`, per user,
+# else per IP. Actions not listed here are never throttled.
+# Buckets live in THROTTLE_FILE, shared by the workers of a host, THROTTLE_SLOTS of
+# them at most (24 bytes each), the least recently used bucket is dropped past that
+THROTTLE_ENABLED = os.environ.get('TMREX_THROTTLE', '1') != '0'
+THROTTLE_BUCKETS = {
+    'Register.post': (5, '5/min'),
+    'TokenObtainPairView.post': (10, '10/min'),
+    'TaskViewSet.list': (30, '10/s'),
+    'TaskViewSet.create': (20, '5/s'),
+    'TaskViewSet.relations': (20, '5/s'),
+    'TaskViewSet.transition': (10, '1/s'),
+    'TaskViewSet.time': (20, '5/s'),
+    'ProjectViewSet.list': (30, '10/s'),
+    'ProjectViewSet.create': (10, '1/s'),
+    'UserViewSet.list': (30, '10/s'),
+}
+THROTTLE_FILE = os.path.join(tempfile.gettempdir(), 'tmrex-throttle')
+THROTTLE_SLOTS = 65536
+# Identical GETs on the viewsets (same url, same user) in flight at the same time are computed
+# once, the rendered body is served again for COALESCE_WINDOW seconds (0 only shares requests
+# in flight). Writes drop it in the worker that made them, other workers keep it until the
+# window ends. Waiting on another request gives up after COALESCE_WAIT seconds
+COALESCE_ENABLED = os.environ.get('TMREX_COALESCE', '1') != '0'
+COALESCE_WINDOW = 0.5
+COALESCE_WAIT = 5
+COALESCE_MAX_ENTRIES = 1024
+# Server-Sent Events of task and membership changes at EVENTS_PATH, served by asgi.py only.
+# The last EVENTS_REPLAY_SIZE events are replayed to clients resuming with Last-Event-ID,
+# a connection more than EVENTS_QUEUE_SIZE events behind is closed (and resumes).
+# Idle streams get a comment every EVENTS_HEARTBEAT seconds.
+# EVENTS_QUERY_TOKEN accepts `?token=` for EventSource, the token then ends up in access logs
+EVENTS_ENABLED = os.environ.get('TMREX_EVENTS', '1') != '0'
+EVENTS_QUERY_TOKEN = os.environ.get('TMREX_EVENTS_QUERY_TOKEN', '0') == '1'
+EVENTS_PATH = '/api/events/'
+EVENTS_REPLAY_SIZE = 1000
+EVENTS_QUEUE_SIZE = 100
+EVENTS_HEARTBEAT = 15
+EVENTS_RETRY_MS = 3000
+# most tasks moved by one POST /api/tasks/transition/
+TASK_TRANSITION_MAX_TASKS = 1000
+# project analytics (api.analytics): the longest range served and how long a result is cached,
+# a change to the project's tasks replaces it sooner
+ANALYTICS_MAX_DAYS = 3 * 366
+ANALYTICS_CACHE_TIMEOUT = 24 * 3600
+# workload reports (api.workload): the hours a week someone can take before they are overloaded
+# and the most users compared by one GET /api/users/workload/
+WORKLOAD_WEEKLY_CAPACITY = 40
+WORKLOAD_MAX_USERS = 500
+# due date notifications (api.reminders, `manage.py scan_due_tasks`): tasks due within
+# DUE_SOON_HOURS are announced, then again once overdue. The scanner runs every
+# DUE_SCAN_INTERVAL seconds and reads DUE_SCAN_BATCH_SIZE tasks at a time
+DUE_SOON_HOURS = 24
+DUE_SCAN_INTERVAL = 60
+DUE_SCAN_BATCH_SIZE = 1000
+# Webhooks (see api.webhooks). Task writes of projects with webhooks add outbox messages in their
+# transaction, `manage.py dispatch_webhooks` delivers them: WEBHOOK_BATCH_SIZE messages a round,
+# WEBHOOK_EVENTS_PER_REQUEST to a request, on WEBHOOK_THREADS threads, at most
+# WEBHOOK_ENDPOINT_CONCURRENCY requests at once per host over WEBHOOK_POOL_SIZE kept-alive
+# connections. Failures are retried after WEBHOOK_RETRY_BASE seconds, doubling up to
+# WEBHOOK_RETRY_MAX, WEBHOOK_MAX_ATTEMPTS times. The webhooks of a project are cached
+# WEBHOOK_CACHE_TTL seconds, a new one may miss the writes of other workers until then
+WEBHOOK_BATCH_SIZE = 500
+WEBHOOK_EVENTS_PER_REQUEST = 50
+WEBHOOK_THREADS = 8
+WEBHOOK_ENDPOINT_CONCURRENCY = 2
+WEBHOOK_POOL_SIZE = 2
+WEBHOOK_TIMEOUT = 10
+WEBHOOK_RETRY_BASE = 10
+WEBHOOK_RETRY_MAX = 3600
+WEBHOOK_MAX_ATTEMPTS = 10
+WEBHOOK_POLL_INTERVAL = 1
+WEBHOOK_CACHE_TTL = 5
+WEBHOOK_CACHE_SIZE = 10000
+# webhooks may only call public addresses, checked when one is added and on every connection.
+# Turn it on to call services of the same network (or local test servers)
+WEBHOOK_ALLOW_PRIVATE = False
 
 CORS_ORIGIN_ALLOW_ALL = False
 CORS_ORIGIN_WHITELIST = (
@@ -77,6 +189,9 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.DjangoModelPermissions'
     ],
+    'DEFAULT_THROTTLE_CLASSES': (
+        'api.throttling.TokenBucketThrottle',
+    ),
     'DEFAULT_PARSER_CLASSES': (
         # If you use MultiPartFormParser or FormParser, we also have a camel case version
         'djangorestframework_camel_case.parser.CamelCaseFormParser',
@@ -113,10 +228,36 @@ WSGI_APPLICATION = 'tmrex.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'NAME': os.environ.get('TMREX_DATABASE', os.path.join(BASE_DIR, 'db.sqlite3')),
+        # keep the connections opened by the warm-up, and by requests, across requests
+        'CONN_MAX_AGE': int(os.environ.get('TMREX_CONN_MAX_AGE', 60)),
     }
 }
 
+# Projects, with their tasks, members and task relations, are spread over PROJECT_SHARDS by project
+# id, users and everything else stay on `default` (see api.sharding). Empty keeps it all on `default`.
+# TMREX_SHARDS=N adds N SQLite files next to the default one as shards, each needs a
+# `manage.py migrate --database shardN`. `manage.py move_project` moves a project to another shard.
+# The foreign keys to users have no database constraint, sharded or not: the schema doesn't change
+# when shards are added. Deleting a user still cascades (Django, api.sharding.forget_user), rows
+# written with a missing user id outside of the ORM are not refused
+SHARD_COUNT = int(os.environ.get('TMREX_SHARDS', 0))
+for shard in range(SHARD_COUNT):
+    DATABASES['shard%d' % shard] = dict(
+        DATABASES['default'],
+        NAME='%s-shard%d%s' % (os.path.splitext(DATABASES['default']['NAME'])[0], shard,
+                               os.path.splitext(DATABASES['default']['NAME'])[1])
+    )
+PROJECT_SHARDS = tuple('shard%d' % shard for shard in range(SHARD_COUNT))
+DATABASE_ROUTERS = ['api.sharding.ProjectShardRouter']
+# moved projects are read again every SHARD_DIRECTORY_TTL seconds, project and task ids are
+# reserved SHARD_ID_BLOCK at a time, queries over every shard run on SHARD_FAN_OUT_THREADS
+SHARD_DIRECTORY_TTL = 5
+SHARD_ID_BLOCK = 100
+SHARD_FAN_OUT_THREADS = 8
+# admin changelists count up to this many rows, past it they show an estimate (see api.admin)
+ADMIN_EXACT_COUNT_LIMIT = 10000
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
@@ -13,7 +13,8 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-from django.urls import include, path
+from django.contrib import admin
+from django.urls import include, path, re_path
 from django.conf.urls import (
     handler400,
     handler403,
@@ -22,13 +23,12 @@ from django.conf.urls import (
 )
 from rest_framework import routers
 from django.conf import settings
-from django.conf.urls.static import static
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
     TokenVerifyView
 )
-from api import views
+from api import views, media
 handler404 = views.error404
 router = routers.DefaultRouter()
 # router.register(r'signup', views.Register)
@@ -39,9 +39,13 @@ router.register(r'tasks', views.TaskViewSet)
 
 urlpatterns = [
     path('api/', include(router.urls)),
+    path('admin/', admin.site.urls),
     path('api/signup', views.Register.as_view(), name="signup"),
+    path('api/profile/', views.ProfileView.as_view(), name='profile'),
+    path('metrics', views.metrics, name='metrics'),
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('api/token/verify/', TokenVerifyView.as_view(), name='token_verify'),
     # path('api-auth/', include('rest_framework.urls'))
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    re_path(r'^%s(?P<path>.+)$' % settings.MEDIA_URL.lstrip('/'), media.serve_media, name='media'),
+]
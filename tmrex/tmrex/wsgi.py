@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tmrex.settings')
 
 application = get_wsgi_application()
+
+# needs the app registry, so only once the application is loaded
+from api.warmup import warm_up  # noqa: E402
+warm_up()